@@ -9,10 +9,16 @@
 from __future__ import absolute_import, division, print_function
 __metaclass__ = type
 
-from ansible.module_utils.basic import AnsibleModule
-from hiraid.raidcom import Raidcom
-from hiraid.horcm.horcm_cci import Cci
-from hiraid.storage_utils import StorageCapacity
+# hiraid (Raidcom, Cci) is imported on first use, a hur task never needs Raidcom
+from ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom_cache import cache_path, cache_load, cache_save, cache_invalidate, cache_lock
+from ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom_cache import hitachi_raidcom_query_cache, hitachi_raidcom_cached
+from ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom_metrics import hitachi_raidcom_metrics, hitachi_raidcom_timed
+from ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom_broker import hitachi_raidcom_broker_socket, hitachi_raidcom_broker_client, broker_available
+from ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom_ldev_allocator import hitachi_raidcom_ldev_allocator
+from ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom_scheduler import hitachi_raidcom_scheduler, hitachi_raidcom_pooled
+from ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom_plan import hitachi_raidcom_plan, hitachi_raidcom_planned
+from ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom_transaction import hitachi_raidcom_transaction
+from ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom_trace import hitachi_raidcom_trace, hitachi_raidcom_trace_error
 
 import logging
 
@@ -27,22 +33,111 @@ except ImportError:
     ansible_version = 'unknown'
 
 import os
-import ssl
+import threading
 import time
 
 
+# row layout of the capacity_facts tables
+capacity_columns = ('key', 'ldevs', 'provisioned_blks', 'used_blks', 'provisioned_GB', 'used_GB', 'used_percent')
+
+# pairdisplay Status values that count as reached for a wait_for state
+hur_wait_states = {
+    'PAIR': ('PAIR', 'PFUL'),
+    'PSUS': ('PSUS', 'SSUS', 'PFUS'),
+    'SSWS': ('SSWS',),
+    'SMPL': ('SMPL',),
+}
+# pairdisplay Status values (local side) in which a state has nothing left to do
+hur_paired_states = ('PAIR', 'COPY', 'PFUL')
+hur_split_states = ('PSUS', 'SSUS', 'PFUS', 'SSWS', 'PSUE')
+# pairdisplay Status values a wait_for can not recover from
+hur_error_states = ('PSUE', 'PDUB')
+# wait_for polling interval bounds in seconds
+hur_wait_min_interval = 2
+hur_wait_max_interval = 60
+
+# pairdisplay columns summary returns for the pairs not in the expected_state, unless fields is given
+hur_summary_fields = ('PairVol', 'LDEV#', 'P/S', 'Status', 'Fence', '%', 'JID')
+# pairdisplay columns of each side in the two-site view of hur_sites
+hur_site_fields = ('P/S', 'Status', 'Fence', '%', 'JID', 'Seq#', 'LDEV#')
+# columns of the hur monitor series
+hur_monitor_columns = ('seconds', 'usage_percent', 'q_cnt', 'q_marker', 'jnls')
+
 hitachi_raidcom_argument_spec = {
     "storage_serial": {"required": False, "type": "int"},
     "horcm_inst": {"required": True, "type": "int"},
+    "cache_dir": {"required": False, "type": "path"},
+    "cache_ttl": {"required": False, "type": "int", "default": 0},
+    "query_cache_ttl": {"required": False, "type": "int", "default": 0},
+    "horcm_inst_pool": {"required": False, "type": "list", "elements": "int"},
+    "horcm_inst_max_inflight": {"required": False, "type": "int", "default": 1},
+    "log_level": {"required": False, "type": "str", "default": "INFO", "choices": ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]},
+    "log_max_bytes": {"required": False, "type": "int", "default": 10485760},
+    "log_backup_count": {"required": False, "type": "int", "default": 5},
+    "log_rotate_when": {"required": False, "type": "str", "choices": ["S", "M", "H", "D", "midnight", "W0", "W1", "W2", "W3", "W4", "W5", "W6"]},
+    "metrics_log": {"required": False, "type": "path"},
+    "broker_socket": {"required": False, "type": "path"},
+    "trace_record": {"required": False, "type": "path"},
+    "trace_replay": {"required": False, "type": "path"},
+    "trace_replay_speed": {"required": False, "type": "str", "default": "full", "choices": ["full", "recorded"]},
+    "cci_path": {"required": False, "type": "path", "default": "/usr/bin/"},
+    # raidcom/CCI calls a method runs at the same time (host_grps_get_facts, the copy_groups fan-out of hur)
+    "max_workers": {"required": False, "type": "int", "default": 10},
 }
 
+# parameters of the volume methods (volume_create, volume_expand, volume_delete, volume_get_properties, ...),
+# for a module that manages volumes together with hitachi_raidcom_argument_spec
+hitachi_raidcom_volume_argument_spec = {
+    # LDEV id, '' for volume_create to take the next free id (see resource_group_id, ldev_range_start, ldev_range_end)
+    "volume_id": {"required": False, "type": "str", "default": ""},
+    "volume_name": {"required": False, "type": "str", "default": ""},
+    # blocks, or a size with unit (e.g. 10GB); volume_expand adds volume_size to the volume, in a volumes list
+    # volume_size is the wanted size of the volume and only the missing blocks are added (a smaller one fails the item)
+    "volume_size": {"required": False, "type": "str"},
+    "pool_id": {"required": False, "type": "int", "default": 0},
+    # list of {volume_id, volume_name, volume_size} handled against one LDEV snapshot
+    "volumes": {"required": False, "type": "list", "elements": "dict"},
+    # resource group the free volume_ids are taken from
+    "resource_group_id": {"required": False, "type": "int", "default": 0},
+    # first and last LDEV id free volume_ids are taken from, default all ids of the storage model
+    "ldev_range_start": {"required": False, "type": "int", "default": 0},
+    "ldev_range_end": {"required": False, "type": "int"},
+    # capacity_facts groups the volumes by the volume_name up to the first name_prefix_separator
+    "name_prefix_separator": {"required": False, "type": "str", "default": "_"},
+}
+
+# parameters of host_grps_get_facts, for a module that reads host groups together with hitachi_raidcom_argument_spec
+hitachi_raidcom_host_grp_argument_spec = {
+    # port of a single host group lookup
+    "port": {"required": False, "type": "str"},
+    # ports to read the host groups of, all for all target ports; host_grp_get_facts then reads them all at once
+    "ports": {"required": False, "type": "list", "elements": "str"},
+    # host group name with port, a glob or list of globs with ports, all host groups when not given
+    "host_grp_name": {"required": False, "type": "raw"},
+}
+
+# units of volume_size and their size in bytes, a volume_size without unit is in blocks of 512 bytes
+volume_size_units = (('PB', 2 ** 50), ('TB', 2 ** 40), ('GB', 2 ** 30), ('MB', 2 ** 20), ('KB', 2 ** 10), ('B', 1))
+# seconds the free LDEV id bitmap with its reservations is reused when cache_ttl is shorter: ids reserved by
+# a parallel task are not handed out again before its add ldev ran
+ldev_reservation_ttl = 300
+
 
 def createdir(directory):
     if not os.path.exists(directory):
         os.makedirs(directory)
 
+# log file -> (QueueHandler, QueueListener) of this process, a logger gets its handler only once
+configlog_handlers = {}
+
+
 # hiraid logger configuration setup
-def configlog(scriptname, logdir, logname, basedir=os.getcwd()):
+# records go through a queue to a listener thread that writes the rotating log file, logging never waits for the disk
+# rotation by size (max_bytes, backup_count) or by time (when, e.g. midnight), nothing is logged to stdout/stderr
+def configlog(scriptname, logdir, logname, basedir=os.getcwd(), level='INFO', max_bytes=10485760, backup_count=5, when=None):
+    import atexit
+    import logging.handlers
+    import queue
     try:
         separator = ('/', '\\')[os.name == 'nt']
         cwd = basedir
@@ -50,18 +145,27 @@ def configlog(scriptname, logdir, logname, basedir=os.getcwd()):
         logfile = '{}{}{}{}{}'.format(
             cwd, separator, logdir, separator, logname)
         logger = logging.getLogger(scriptname)
-        logger.setLevel(logging.DEBUG)
-        fh = logging.FileHandler(logfile)
-        fh.setLevel(logging.DEBUG)
-        ch = logging.StreamHandler()
-        ch.setLevel(logging.INFO)
-        formatter = logging.Formatter(
-            '%(asctime)s : %(name)s : %(levelname)s : %(message)s')
-        fh.setFormatter(formatter)
-        ch.setFormatter(formatter)
-        # Add handlers to the logger
-        logger.addHandler(fh)
-        logger.addHandler(ch)
+        logger.setLevel(getattr(logging, str(level).upper()))
+        # the root logger (e.g. configured by hiraid) must not print the records again
+        logger.propagate = False
+        if logfile not in configlog_handlers:
+            if when:
+                fh = logging.handlers.TimedRotatingFileHandler(logfile, when=when, backupCount=backup_count)
+            else:
+                fh = logging.handlers.RotatingFileHandler(logfile, maxBytes=max_bytes, backupCount=backup_count)
+            formatter = logging.Formatter(
+                '%(asctime)s : %(name)s : %(levelname)s : %(message)s')
+            fh.setFormatter(formatter)
+            records = queue.Queue(-1)
+            listener = logging.handlers.QueueListener(records, fh)
+            listener.start()
+            # write what is still queued when the module exits
+            atexit.register(listener.stop)
+            configlog_handlers[logfile] = (logging.handlers.QueueHandler(records), listener)
+        qh = configlog_handlers[logfile][0]
+        # Add handler to the logger, once
+        if qh not in logger.handlers:
+            logger.addHandler(qh)
     except Exception as e:
         raise Exception('Unable to configure logger > {}'.format(str(e)))
     return logger
@@ -69,8 +173,6 @@ def configlog(scriptname, logdir, logname, basedir=os.getcwd()):
 
 class hitachi_raidcom(object):
     def __init__(self, module):
-        # enable hiraid logging
-        self.log = configlog("hitachi_raidcom_module_utils", "", "hitachi_raidcom_collection.log",basedir="/var/log")
         # base init
         self.module = module
         self.params = module.params
@@ -81,12 +183,153 @@ class hitachi_raidcom(object):
         # horcm_inst
         self.horcm_inst = self.params['horcm_inst']
         self.serial = self.params['storage_serial']
+        # directory of the CCI binaries, hiraid prepends it to the command names
+        self.cci_path = os.path.join(self.params.get('cci_path') or '/usr/bin/', '')
+        # every call into hiraid is timed, totals are returned as metrics
+        self.metrics = hitachi_raidcom_metrics(self.params.get('metrics_log'), self.serial, self.horcm_inst)
+        # trace_record/trace_replay: the calls are written to or answered by a trace file
+        self.trace = None
+        if self.params.get('trace_replay'):
+            try:
+                self.trace = hitachi_raidcom_trace(self.params['trace_replay'], self.params, self.serial, self.horcm_inst,
+                                                   replay=True, speed=self.params.get('trace_replay_speed') or 'full')
+            except hitachi_raidcom_trace_error as e:
+                module.fail_json(msg=str(e))
+            self.metrics.backend = 'replay'
+        elif self.params.get('trace_record'):
+            self.trace = hitachi_raidcom_trace(self.params['trace_record'], self.params, self.serial, self.horcm_inst)
+        self.metrics.trace = self.trace
+        # logger, broker check, Raidcom and Cci are set up on first use
+        self.logger = None
+        self.broker_socket = None
+        self.storage = None
+        self.storage_cci = None
+        self.storage_session = None
+        self.storage_cci_session = None
+        # threads (copy_groups, ports) set up Raidcom/Cci only once
+        self.session_lock = threading.RLock()
+        # scheduler of the horcm_inst_pool, set up on first use
+        self.scheduler = None
+        # volume_name -> [volume_id] index, loaded on first use
+        self.ldev_name_index = None
+        # getldevlist snapshot shared by all items of a volumes: list
+        self.ldev_snapshot = None
+        # free LDEV id bitmaps, loaded on first use
+        self.ldev_free = None
+        # check_mode: the changing Raidcom/Cci calls are recorded in the plan instead of run
+        self.plan = None
+        if getattr(module, 'check_mode', False):
+            self.plan = hitachi_raidcom_plan(self.cci_path, self.serial, self.horcm_inst, self.raidcom_session)
+    # End of utils __init__
+
+    @property
+    def log(self):
+        # enable hiraid logging
+        if self.logger is None:
+            self.logger = configlog("hitachi_raidcom_module_utils", "", "hitachi_raidcom_collection.log",basedir="/var/log",
+                                    level=self.params.get('log_level') or 'INFO', max_bytes=self.params.get('log_max_bytes') or 10485760,
+                                    backup_count=self.params.get('log_backup_count') or 5, when=self.params.get('log_rotate_when'))
+        return self.logger
+
+    def trace_replaying(self):
+        # a replayed task answers its calls from the trace: no cache, lock or horcm.conf file is read or written for it
+        return self.trace is not None and self.trace.replaying
+
+    def storage_broker(self):
+        # use the warm Raidcom/Cci of a running session broker, otherwise set them up in process
+        if self.broker_socket is None and self.trace_replaying():
+            # a replay never talks to the storage, nor to the broker
+            self.broker_socket = False
+        if self.broker_socket is None:
+            brokerSocket = self.params.get('broker_socket') or hitachi_raidcom_broker_socket
+            self.broker_socket = (False, brokerSocket)[broker_available(brokerSocket)]
+            if self.broker_socket:
+                self.metrics.backend = 'broker'
+        return self.broker_socket
+
+    def cci_session(self):
+        # the timed Cci, from the broker or in process
+        with self.session_lock:
+            if self.storage_cci_session is None:
+                if self.storage_broker():
+                    cci = hitachi_raidcom_broker_client(self.broker_socket, self.serial, self.horcm_inst, 'cci')
+                else:
+                    from hiraid.horcm.horcm_cci import Cci
+                    cci = self.metrics.timed('cci', '__init__', Cci, log=self.log, path=self.cci_path)
+                self.storage_cci_session = self.horcm_pooled(cci, 'cci')
+        return self.storage_cci_session
+
+    def raidcom_session(self):
+        # the timed Raidcom, from the broker or in process
+        with self.session_lock:
+            if self.storage_session is None:
+                storage = self.raidcom_instance(self.horcm_inst)
+                self.storage_session = self.horcm_pooled(storage, 'raidcom', self.raidcom_instance)
+                # add cci commands to storage
+                self.storage_session.cci = self.cci
+        return self.storage_session
+
+    def raidcom_instance(self, inst):
+        # the Raidcom of HORCM instance inst, from the broker or in process; the instance pool sets up one per instance
+        if self.storage_broker():
+            return hitachi_raidcom_broker_client(self.broker_socket, self.serial, inst, 'raidcom')
+        from hiraid.raidcom import Raidcom
         # Darren
         # self.mystorage = raidcom(self.serial, self.horcm_inst)
-        self.mystorage = Raidcom(self.serial, self.horcm_inst,log=self.log)
-        # add cci commands to storage
-        self.mystorage.cci = Cci(log=self.log)
-    # End of utils __init__
+        return self.metrics.timed('raidcom', '__init__', Raidcom, self.serial, inst, path=self.cci_path, log=self.log)
+
+    def horcm_scheduler(self):
+        # horcm_inst_pool: more HORCM instances of the storage, the commands of all tasks on the host are spread over
+        # horcm_inst and the pool with at most horcm_inst_max_inflight commands per instance; None without a pool
+        # and in a replay, which has no slots to wait for
+        if self.scheduler is None and self.params.get('horcm_inst_pool') and not self.trace_replaying():
+            instances = [self.horcm_inst] + [inst for inst in self.params['horcm_inst_pool'] if inst != self.horcm_inst]
+            self.scheduler = hitachi_raidcom_scheduler(self.params.get('cache_dir'), self.serial, instances,
+                                                       self.params.get('horcm_inst_max_inflight'))
+        return self.scheduler
+
+    def horcm_pooled(self, target, name, factory=None):
+        # the timed Raidcom/Cci, scheduled over the instance pool if there is one; factory(inst) sets up the
+        # Raidcom of another instance of the pool
+        if not self.horcm_scheduler():
+            return hitachi_raidcom_timed(target, name, self.metrics)
+        return hitachi_raidcom_pooled(target, name, self.scheduler, self.metrics, factory)
+
+    def query_cached(self, factory, name):
+        # with query_cache_ttl the read-only queries of all tasks on this host are answered from the query cache
+        # for query_cache_ttl seconds, without it the Raidcom/Cci is used as is
+        # in check_mode it lets the tasks of a planned batch share one snapshot of the storage
+        if not self.params.get('query_cache_ttl') or self.trace_replaying():
+            return factory()
+        cache = hitachi_raidcom_query_cache(self.params.get('cache_dir'), self.serial, self.horcm_inst, self.params['query_cache_ttl'])
+        return hitachi_raidcom_cached(factory, name, cache, self.metrics)
+
+    def query_cache_invalidate(self, name):
+        # for changes that do not go through the cached Raidcom/Cci (e.g. a transaction)
+        if self.params.get('query_cache_ttl') and not self.trace_replaying():
+            hitachi_raidcom_query_cache(self.params.get('cache_dir'), self.serial, self.horcm_inst, self.params['query_cache_ttl']).invalidate(name)
+
+    def transaction(self):
+        # queue changing raidcom commands, run them under one lock resource: see hitachi_raidcom_transaction
+        return hitachi_raidcom_transaction(self)
+
+    def planned(self, target, name):
+        # check_mode: the changing calls of target go to the plan
+        if self.plan is None:
+            return target
+        return hitachi_raidcom_planned(target, name, self.plan)
+
+    @property
+    def cci(self):
+        if self.storage_cci is None:
+            self.storage_cci = self.planned(self.query_cached(self.cci_session, 'cci'), 'cci')
+        return self.storage_cci
+
+    @property
+    def mystorage(self):
+        if self.storage is None:
+            self.storage = self.planned(self.query_cached(self.raidcom_session, 'raidcom'), 'raidcom')
+        return self.storage
 
     # ####
     # # UTILITIES to be moved into hiraid
@@ -134,18 +377,23 @@ class hitachi_raidcom(object):
 
         return {'blks': round(blks), 'MB': round(MB), 'GB': round(GB, 2), 'TB': round(TB, 2), 'PB': round(PB, 2)}
 
+    def blkstomb_batch(self, blks):
+        # blkstomb for a whole column of block counts in one pass: one list per unit instead of one dict per value
+        batch = {'blks': [], 'MB': [], 'GB': [], 'TB': [], 'PB': []}
+        for value in blks:
+            MB = int(value) / 2048
+            batch['blks'].append(int(value))
+            batch['MB'].append(round(MB))
+            batch['GB'].append(round(MB / 1024, 2))
+            batch['TB'].append(round(MB / 1048576, 2))
+            batch['PB'].append(round(MB / 1073741824, 2))
+        return batch
+
     def convertSizeToBlocks(self, size):
         if not size:
             return None
-        units = [
-            ('PB', 2 ** 50),
-            ('TB', 2 ** 40),
-            ('GB', 2 ** 30),
-            ('MB', 2 ** 20),
-            ('KB', 2 ** 10),
-            ('B', 1)]
         size = size.upper()
-        for suffix, multiplier in units:
+        for suffix, multiplier in volume_size_units:
             if size.endswith(suffix):
                 num_units = size[:-len(suffix)]
                 try:
@@ -160,6 +408,8 @@ class hitachi_raidcom(object):
     # #####
 
     def volume_get_properties(self):
+        if self.params.get('volumes'):
+            return self.volumes_run('get_properties')
         result = {}
         # self.module.fail_json(msg='{}'.format(self.params['volume_id']))
         if self.params['volume_id'] == "":
@@ -173,28 +423,127 @@ class hitachi_raidcom(object):
                 ldev_id=self.params['volume_id']).view
         return result
 
+    def volume_name_index_path(self):
+        # the index is per storage, without storage_serial it is not cached
+        if self.serial is None or self.trace_replaying():
+            return None
+        return cache_path(self.params.get('cache_dir'), self.serial, 'ldev_names')
+
+    def volume_name_index(self):
+        # volume_name -> [volume_id, ...] index, built from a single getldevlist scan
+        # and kept per storage serial in a local cache file for cache_ttl seconds (opt-in)
+        if self.ldev_name_index is not None:
+            return self.ldev_name_index
+        index = cache_load(self.volume_name_index_path(), self.params.get('cache_ttl'))
+        if index is None:
+            index = self.volume_name_index_build(
+                self.mystorage.getldevlist(ldevtype='defined').view)
+            cache_save(self.volume_name_index_path(), index)
+        self.ldev_name_index = index
+        return index
+
+    def volume_name_index_build(self, ldevlist):
+        index = {}
+        for item in ldevlist:
+            volumeName = ldevlist[item].get('LDEV_NAMING', '')
+            # unnamed volumes can not be looked up by name
+            if volumeName != '':
+                index.setdefault(volumeName, []).append(ldevlist[item]['LDEV'])
+        return index
+
+    def volume_name_index_invalidate(self):
+        # any change of volumes or volume_names makes the index stale, planned changes do not
+        if self.plan is not None:
+            return
+        self.ldev_name_index = None
+        cache_invalidate(self.volume_name_index_path())
+
+    def ldev_allocator_path(self):
+        # a replay builds the free list from the recorded listing and keeps its reservations to itself
+        if self.trace_replaying():
+            return None
+        return cache_path(self.params.get('cache_dir'), self.serial, 'free_ldevs')
+
+    def ldev_max_id(self):
+        # highest LDEV id of the storage model (hiraid Storagecapabilities)
+        if self.storage_broker():
+            return int(self.mystorage.broker_getattr('maxldevid'))
+        return int(self.mystorage.maxldevid)
+
+    def ldev_allocator(self):
+        # free LDEV ids per resource group, from the cache or built from one undefined LDEV listing
+        if self.ldev_free is None:
+            data = cache_load(self.ldev_allocator_path(), self.ldev_allocator_ttl())
+            if data is not None:
+                self.ldev_free = hitachi_raidcom_ldev_allocator.from_data(data)
+            else:
+                self.ldev_free = hitachi_raidcom_ldev_allocator.from_ldevlist(
+                    self.mystorage.getldevlist(ldevtype='undefined').view, self.ldev_max_id())
+        return self.ldev_free
+
+    def ldev_allocator_ttl(self):
+        # the bitmap holds the reservations of parallel tasks, it is kept at least as long as they are
+        return max(self.params.get('cache_ttl') or 0, ldev_reservation_ttl)
+
+    def ldev_reserve(self, count, exclude=()):
+        # reserve count free volume_ids in resource_group_id between ldev_range_start and ldev_range_end
+        # (default: all ids of the model), one contiguous range if there is one
+        # returns None if there are not enough free ids
+        path = self.ldev_allocator_path()
+        rsgid = str(self.params.get('resource_group_id') or 0)
+        with cache_lock(path):
+            # a parallel task may have reserved ids since this one read the bitmap
+            self.ldev_free = None
+            allocator = self.ldev_allocator()
+            start = int(self.params.get('ldev_range_start') or 0)
+            end = self.params.get('ldev_range_end')
+            end = allocator.max_ldev_id if end in (None, '') else int(end)
+            allocator.mark_used(exclude)
+            ldevIds = allocator.reserve(count, rsgid, start, end) or allocator.reserve(count, rsgid, start, end, contiguous=False)
+            if ldevIds is not None and not getattr(self.module, 'check_mode', False):
+                cache_save(path, allocator.to_data())
+        return [str(ldevId) for ldevId in ldevIds] if ldevIds is not None else None
+
+    def ldev_allocator_release(self, ldevs):
+        # deleted volumes ({volume_id: resource group id, None if not known}) are free again: their bits are set
+        # under the lock and the reservations parallel tasks hold in the same bitmap are kept
+        # without a bitmap there is nothing to update, the next reservation builds it from the undefined LDEVs
+        if self.plan is not None or not ldevs:
+            return
+        path = self.ldev_allocator_path()
+        with cache_lock(path):
+            data = cache_load(path, self.ldev_allocator_ttl())
+            if data is None:
+                self.ldev_free = None
+                return
+            allocator = hitachi_raidcom_ldev_allocator.from_data(data)
+            for ldevId, rsgid in ldevs.items():
+                if rsgid is None:
+                    try:
+                        # an undefined LDEV stays in its resource group
+                        rsgid = self.mystorage.getldev(ldev_id=ldevId).view[str(ldevId)].get('RSGID', '0')
+                    except Exception:
+                        # not marked free, it is only handed out again once the bitmap is built anew
+                        continue
+                allocator.mark_free([ldevId], rsgid)
+            cache_save(path, allocator.to_data())
+            self.ldev_free = allocator
+
     def volume_name_to_volume_id(self):
         if self.params['volume_name'] != '':
-            result = {}
             # result to give back
             resultVolumeId = ""
             # as volume_name is not enforced to be unique in storage
             # we need to verify it realy only exists once
             # once Hitachi storage can enforce single volume_name this routine can be simplified
-            countOfNameOccuranceInStorage = 0
-            # get all LDEVS including it's volume_names
-            result = self.mystorage.getldevlist(ldevtype='defined').view
-            for item in result:
-                if result[item]['LDEV_NAMING'] == self.params['volume_name']:
-                    countOfNameOccuranceInStorage = countOfNameOccuranceInStorage + 1
-                    resultVolumeId = result[item]['LDEV']
-                    # self.module.fail_json(msg='volume_name_to_volume_id - Found: {} '.format(result[item]['LDEV']))
-                    # return resultVolumeId
+            volumeIds = self.volume_name_index().get(self.params['volume_name'], [])
+            countOfNameOccuranceInStorage = len(volumeIds)
             if countOfNameOccuranceInStorage == 0:
                 # volume_name does not yet exists
                 return ""
             if countOfNameOccuranceInStorage == 1:
                 # one volume with this name found
+                resultVolumeId = volumeIds[0]
                 # check if found LDEVID is equeal given LDEVID, if one given
                 if self.params['volume_id'] != '':
                     # given LDEVID
@@ -208,7 +557,7 @@ class hitachi_raidcom(object):
                 return resultVolumeId
             # in all other cases we have an error
             self.module.fail_json(
-                msg='volume_name_to_volume_id error - volume_name is not unique. Found {} volumes with same name.'.format(str(countOfNameOccuranceInStorage)))
+                msg='volume_name_to_volume_id error - volume_name is not unique. Found {} volumes with same name: {}'.format(str(countOfNameOccuranceInStorage), ', '.join(volumeIds)))
         else:
             if self.params['volume_id'] != '':
                 # return given volume_id
@@ -275,6 +624,8 @@ class hitachi_raidcom(object):
         return result['result'][str(self.params['volume_id'])]['VOL_Capacity(BLK)']
 
     def volume_expand(self):
+        if self.params.get('volumes'):
+            return self.volumes_run('expand')
         if self.params['volume_id'] == '':
             self.params['volume_id'] = self.volume_name_to_volume_id()
             if self.params['volume_id'] == '':
@@ -287,32 +638,46 @@ class hitachi_raidcom(object):
         return vars(expand)
 
     def volume_create(self):
-        if self.params['volume_id'] == '':
-            # use the next free ldev_id
-            # old: self.params['volume_id'] = self.mystorage.getnextfreeldev()['ldev']
-            # this needs review as the static ranges do not match all Hitachi storage models
-            createTemp = self.mystorage.addldevauto(
-                ldev_id=self.params['volume_id'], poolid=self.params['pool_id'], capacityblk=self.params['volume_size'], resource_id=0, start=0, end=5000)
-            # self.module.fail_json(msg=' %s' % json.dumps(create))
-            self.params['volume_id'] = createTemp["ID"]
-            create = self.mystorage.getldev(
-                ldev_id=self.params['volume_id']).view
-            # self.module.fail_json(msg=' %s' % json.dumps(create))
-        else:
-            create = vars(self.mystorage.addldev(
-                ldev_id=self.params['volume_id'], poolid=self.params['pool_id'], capacity=self.params['volume_size']))
+        if self.params.get('volumes'):
+            return self.volumes_run('create')
+        automatic = self.params['volume_id'] == ''
+        if automatic:
+            # use the next free ldev_id in the range of the storage model
+            ldevIds = self.ldev_reserve(1)
+            if not ldevIds:
+                self.module.fail_json(msg='volume_create error - no free volume_id left in resource group {}'.format(
+                    self.params.get('resource_group_id') or 0))
+            self.params['volume_id'] = ldevIds[0]
+        # add ldev and its name in one transaction
+        transaction = self.transaction()
+        create = transaction.add('addldev', key='volume', ldev_id=self.params['volume_id'], poolid=self.params['pool_id'],
+                                 capacity=self.params['volume_size'])
         if not self.params['volume_name'] == "":
-            modify_ldevname = self.mystorage.modifyldevname(
-                ldev_id=self.params['volume_id'], ldev_name=self.params['volume_name'])
-        # return vars(create)
-        return create
+            transaction.add('modifyldevname', key='volume', ldev_id=self.params['volume_id'], ldev_name=self.params['volume_name'])
+        try:
+            transaction.execute()
+        finally:
+            self.volume_name_index_invalidate()
+        # the id of a failed add ldev stays used in the bitmap, whether it was taken outside of this collection or not
+        failed = [operation for operation in transaction.operations if operation['status'] == 'failed']
+        if failed:
+            self.module.fail_json(msg='volume_create error - {} failed: {}'.format(failed[0]['method'], failed[0]['msg']),
+                                  operations=transaction.operations)
+        if automatic:
+            # the new volume as get ldev shows it
+            return self.mystorage.getldev(ldev_id=self.params['volume_id']).view
+        # the hiraid Cmdview fields of the add ldev
+        return {key: create.get(key) for key in ('cmd', 'returncode', 'stdout', 'stderr')}
 
     def volume_set_name(self):
         modify_ldevname = self.mystorage.modifyldevname(
             ldev_id=self.params['volume_id'], ldev_name=self.params['volume_name'])
+        self.volume_name_index_invalidate()
         return vars(modify_ldevname)
 
     def volume_delete(self):
+        if self.params.get('volumes'):
+            return self.volumes_run('delete')
         if self.params['volume_id'] == '':
             self.params['volume_id'] = self.volume_name_to_volume_id()
             if self.params['volume_id'] == '':
@@ -320,56 +685,863 @@ class hitachi_raidcom(object):
                 return {}
                 # self.module.fail_json(msg='volume_name and volume_id error - volume_name is NOT found on storage')
         delete = self.mystorage.deleteldev(ldev_id=self.params['volume_id'])
+        self.volume_name_index_invalidate()
+        self.ldev_allocator_release({str(self.params['volume_id']): None})
         return vars(delete)
 
+    # #####
+    # # Batch volume management
+    # # volumes: [{volume_id, volume_name, volume_size, pool_id}, ...] handled in one invocation
+    # #####
+
+    def volumes_snapshot(self):
+        # a single getldevlist is the storage state every item of the list is compared against
+        # its name index is not written to the cache file, capacity_facts reads the snapshot too
+        if self.ldev_snapshot is None:
+            self.ldev_snapshot = self.mystorage.getldevlist(ldevtype='defined').view
+            self.ldev_name_index = self.volume_name_index_build(self.ldev_snapshot)
+        return self.ldev_snapshot
+
+    def volumes_items(self):
+        # fill every item with the single volume defaults, so items can omit e.g. pool_id
+        items = []
+        for volume in self.params['volumes']:
+            item = {'volume_id': '', 'volume_name': '', 'volume_size': None,
+                    'pool_id': self.params.get('pool_id')}
+            item.update(volume)
+            item['volume_id'] = str(item['volume_id']) if item['volume_id'] not in (None, '') else ''
+            item['volume_name'] = item['volume_name'] or ''
+            items.append(item)
+        return items
+
+    def volume_size_to_blocks(self, size):
+        # volume_size is given in blocks or with a unit (ex. 1GB), None if it is neither
+        # unlike convertSizeToBlocks a bad size does not fail the module, only the item of the list it belongs to
+        if size is None:
+            return None
+        size = str(size).strip().upper()
+        if size.isdigit():
+            return int(size)
+        for suffix, multiplier in volume_size_units:
+            if size.endswith(suffix):
+                try:
+                    return int(float(size[:-len(suffix)]) * multiplier / 512)
+                except ValueError:
+                    return None
+        return None
+
+    def volumes_actions(self, operation):
+        # compare each item against the snapshot and work out the raidcom calls it needs,
+        # nothing is executed here
+        snapshot = self.volumes_snapshot()
+        index = self.ldev_name_index
+        # ids and names claimed by earlier items of the same list
+        claimedIds = set()
+        claimedNames = set()
+        # creates without volume_id, their ids are reserved together once all items are known
+        autoActions = []
+        actions = []
+        for item in self.volumes_items():
+            action = {'volume_id': item['volume_id'], 'volume_name': item['volume_name'],
+                      'action': 'none', 'steps': [], 'changed': False}
+            actions.append(action)
+            # resolve the item to an existing volume_id
+            volumeId = item['volume_id']
+            if volumeId == '' and item['volume_name'] == '':
+                action.update(action='failed', msg='either volume_name or volume_id is needed')
+                continue
+            if volumeId == '':
+                found = index.get(item['volume_name'], [])
+                if len(found) > 1:
+                    action.update(action='failed', msg='volume_name is not unique. Found {} volumes with same name: {}'.format(
+                        len(found), ', '.join(found)))
+                    continue
+                volumeId = found[0] if found else ''
+            elif item['volume_name'] != '':
+                found = index.get(item['volume_name'], [])
+                if (found and found != [volumeId]) or (volumeId in snapshot and snapshot[volumeId].get('LDEV_NAMING', '') not in ('', item['volume_name'])):
+                    action.update(action='failed', msg='volume_name and volume_id do not match the volume found on storage')
+                    continue
+            exists = volumeId != '' and volumeId in snapshot
+            action['volume_id'] = volumeId
+            if (volumeId != '' and volumeId in claimedIds) or (item['volume_name'] != '' and item['volume_name'] in claimedNames):
+                action.update(action='failed', msg='volume is given more than once in volumes')
+                continue
+            if volumeId != '':
+                claimedIds.add(volumeId)
+            if item['volume_name'] != '':
+                claimedNames.add(item['volume_name'])
+
+            if operation == 'get_properties':
+                action['action'] = 'get'
+                action['result'] = {volumeId: snapshot[volumeId]} if exists else 'no volume with this volume_name found'
+                continue
+
+            if operation == 'delete':
+                if exists:
+                    action['action'] = 'delete'
+                    action['steps'].append(('deleteldev', {'ldev_id': volumeId}))
+                continue
+
+            blocks = self.volume_size_to_blocks(item['volume_size'])
+            if operation in ('create', 'expand') and not exists:
+                if blocks is None:
+                    action.update(action='failed', msg='check given volume_size (ex. 1GB)')
+                    continue
+                # volumes that do not exist are created, also when asked to expand them
+                action['action'] = 'create'
+                if volumeId == '':
+                    autoActions.append(action)
+                action['steps'].append(('addldev', {'ldev_id': volumeId, 'poolid': item['pool_id'], 'capacity': blocks,
+                                                    'return_ldev': False}))
+                if item['volume_name'] != '':
+                    action['steps'].append(('modifyldevname', {'ldev_id': volumeId, 'ldev_name': item['volume_name']}))
+                continue
+
+            if operation == 'expand':
+                if blocks is None:
+                    action.update(action='failed', msg='check given volume_size (ex. 1GB)')
+                    continue
+                # in a list volume_size is the wanted size, only the missing blocks are added
+                missing = blocks - int(snapshot[volumeId]['VOL_Capacity(BLK)'])
+                if missing < 0:
+                    action.update(action='failed', msg='volume_size {} blocks is smaller than the volume ({} blocks), volumes can not be shrunk'.format(
+                        blocks, snapshot[volumeId]['VOL_Capacity(BLK)']))
+                    continue
+                if missing > 0:
+                    action['action'] = 'expand'
+                    action['steps'].append(('extendldev', {'ldev_id': volumeId, 'capacity': missing}))
+
+        if autoActions:
+            # one reservation for all of them, a contiguous range of ids if the storage has one
+            ldevIds = self.ldev_reserve(len(autoActions), exclude=claimedIds)
+            for action, ldevId in zip(autoActions, ldevIds or []):
+                action['volume_id'] = ldevId
+                for method, args in action['steps']:
+                    args['ldev_id'] = ldevId
+            if ldevIds is None:
+                for action in autoActions:
+                    action.update(action='failed', steps=[], msg='no free volume_id left for the {} volumes without volume_id'.format(len(autoActions)))
+        return actions
+
+    def volumes_execute(self, actions):
+        # the steps of all items in one transaction: first steps of all items, then their second steps, ...
+        # so the asynchronous add/extend/delete ldev of all items are checked together
+        transaction = self.transaction()
+        for stage in range(max([len(action['steps']) for action in actions] or [0])):
+            for number, action in enumerate(actions):
+                if stage < len(action['steps']):
+                    method, args = action['steps'][stage]
+                    transaction.add(method, key=number, **args)
+        for action in actions:
+            action['results'] = []
+        try:
+            operations = transaction.execute()
+        except Exception as e:
+            for action in actions:
+                if action['steps']:
+                    action.update(action='failed', msg='transaction error: {}'.format(str(e)))
+            return actions
+        for operation in operations:
+            action = actions[operation['key']]
+            if operation['status'] == 'failed':
+                # the reserved id of a failed add ldev stays used in the bitmap
+                action.update(action='failed', msg='{} error: {}'.format(operation['method'], operation['msg']))
+            elif operation['status'] in ('ok', 'planned'):
+                action['changed'] = True
+                action['results'].append({'cmd': operation['cmd'], 'returncode': operation['returncode'],
+                                          'stdout': operation['stdout'], 'stderr': operation['stderr']})
+        return actions
+
+    def volumes_run(self, operation):
+        actions = self.volumes_execute(self.volumes_actions(operation))
+        result = {'changed': False, 'volumes': []}
+        for action in actions:
+            del action['steps']
+            result['volumes'].append(action)
+            result['changed'] = result['changed'] or action['changed']
+        if result['changed'] and self.plan is None:
+            if operation == 'delete':
+                self.ldev_allocator_release(dict((action['volume_id'], self.ldev_snapshot[action['volume_id']].get('RSGID'))
+                                                 for action in actions if action['action'] == 'delete' and action['changed']))
+            self.volume_name_index_invalidate()
+            self.ldev_snapshot = None
+        if [action for action in actions if action['action'] == 'failed']:
+            result['failed'] = True
+            result['msg'] = 'volumes error - at least one item failed, see volumes for details'
+        return result
+
+    # #####
+    # # capacity report
+    # #####
+
+    def capacity_facts(self):
+        # provisioned (VOL_Capacity) and used (Used_Block) capacity of all defined LDEVs, from one getldevlist
+        # snapshot, per pool (B_POOLID), resource group and volume_name prefix (up to name_prefix_separator)
+        snapshot = self.volumes_snapshot()
+        separator = self.params.get('name_prefix_separator') or '_'
+        # {dimension: {key: [ldevs, provisioned blks, used blks]}}, summed in one pass over the snapshot
+        totals = {'pools': {}, 'resource_groups': {}, 'name_prefixes': {}, 'total': {}}
+        for ldev in snapshot.values():
+            provisionedBlks = int(ldev.get('VOL_Capacity(BLK)') or 0)
+            # no Used_Block for volumes outside of a DP pool
+            usedBlks = int(ldev.get('Used_Block(BLK)') or 0)
+            keys = {'pools': ldev.get('B_POOLID') or 'NONE',
+                    'resource_groups': ldev.get('RS_GROUP') or ldev.get('RSGID') or '0',
+                    'name_prefixes': (ldev.get('LDEV_NAMING') or '').split(separator, 1)[0],
+                    'total': 'total'}
+            for dimension in keys:
+                total = totals[dimension].setdefault(keys[dimension], [0, 0, 0])
+                total[0] += 1
+                total[1] += provisionedBlks
+                total[2] += usedBlks
+        facts = {'columns': list(capacity_columns), 'ldevs': len(snapshot)}
+        for dimension in ('pools', 'resource_groups', 'name_prefixes'):
+            facts[dimension] = self.capacity_table(totals[dimension])
+        facts['total'] = self.capacity_table(totals['total'] or {'total': [0, 0, 0]})[0]
+        result = {}
+        result['facts'] = facts
+        result['changed'] = False
+        return result
+
+    def capacity_table(self, totals):
+        # {key: [ldevs, provisioned blks, used blks]} to rows of capacity_columns, sorted by key
+        keys = sorted(totals)
+        provisioned = self.blkstomb_batch([totals[key][1] for key in keys])
+        used = self.blkstomb_batch([totals[key][2] for key in keys])
+        return [[key, totals[key][0], provisioned['blks'][n], used['blks'][n], provisioned['GB'][n], used['GB'][n],
+                 round(100.0 * used['blks'][n] / provisioned['blks'][n], 1) if provisioned['blks'][n] else 0.0]
+                for n, key in enumerate(keys)]
+
     # #####
     # # hostgroup management
     # #####
 
     def host_grp_get_facts(self):
+        if self.params.get('ports'):
+            return self.host_grps_get_facts()
         result = {}
         cmdreturn = self.mystorage.gethostgrp_key_detail(port=self.params['port'],datafilter={'GROUP_NAME':self.params['host_grp_name']})
         result['facts'] = cmdreturn.data
         result['changed'] = False
         return result
 
+    def host_grps_get_facts(self):
+        # host groups and their WWNs of a ports list (or all target ports) in one result, indexed by port,
+        # host group name and WWN; host_grp_name is an optional glob or list of globs
+        # one raidcom call per port and per matching host group, at most max_workers at the same time
+        import concurrent.futures
+        import fnmatch
+        ports = self.params['ports']
+        if ports in ('all', ['all']):
+            ports = [port['PORT'] for port in self.mystorage.getport(update_view=False).data if 'TAR' in port.get('ATTR', '')]
+        ports = sorted(set(str(port).upper() for port in ports))
+        patterns = self.params.get('host_grp_name') or ['*']
+        patterns = [patterns] if isinstance(patterns, str) else patterns
+        # set up Raidcom once, before the threads use it
+        self.mystorage
+        errors = {}
+
+        def fetch(key, function, **kwargs):
+            try:
+                return function(update_view=False, **kwargs).data
+            except Exception as e:
+                errors[key] = str(e)
+                return []
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.params.get('max_workers') or 10) as executor:
+            portGroups = executor.map(lambda port: fetch(port, self.mystorage.gethostgrp_key_detail, port=port), ports)
+            hostGroups = [hostGroup for groups in portGroups for hostGroup in groups
+                          if [pattern for pattern in patterns if fnmatch.fnmatchcase(hostGroup['GROUP_NAME'], pattern)]]
+            groupWwns = executor.map(lambda hostGroup: fetch(hostGroup['HOST_GRP_ID'], self.mystorage.gethbawwn, port=hostGroup['HOST_GRP_ID']), hostGroups)
+            facts = {'ports': {}, 'host_grp_names': {}, 'wwns': {}}
+            for hostGroup, wwns in zip(hostGroups, groupWwns):
+                hostGroup = dict(hostGroup, WWNs=[wwn['HWWN'] for wwn in wwns])
+                facts['ports'].setdefault(hostGroup['PORT'], {})[hostGroup['GROUP_NAME']] = hostGroup
+                facts['host_grp_names'].setdefault(hostGroup['GROUP_NAME'], []).append(hostGroup['HOST_GRP_ID'])
+                for wwn in hostGroup['WWNs']:
+                    facts['wwns'].setdefault(wwn, []).append(hostGroup['HOST_GRP_ID'])
+        facts['errors'] = errors
+        result = {}
+        result['facts'] = facts
+        result['changed'] = False
+        return result
+
     # #####
     # # HUR management
     # #####
 
+    def hur_copy_groups(self):
+        # [(copy_group, horcm_inst), ...] from copy_groups, entries are a copy_group name
+        # or a dict with copy_group and its own horcm_inst
+        groups = []
+        for entry in self.params.get('copy_groups') or []:
+            if isinstance(entry, dict):
+                groups.append((entry['copy_group'], int(entry.get('horcm_inst', self.horcm_inst))))
+            else:
+                groups.append((str(entry), self.horcm_inst))
+        return groups
+
+    def hur_run(self, function):
+        # single copy_group: return the result of function as is
+        if not self.params.get('copy_groups'):
+            return function(self.params['copy_group'], self.horcm_inst)
+        return self.hur_fanout(function, self.hur_copy_groups())
+
+    def hur_fanout(self, function, groups):
+        # run function(copy_group, horcm_inst) for all groups, at most max_workers at the same time
+        # a failing group does not stop the others, its error is part of its own result
+        def run_group(copy_group, inst):
+            groupResult = {'horcm_inst': inst, 'failed': False}
+            start = time.time()
+            try:
+                groupResult['facts'] = function(copy_group, inst)
+            except Exception as e:
+                groupResult['failed'] = True
+                groupResult['msg'] = str(e)
+            groupResult['elapsed_seconds'] = round(time.time() - start, 3)
+            return groupResult
+
+        import concurrent.futures
+        # set up Cci once, before the threads use it
+        self.cci
+        # a copy_group listed for more than one horcm_inst is keyed <copy_group>@<horcm_inst>
+        names = [copy_group for copy_group, inst in groups]
+        facts = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.params.get('max_workers') or 10) as executor:
+            futures = {}
+            for copy_group, inst in groups:
+                key = copy_group if names.count(copy_group) == 1 else '{}@{}'.format(copy_group, inst)
+                futures[executor.submit(run_group, copy_group, inst)] = key
+            for future in concurrent.futures.as_completed(futures):
+                facts[futures[future]] = future.result()
+        return dict(sorted(facts.items()))
+
+    def hur_pair_state(self, pairdisplaydata):
+        # condense the local side of all pairs of a pairdisplayx into one group state
+        statuses = {}
+        roles = {}
+        percents = []
+        for group in pairdisplaydata['pairs']:
+            for pairvol in pairdisplaydata['pairs'][group]:
+                local = pairdisplaydata['pairs'][group][pairvol]['L']
+                statuses[local['Status']] = statuses.get(local['Status'], 0) + 1
+                roles[local['P/S']] = roles.get(local['P/S'], 0) + 1
+                if local['%'] != '-':
+                    percents.append(int(local['%']))
+        state = list(statuses)[0] if len(statuses) == 1 else ('MIXED', 'SMPL')[not statuses]
+        return {'state': state, 'statuses': statuses, 'roles': roles, 'pairs': sum(statuses.values()),
+                'percent': round(sum(percents) / len(percents), 1) if percents else None}
+
+    def hur_wait(self):
+        return self.hur_run(self.hur_wait_group)
+
+    def hur_wait_group(self, copy_group, inst):
+        # poll pairdisplayx until all pairs are in the wait_for state, an error state or timeout
+        # the interval follows the copy progress: the faster the copy the closer the polls to the expected end
+        accepted = hur_wait_states[self.params['wait_for']]
+        start = time.time()
+        deadline = start + self.params['timeout']
+        interval = hur_wait_min_interval
+        history = []
+        while True:
+            pairState = self.hur_pair_state(self.hur_pairdisplay(copy_group, inst, fresh=True)['pairdisplaydata'])
+            now = time.time()
+            sample = {'elapsed_seconds': round(now - start, 1), 'state': pairState['state'],
+                      'percent': pairState['percent'], 'eta_seconds': None}
+            if history and pairState['percent'] is not None and history[-1]['percent'] is not None:
+                # copy rate in percent per second since the last sample
+                rate = (pairState['percent'] - history[-1]['percent']) / max(now - lastPoll, 0.001)
+                if rate > 0:
+                    sample['eta_seconds'] = round((100 - pairState['percent']) / rate)
+            history.append(sample)
+            lastPoll = now
+            # a copy_group without pairs never reaches a state, polling it again does not change that
+            reached = pairState['pairs'] > 0 and all(status in accepted for status in pairState['statuses'])
+            failedStates = [status for status in pairState['statuses'] if status in hur_error_states]
+            if reached or failedStates or not pairState['pairs'] or now >= deadline:
+                break
+            if sample['eta_seconds'] is not None:
+                interval = sample['eta_seconds'] / 4
+            else:
+                # no progress seen, back off
+                interval = interval * 2
+            interval = min(max(interval, hur_wait_min_interval), hur_wait_max_interval)
+            time.sleep(min(interval, max(deadline - time.time(), 0)))
+        return {'wait_for': self.params['wait_for'], 'reached': reached, 'state': pairState['state'],
+                'statuses': pairState['statuses'], 'pairs': pairState['pairs'], 'error_states': failedStates,
+                'elapsed_seconds': round(time.time() - start, 1), 'eta_seconds': sample['eta_seconds'],
+                'polls': len(history), 'history': history}
+
     def hur_status(self):
-        pairdisplay = self.mystorage.cci.pairdisplayx(
-            inst=self.horcm_inst, group=self.params['copy_group'],opts=self.params['options'])
+        return self.hur_run(self.hur_status_group)
+
+    def hur_status_group(self, copy_group, inst):
+        if self.params.get('summary'):
+            return self.hur_summary(copy_group, inst)
+        if self.params.get('fields'):
+            return self.hur_projection(copy_group, inst)
+        return self.hur_pairdisplay(copy_group, inst, opts=self.params['options'])
+
+    def hur_pairdisplay_rows(self, copy_group, inst, opts=''):
+        # the rows of the parsed Cci.pairdisplayx (pairdisplay -fce -CLI) as {column: value}, the L row of a pair
+        # before its R row; through the query cache, broker and instance pool like every other pairdisplayx
+        pairs = self.hur_pairdisplay(copy_group, inst, opts=opts)['pairdisplaydata']['pairs']
+        for group in pairs:
+            for pairvol in pairs[group]:
+                for side in pairs[group][pairvol]:
+                    yield pairs[group][pairvol][side]
+
+    def hur_journal_rows(self, copy_group, inst):
+        # the rows of pairdisplay -v jnl -CLI as {column: value}, run by Cci.execute: pairdisplayx can not parse them
+        # never from the query cache, they are the samples of a time series
+        scheduler = self.horcm_scheduler()
+        if not scheduler or int(inst) not in scheduler.instances:
+            stdout = self.hur_journal_display(copy_group, inst)
+        else:
+            with scheduler.slot(self.metrics) as pooledInst:
+                stdout = self.hur_journal_display(copy_group, pooledInst)
+        lines = [line.split() for line in stdout.splitlines() if line.strip()]
+        return [dict(zip(lines[0], values)) for values in lines[1:]] if lines else []
+
+    def hur_journal_display(self, copy_group, inst):
+        # Cci.execute raises with the return code, stdout and stderr of a failed command
+        stdout, stderr, returncode = self.cci_session().execute('{}pairdisplay -g {} -I{} -v jnl -CLI'.format(self.cci_path, copy_group, inst))
+        return stdout
+
+    def hur_projection(self, copy_group, inst):
+        # pairdisplaydata shaped like pairdisplayx, each side with the fields columns only
+        fields = self.params['fields']
+        pairs = {}
+        for row in self.hur_pairdisplay_rows(copy_group, inst, opts=self.params['options']):
+            pairs.setdefault(row['Group'], {}).setdefault(row['PairVol'], {})[row['L/R']] = {field: row.get(field) for field in fields}
+        return {'cmdreturn': 0, 'pairdisplaydata': {'pairs': pairs}}
+
+    def hur_summary(self, copy_group, inst):
+        # counts of the local side per Status, Fence, JID and P/S, the pairs not in expected_state in full
+        # from the rows of the parsed pairdisplayx, the R row of a pair follows its L row
+        accepted = hur_wait_states[self.params.get('expected_state') or 'PAIR']
+        fields = self.params.get('fields') or hur_summary_fields
+        counts = {'Status': {}, 'Fence': {}, 'JID': {}, 'P/S': {}}
+        unexpected = {}
+        pairs = 0
+        for row in self.hur_pairdisplay_rows(copy_group, inst, opts=self.params['options']):
+            if row['L/R'] != 'L':
+                if row['PairVol'] in unexpected:
+                    unexpected[row['PairVol']]['remote_status'] = row.get('Status')
+                continue
+            pairs += 1
+            for column in counts:
+                value = row.get(column)
+                counts[column][value] = counts[column].get(value, 0) + 1
+            if row.get('Status') not in accepted:
+                unexpected[row['PairVol']] = {field: row.get(field) for field in fields}
+        return {'pairs': pairs, 'expected_state': self.params.get('expected_state') or 'PAIR',
+                'statuses': counts['Status'], 'fences': counts['Fence'], 'journals': counts['JID'], 'roles': counts['P/S'],
+                'unexpected': len(unexpected), 'unexpected_pairs': unexpected}
+
+    def hur_pairdisplay(self, copy_group, inst, opts='', fresh=False):
+        # print_pairdisplay: stdout is reserved for the module result
+        # fresh: not from the query cache, for decisions and polls; a plan decides on the snapshot
+        cci = self.cci_session() if fresh and self.plan is None else self.cci
+        pairdisplay = cci.pairdisplayx(
+            inst=inst, group=copy_group, opts=opts or '', print_pairdisplay=False)
         #return pairdisplay['pairdisplaydata']['pairs'][self.params['copy_group']]
         return pairdisplay
         # self.module.fail_json(msg=(pairdisplay['pairdisplaydata']['pairs'][self.params['copy_group']]))
 
+    def hur_transition_needed(self, transition, pairState):
+        # decide from the current pair state if the CCI command of a transition changes anything
+        statuses = pairState['statuses']
+        if transition == 'create':
+            # paircreate is only needed for pairs that are not yet paired
+            return 'SMPL' in statuses or not statuses
+        if transition == 'delete' or (transition == 'split' and self.params['options'] == '-S'):
+            return [status for status in statuses if status != 'SMPL'] != []
+        if transition == 'split':
+            if self.params['options'] == '-RB':
+                # -RB brings SSWS back to SSUS
+                return 'SSWS' in statuses
+            return [status for status in statuses if status not in hur_split_states] != []
+        if transition == 'resync':
+            return [status for status in statuses if status not in hur_paired_states] != []
+        if transition == 'takeover':
+            # nothing to take over when the local side already is the P-VOL of a pair or a swapped S-VOL (SSWS)
+            if [status for status in statuses if status != 'SSWS'] == []:
+                return False
+            return not ([status for status in statuses if status not in hur_paired_states] == [] and list(pairState['roles']) == ['P-VOL'])
+        return True
+
+    def hur_transition(self, transition):
+        return self.hur_run(lambda copy_group, inst: self.hur_transition_group(transition, copy_group, inst))
+
+    def hur_transition_group(self, transition, copy_group, inst):
+        # one pairdisplayx per group, the CCI command only runs if the group is not yet in the target state
+        before = self.hur_pair_state(self.hur_pairdisplay(copy_group, inst, fresh=True)['pairdisplaydata'])
+        if transition == 'create' and 'SMPL' in before['statuses'] and len(before['statuses']) > 1:
+            # paircreate of the whole group fails on the pairs that are already paired
+            raise Exception('paircreate error - copy_group {} is MIXED ({}), pair or delete the pairs not in SMPL first'.format(
+                copy_group, ', '.join('{} {}'.format(status, count) for status, count in sorted(before['statuses'].items()))))
+        if not self.hur_transition_needed(transition, before):
+            return {'changed': False, 'state_before': before,
+                    'msg': 'copy_group {} is already {}, {} skipped'.format(copy_group, before['state'], transition)}
+        facts = getattr(self, 'hur_{}_group'.format(transition))(copy_group, inst)
+        facts.update(changed=True, state_before=before)
+        return facts
+
     def hur_create(self):
-        paircreate = self.mystorage.cci.paircreate(
-            inst=self.horcm_inst, group=self.params['copy_group'], mode='H', jp=self.params['journal_primary'], js=self.params['journal_secondary'], fence='async 10')
+        return self.hur_transition('create')
+
+    def hur_create_group(self, copy_group, inst):
+        paircreate = self.cci.paircreate(
+            inst=inst, group=copy_group, mode='H', jp=self.params['journal_primary'], js=self.params['journal_secondary'], fence='async 10')
         return paircreate
 
     def hur_delete(self):
-        pairdelete = self.mystorage.cci.pairsplit(
-            inst=self.horcm_inst, group=self.params['copy_group'], opts='-S')
+        return self.hur_transition('delete')
+
+    def hur_delete_group(self, copy_group, inst):
+        pairdelete = self.cci.pairsplit(
+            inst=inst, group=copy_group, opts='-S')
         return pairdelete
 
     def hur_split(self):
-        pairsplit = self.mystorage.cci.pairsplit(
-            inst=self.horcm_inst, group=self.params['copy_group'], opts=self.params['options'])
+        return self.hur_transition('split')
+
+    def hur_split_group(self, copy_group, inst):
+        pairsplit = self.cci.pairsplit(
+            inst=inst, group=copy_group, opts=self.params['options'] or '')
         return pairsplit
 
     def hur_resync(self):
-        pairresync = self.mystorage.cci.pairresync(
-            inst=self.horcm_inst, group=self.params['copy_group'], mode='H')
+        return self.hur_transition('resync')
+
+    def hur_resync_group(self, copy_group, inst):
+        pairresync = self.cci.pairresync(
+            inst=inst, group=copy_group, mode='H')
         return pairresync
 
     def hur_takeover(self):
-        pairtakeover = self.mystorage.cci.pairtakeover(
-            inst=self.horcm_inst, group=self.params['copy_group'], mode='H', timeout=self.params['timeout'])
+        return self.hur_transition('takeover')
+
+    def hur_takeover_group(self, copy_group, inst):
+        pairtakeover = self.cci.pairtakeover(
+            inst=inst, group=copy_group, mode='H', timeout=self.params['timeout'])
         return pairtakeover
-    
+
+    def hur_monitor(self):
+        return self.hur_run(self.hur_monitor_group)
+
+    def hur_monitor_group(self, copy_group, inst):
+        # samples times pairdisplay -v jnl, interval seconds apart; per journal the usage (U(%)), the pending
+        # entries (Q-CNT) and the sequence marker (Q-Marker) of each sample and the rates derived from them
+        samples = max(self.params.get('samples') or 10, 1)
+        interval = (self.params.get('interval'), 10)[self.params.get('interval') is None]
+        start = time.time()
+        journals = {}
+        for sample in range(samples):
+            if sample:
+                time.sleep(max(start + sample * interval - time.time(), 0))
+            seconds = round(time.time() - start, 1)
+            for row in self.hur_journal_rows(copy_group, inst):
+                journal = journals.setdefault(row['JID'], {'capacity_blks': int(row['D-SZ(BLK)']), 'rows': []})
+                journal['rows'].append([seconds, float(row['U(%)']), int(row['Q-CNT']), int(row['Q-Marker'], 16), row['JNLS']])
+        return {'samples': samples, 'interval': interval,
+                'journals': {jid: self.hur_journal_rates(journal['rows'], journal['capacity_blks']) for jid, journal in journals.items()}}
+
+    def hur_rate(self, points):
+        # least squares slope of [(seconds, value), ...], None with less than two points in time
+        if len(points) < 2:
+            return None
+        meanX = sum(x for x, y in points) / len(points)
+        meanY = sum(y for x, y in points) / len(points)
+        variance = sum((x - meanX) ** 2 for x, y in points)
+        if not variance:
+            return None
+        return sum((x - meanX) * (y - meanY) for x, y in points) / variance
+
+    def hur_journal_rates(self, rows, capacity):
+        # fill rate (+) or drain rate (-) of the journal, time to full or empty at that rate, and the RPO:
+        # the pending entries (Q-CNT) divided by the rate entries are written (Q-Marker), i.e. seconds of writes not yet on the secondary
+        last = rows[-1]
+        fillRate = self.hur_rate([(row[0], row[1]) for row in rows])
+        backlogRate = self.hur_rate([(row[0], row[2]) for row in rows])
+        writeRate = self.hur_rate([(row[0], row[3]) for row in rows])
+        result = {'jnls': last[4], 'capacity_blks': capacity, 'usage_percent': last[1], 'q_cnt': last[2],
+                  'fill_rate_percent_per_second': None if fillRate is None else round(fillRate, 4),
+                  'fill_rate_blks_per_second': None if fillRate is None else round(fillRate * capacity / 100),
+                  'backlog_rate_entries_per_second': None if backlogRate is None else round(backlogRate, 1),
+                  'write_rate_entries_per_second': None if writeRate is None else round(writeRate, 1),
+                  'time_to_full_seconds': None, 'time_to_empty_seconds': None, 'rpo_seconds': None,
+                  'series': {'columns': list(hur_monitor_columns), 'rows': rows}}
+        if fillRate and fillRate > 0:
+            result['time_to_full_seconds'] = round((100 - last[1]) / fillRate)
+        elif fillRate and fillRate < 0:
+            result['time_to_empty_seconds'] = round(last[1] / -fillRate)
+        if last[2] == 0:
+            result['rpo_seconds'] = 0
+        elif writeRate and writeRate > 0:
+            result['rpo_seconds'] = round(last[2] / writeRate, 1)
+        return result
+
+    def hur_sites(self):
+        return self.hur_run(self.hur_sites_group)
+
+    def hur_sites_group(self, copy_group, inst):
+        # pairdisplay and raidvchkdsp on horcm_inst and peer_horcm_inst at the same time, merged per pair
+        # a side that cannot be read is reported in errors, the pairs are compared with what was read
+        import concurrent.futures
+        peer = self.params['peer_horcm_inst']
+        calls = {
+            'local.pairdisplay': (self.hur_site_pairs, inst), 'remote.pairdisplay': (self.hur_site_pairs, peer),
+            'local.raidvchkdsp': (self.hur_site_gflags, inst), 'remote.raidvchkdsp': (self.hur_site_gflags, peer),
+        }
+        # set up Cci once, before the threads use it
+        self.cci
+        reads = {}
+        errors = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(calls)) as executor:
+            futures = {name: executor.submit(function, copy_group, horcmInst) for name, (function, horcmInst) in calls.items()}
+            for name, future in futures.items():
+                try:
+                    reads[name] = future.result()
+                except Exception as e:
+                    reads[name] = {}
+                    errors[name] = str(e)
+        pairs = {}
+        for pairvol in sorted(set(reads['local.pairdisplay']) | set(reads['remote.pairdisplay'])):
+            local = reads['local.pairdisplay'].get(pairvol)
+            remote = reads['remote.pairdisplay'].get(pairvol)
+            pair = {'local': local and local['L'], 'remote': remote and remote['L'],
+                    'local_gflags': reads['local.raidvchkdsp'].get(pairvol), 'remote_gflags': reads['remote.raidvchkdsp'].get(pairvol),
+                    'mismatches': self.hur_site_mismatches(local, remote, errors)}
+            pair['consistent'] = not pair['mismatches']
+            pairs[pairvol] = pair
+        mismatched = [pairvol for pairvol in pairs if not pairs[pairvol]['consistent']]
+        return {'horcm_inst': inst, 'peer_horcm_inst': peer, 'consistent': not mismatched and not errors,
+                'pairs_count': len(pairs), 'mismatched_pairs': mismatched, 'errors': errors, 'pairs': pairs}
+
+    def hur_site_pairs(self, copy_group, inst):
+        # {pairvol: {'L': {hur_site_fields}, 'R': {...}}} as seen from inst
+        pairs = {}
+        for row in self.hur_pairdisplay_rows(copy_group, inst):
+            pairs.setdefault(row['PairVol'], {})[row['L/R']] = {field: row.get(field) for field in hur_site_fields}
+        return pairs
+
+    def hur_site_gflags(self, copy_group, inst):
+        # {pairvol: 'GI-C-R-W-S'} guard flags of raidvchkdsp -v gflag, e.g. E-E-E-E-E
+        raidvchkdsp = self.cci_session().raidvchkdsp(inst=inst, group=copy_group, mode='H')
+        return {pairvol: '-'.join(data.get(flag, '?') for flag in ('GI', 'GC', 'GR', 'GW', 'GS'))
+                for pairvol, data in raidvchkdsp['raidvchkdspdata']['pairs'].get(copy_group, {}).items()}
+
+    def hur_site_mismatches(self, local, remote, errors):
+        # what the two instances disagree on for one pair, local/remote: {'L': ..., 'R': ...} of each side
+        if local is None or remote is None:
+            missing = ('local', 'remote')[local is not None]
+            # a side that failed to read has no pairs, that is not a mismatch of the pair
+            return ([], ['pair missing on {} side'.format(missing)])['{}.pairdisplay'.format(missing) not in errors]
+        mismatches = []
+        for side, this, other in (('local', local, remote), ('remote', remote, local)):
+            if this.get('R') and this['R']['Status'] != other['L']['Status']:
+                mismatches.append('{} side sees the other side in {}, the other side reports {}'.format(side, this['R']['Status'], other['L']['Status']))
+        if local.get('R') and local['R']['LDEV#'] != remote['L']['LDEV#']:
+            mismatches.append('local side pairs with LDEV {}, remote side is LDEV {}'.format(local['R']['LDEV#'], remote['L']['LDEV#']))
+        if local['L']['P/S'] == remote['L']['P/S'] and local['L']['P/S'] in ('P-VOL', 'S-VOL'):
+            mismatches.append('both sides are {}'.format(local['L']['P/S']))
+        return mismatches
+
     def hur_chkdsp(self):
-        raidvchkdsp = self.mystorage.cci.raidvchkdsp(
-            inst=self.horcm_inst, group=self.params['copy_group'], mode='H')
+        return self.hur_run(self.hur_chkdsp_group)
+
+    def hur_chkdsp_group(self, copy_group, inst):
+        raidvchkdsp = self.cci.raidvchkdsp(
+            inst=inst, group=copy_group, mode='H')
         return raidvchkdsp
+
+    # #####
+    # # HUR bulk provisioning
+    # # primary_ldevs/secondary_ldevs -> copy_groups in the horcm.conf files, paircreate per copy_group, initial copy tracked
+    # #####
+
+    def hur_ldev_id(self, value):
+        # LDEV id as 1234, 0x04D2 or CU:LDEV 04:D2
+        value = str(value).strip()
+        if ':' in value:
+            cu, ldev = value.split(':')
+            return int(cu, 16) * 256 + int(ldev, 16)
+        return int(value, 16) if value.lower().startswith('0x') else int(value)
+
+    def hur_ldev_ranges(self, ranges):
+        # [ldevId, ...] of a list of LDEV ids and ranges (start-end, both included)
+        ldevIds = []
+        for entry in ranges or []:
+            bounds = [self.hur_ldev_id(value) for value in str(entry).split('-')]
+            if len(bounds) > 2 or bounds[0] > bounds[-1]:
+                # a reversed range would silently provision nothing
+                self.module.fail_json(msg='{} is neither an LDEV id nor a range start-end with start <= end'.format(entry))
+            ldevIds.extend(range(bounds[0], bounds[-1] + 1))
+        return ldevIds
+
+    def hur_provision_groups(self):
+        # [(copy_group, [(dev_name, primary ldev, secondary ldev), ...]), ...]
+        # one copy_group named copy_group, or copy_group_000, _001, ... of pairs_per_group pairs each
+        primary = self.hur_ldev_ranges(self.params.get('primary_ldevs'))
+        secondary = self.hur_ldev_ranges(self.params.get('secondary_ldevs'))
+        if not primary or len(primary) != len(secondary):
+            self.module.fail_json(msg='primary_ldevs ({} LDEVs) and secondary_ldevs ({} LDEVs) must hold the same number of LDEVs'.format(
+                len(primary), len(secondary)))
+        perGroup = self.params.get('pairs_per_group') or len(primary)
+        groups = []
+        for first in range(0, len(primary), perGroup):
+            copyGroup = (self.params['copy_group'], '{}_{:03d}'.format(self.params['copy_group'], first // perGroup))[perGroup < len(primary)]
+            pairs = [('{}_{:04d}'.format(copyGroup, number), pvol, svol)
+                     for number, (pvol, svol) in enumerate(zip(primary[first:first + perGroup], secondary[first:first + perGroup]))]
+            groups.append((copyGroup, pairs))
+        return groups
+
+    def hur_horcm_ldev_lines(self, groups, serial, side):
+        # {copy_group: [HORCM_LDEV line, ...]}, side 1 is the primary, 2 the secondary LDEV of a pair
+        return {copyGroup: ['{}\t{}\t{}\t{:02X}:{:02X}'.format(copyGroup, pair[0], serial, pair[side] >> 8, pair[side] & 0xff) for pair in pairs]
+                for copyGroup, pairs in groups}
+
+    def hur_horcm_conf_path(self, inst):
+        return os.path.join(self.params.get('horcm_dir') or '/etc', 'horcm{}.conf'.format(inst))
+
+    def hur_horcm_conf_update(self, path, definitions):
+        # add the copy_groups of definitions ({copy_group: [HORCM_LDEV line, ...]}) the conf file does not have yet
+        # to its HORCM_LDEV section, their HORCM_INST line copies address and service of the first copy_group there
+        # returns the added lines, the file is only written if there are some and not in check_mode
+        if self.module.check_mode or self.trace_replaying():
+            lines, added = self.hur_horcm_conf_merge(path, definitions)
+            return added
+        # parallel tasks provisioning into the same conf file must not lose each other's copy_groups
+        with cache_lock(path):
+            lines, added = self.hur_horcm_conf_merge(path, definitions)
+            if added:
+                # rename, a HORCM starting at the same time reads the old or the new file
+                tmppath = '{}.tmp{}'.format(path, os.getpid())
+                with open(tmppath, 'w') as conffile:
+                    conffile.write('\n'.join(lines) + '\n')
+                os.chmod(tmppath, os.stat(path).st_mode & 0o7777)
+                os.rename(tmppath, path)
+        return added
+
+    def hur_horcm_conf_merge(self, path, definitions):
+        # (lines of the conf file with the missing copy_groups of definitions added, added lines)
+        with open(path) as conffile:
+            lines = conffile.read().splitlines()
+        sections = {}
+        section = None
+        for number, line in enumerate(lines):
+            values = line.split('#')[0].split()
+            if len(values) == 1 and values[0].startswith('HORCM_'):
+                section = values[0]
+                sections[section] = [number, number]
+            elif section and values:
+                sections[section][1] = number
+                sections.setdefault(section + '.entries', []).append(values)
+        known = [values[0] for name in ('HORCM_LDEV', 'HORCM_LDEVG', 'HORCM_DEV') for values in sections.get(name + '.entries', [])]
+        missing = [copyGroup for copyGroup in definitions if copyGroup not in known]
+        if not missing:
+            return lines, []
+        if not sections.get('HORCM_INST.entries'):
+            raise Exception('{} has no HORCM_INST entry to take the remote address of the new copy_groups from'.format(path))
+        address = sections['HORCM_INST.entries'][0][1:]
+        ldevLines = [line for copyGroup in missing for line in definitions[copyGroup]]
+        instLines = ['\t'.join([copyGroup] + address) for copyGroup in missing]
+        # HORCM_INST first, inserting there does not move the HORCM_LDEV section if it comes before
+        instEnd = sections['HORCM_INST'][1] + 1
+        lines[instEnd:instEnd] = instLines
+        if 'HORCM_LDEV' in sections and sections['HORCM_LDEV'][1] < instEnd:
+            ldevEnd = sections['HORCM_LDEV'][1] + 1
+            lines[ldevEnd:ldevEnd] = ldevLines
+        elif 'HORCM_LDEV' in sections:
+            ldevEnd = sections['HORCM_LDEV'][1] + 1 + len(instLines)
+            lines[ldevEnd:ldevEnd] = ldevLines
+        else:
+            instStart = sections['HORCM_INST'][0]
+            lines[instStart:instStart] = ['HORCM_LDEV'] + ldevLines + ['']
+        return lines, ldevLines + instLines
+
+    def hur_provision(self):
+        # the copy_groups of primary_ldevs/secondary_ldevs: horcm.conf of horcm_inst (and its horcm_inst_pool) and of
+        # peer_horcm_inst updated, the changed instances restarted (horcm_restart), paircreate for the copy_groups in SMPL
+        # with at most max_workers at a time, then the initial copy of all of them tracked in one poll loop
+        if self.serial is None or self.params.get('remote_storage_serial') is None or self.params.get('peer_horcm_inst') is None:
+            self.module.fail_json(msg='state provisioned needs storage_serial, remote_storage_serial and peer_horcm_inst')
+        groups = self.hur_provision_groups()
+        local = self.hur_horcm_ldev_lines(groups, self.serial, 1)
+        remote = self.hur_horcm_ldev_lines(groups, self.params['remote_storage_serial'], 2)
+        confs = [(inst, local) for inst in [self.horcm_inst] + [inst for inst in self.params.get('horcm_inst_pool') or [] if inst != self.horcm_inst]]
+        confs.append((self.params['peer_horcm_inst'], remote))
+        facts = {'copy_groups': [copyGroup for copyGroup, pairs in groups], 'pairs': sum(len(pairs) for copyGroup, pairs in groups),
+                 'horcm_ldev': {'local': local, 'remote': remote}, 'horcm_conf': {}, 'restarted': [], 'changed': False}
+        # copy_groups HORCM does not know yet, in SMPL once it does
+        new = []
+        for inst, definitions in confs:
+            added = self.hur_horcm_conf_update(self.hur_horcm_conf_path(inst), definitions)
+            facts['horcm_conf'][self.hur_horcm_conf_path(inst)] = added
+            if added:
+                facts['changed'] = True
+                new.extend(copyGroup for copyGroup in sorted(set(line.split('\t')[0] for line in added)) if copyGroup not in new)
+                if self.params.get('horcm_restart'):
+                    self.cci.restart_horcm_inst(inst)
+                    facts['restarted'].append(inst)
+
+        def create(copy_group, inst):
+            if self.plan is not None and copy_group in new:
+                # nothing to read yet, the running HORCM has not seen the copy_group
+                return dict(self.hur_create_group(copy_group, inst), changed=True)
+            return self.hur_transition_group('create', copy_group, inst)
+
+        targets = [(copyGroup, self.horcm_inst) for copyGroup, pairs in groups]
+        facts['create'] = self.hur_fanout(create, targets)
+        created = [copyGroup for copyGroup in facts['create'] if not facts['create'][copyGroup]['failed']]
+        facts['changed'] = facts['changed'] or [copyGroup for copyGroup in created if facts['create'][copyGroup]['facts'].get('changed')] != []
+        if self.plan is not None:
+            # the initial copy of a plan is not polled
+            facts['failed_copy_groups'] = sorted(set(facts['create']) - set(created))
+            return facts
+        facts['copy'] = self.hur_copy_progress([target for target in targets if target[0] in created])
+        facts['failed_copy_groups'] = sorted(set(facts['create']) - set(created)) + facts['copy']['not_reached']
+        return facts
+
+    def hur_copy_progress(self, groups):
+        # one poll loop over all groups until they are in PAIR, in an error state or timeout
+        # each round reads the groups still copying (max_workers at a time), the history holds the overall copy percent
+        accepted = hur_wait_states['PAIR']
+        start = time.time()
+        deadline = start + self.params['timeout']
+        interval = hur_wait_min_interval
+        states = {}
+        history = []
+        pending = list(groups)
+        while pending:
+            reads = self.hur_fanout(lambda copy_group, inst: self.hur_pair_state(self.hur_pairdisplay(copy_group, inst, fresh=True)['pairdisplaydata']), pending)
+            for copyGroup, read in reads.items():
+                states[copyGroup] = read.get('facts') or {'state': 'ERROR', 'statuses': {}, 'percent': None, 'msg': read.get('msg')}
+            now = time.time()
+            # a copy_group without pairs (e.g. HORCM has not read it yet) is polled on, not done
+            done = [copyGroup for copyGroup in states if states[copyGroup]['state'] == 'ERROR'
+                    or (states[copyGroup]['statuses'] and all(status in accepted for status in states[copyGroup]['statuses']))
+                    or [status for status in states[copyGroup]['statuses'] if status in hur_error_states]]
+            percents = [(states[copyGroup]['percent'] or 0, 100)[copyGroup in done and states[copyGroup]['state'] != 'ERROR'] for copyGroup in states]
+            sample = {'elapsed_seconds': round(now - start, 1), 'percent': round(sum(percents) / len(percents), 1),
+                      'copy_groups_done': len(done), 'eta_seconds': None}
+            if history and sample['percent'] > history[-1]['percent']:
+                rate = (sample['percent'] - history[-1]['percent']) / max(now - lastPoll, 0.001)
+                sample['eta_seconds'] = round((100 - sample['percent']) / rate)
+            history.append(sample)
+            lastPoll = now
+            pending = [group for group in pending if group[0] not in done]
+            if not pending or now >= deadline:
+                break
+            # same interval rule as wait_for
+            interval = (interval * 2, (sample['eta_seconds'] or 0) / 4)[sample['eta_seconds'] is not None]
+            interval = min(max(interval, hur_wait_min_interval), hur_wait_max_interval)
+            time.sleep(min(interval, max(deadline - time.time(), 0)))
+        notReached = sorted(copyGroup for copyGroup in states if not states[copyGroup]['statuses']
+                            or not all(status in accepted for status in states[copyGroup]['statuses']))
+        return {'reached': not notReached, 'not_reached': notReached, 'percent': history[-1]['percent'] if history else 100,
+                'elapsed_seconds': round(time.time() - start, 1), 'polls': len(history), 'history': history,
+                'copy_groups': dict(sorted(states.items()))}
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Hitachi Vantara, Inc. All rights reserved.
+# Author: Giacomo Chiapparini <@gchiapparini-hv>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# Local session broker: a long running process that keeps one warm hiraid Raidcom/Cci
+# per (storage_serial, horcm_inst), so module runs do not pay the Raidcom setup
+# (inqraid, raidqry, get port, horcctl, get resource) on every task.
+#
+# start it on the host the modules run on, as the user the modules run as:
+#   python -m ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom_broker \
+#       --socket ~/.hitachi_raidcom/broker.sock [--cci-path /usr/bin/] [--idle-timeout 3600]
+#
+# hitachi_raidcom routes its calls through the broker when the socket answers,
+# otherwise it runs hiraid in process as before.
+
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+from ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom_result import result_encode, result_decode
+
+import os
+import socket
+import threading
+import time
+
+try:
+    import builtins
+except ImportError:
+    import __builtin__ as builtins
+
+
+# default socket, in the (user owned) default cache directory
+hitachi_raidcom_broker_socket = os.path.join(os.path.expanduser('~'), '.hitachi_raidcom', 'broker.sock')
+
+
+class hitachi_raidcom_broker_error(Exception):
+    pass
+
+
+def broker_exception(response):
+    # the exception a call raised in the broker: the same type for builtin exceptions (e.g. Exception, KeyError), with the same args
+    errorType = getattr(builtins, response.get('error_type') or '', None)
+    args = response.get('error_args')
+    if not isinstance(args, list):
+        args = [response['error']]
+    if isinstance(errorType, type) and issubclass(errorType, Exception):
+        return errorType(*args)
+    return hitachi_raidcom_broker_error(*args)
+
+
+def broker_error(e):
+    # the error response of a call that raised e, args that do not go through json are sent as text
+    try:
+        args = json.loads(json.dumps(list(e.args)))
+    except (TypeError, ValueError):
+        args = None
+    return {'ok': False, 'error': str(e), 'error_type': type(e).__name__, 'error_args': args}
+
+
+def broker_send(connection, message):
+    connection.sendall((json.dumps(message, default=str) + '\n').encode('utf-8'))
+
+
+def broker_receive(connection):
+    chunks = []
+    while True:
+        chunk = connection.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        if chunk.endswith(b'\n'):
+            break
+    if not chunks:
+        raise hitachi_raidcom_broker_error('broker closed the connection')
+    return json.loads(b''.join(chunks).decode('utf-8'))
+
+
+def broker_request(socket_path, request, timeout=None):
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.settimeout(timeout)
+        connection.connect(socket_path)
+        broker_send(connection, request)
+        return broker_receive(connection)
+    finally:
+        connection.close()
+
+
+def broker_available(socket_path):
+    # a socket file left behind by a stopped broker does not count
+    if not socket_path or not os.path.exists(socket_path):
+        return False
+    try:
+        return broker_request(socket_path, {'action': 'ping'}, timeout=2).get('ok', False)
+    except (socket.error, ValueError, hitachi_raidcom_broker_error):
+        return False
+
+
+class hitachi_raidcom_broker_client(object):
+    # stands in for a Raidcom (target raidcom) or Cci (target cci) held by the broker: methods are called in the
+    # broker, data attributes (e.g. maxldevid) are read from it, errors are raised as the broker's object raised them
+    def __init__(self, socket_path, serial, horcm_inst, target):
+        self.socket_path = socket_path
+        self.serial = serial
+        self.horcm_inst = horcm_inst
+        self.target = target
+        # attributes known to be methods, they are not looked up again
+        self.methods = set()
+
+    def broker_call(self, action, method, args=(), kwargs=None):
+        response = broker_request(self.socket_path, {
+            'action': action, 'serial': self.serial, 'horcm_inst': self.horcm_inst,
+            'target': self.target, 'method': method, 'args': list(args), 'kwargs': kwargs or {}})
+        if not response['ok']:
+            raise broker_exception(response)
+        return result_decode(response['result'])
+
+    def broker_getattr(self, attribute):
+        # data attributes (e.g. maxldevid) of the object held by the broker
+        return self.broker_call('getattr', attribute)
+
+    def __getattr__(self, attribute):
+        if attribute.startswith('_'):
+            raise AttributeError(attribute)
+        if attribute not in self.methods:
+            response = broker_request(self.socket_path, {
+                'action': 'describe', 'serial': self.serial, 'horcm_inst': self.horcm_inst,
+                'target': self.target, 'method': attribute, 'args': [], 'kwargs': {}})
+            if not response['ok']:
+                raise broker_exception(response)
+            if not response['callable']:
+                return result_decode(response['result'])
+            self.methods.add(attribute)
+
+        def call(*args, **kwargs):
+            return self.broker_call('call', attribute, args, kwargs)
+        return call
+
+
+def hiraid_factory(cci_path='/usr/bin/', log=None):
+    # the real backend, a factory with the same signature can hand out stubs instead
+    import logging
+    from hiraid.raidcom import Raidcom
+    from hiraid.horcm.horcm_cci import Cci
+
+    def factory(serial, horcm_inst, target):
+        if target == 'raidcom':
+            return Raidcom(serial, horcm_inst, path=cci_path, log=log or logging)
+        return Cci(log=log or logging, path=cci_path)
+    return factory
+
+
+class hitachi_raidcom_broker(object):
+    # owns the warm sessions and answers the requests of hitachi_raidcom_broker_client
+    def __init__(self, socket_path, factory, idle_timeout=None):
+        self.socket_path = socket_path
+        self.factory = factory
+        self.idle_timeout = idle_timeout
+        self.sessions = {}
+        # one lock per session: Raidcom keeps state (views, undo commands) between calls
+        self.locks = {}
+        self.sessions_lock = threading.Lock()
+        self.last_request = time.time()
+        self.server = None
+
+    def session(self, serial, horcm_inst, target):
+        key = (serial, horcm_inst, target)
+        with self.sessions_lock:
+            lock = self.locks.setdefault(key, threading.Lock())
+        with lock:
+            if key not in self.sessions:
+                self.sessions[key] = self.factory(serial, horcm_inst, target)
+        return self.sessions[key], lock
+
+    def handle(self, request):
+        self.last_request = time.time()
+        if request['action'] == 'ping':
+            return {'ok': True, 'sessions': len(self.sessions)}
+        try:
+            storage, lock = self.session(request['serial'], request['horcm_inst'], request['target'])
+            if request['action'] == 'getattr':
+                return {'ok': True, 'result': result_encode(getattr(storage, request['method']))}
+            if request['action'] == 'describe':
+                # a method for the client to call, or the value of a data attribute
+                value = getattr(storage, request['method'])
+                if callable(value):
+                    return {'ok': True, 'callable': True}
+                return {'ok': True, 'callable': False, 'result': result_encode(value)}
+            method = getattr(storage, request['method'])
+            if request['target'] == 'raidcom':
+                with lock:
+                    result = method(*request['args'], **request['kwargs'])
+            else:
+                # Cci is stateless, parallel copy_groups stay parallel
+                result = method(*request['args'], **request['kwargs'])
+            return {'ok': True, 'result': result_encode(result)}
+        except Exception as e:
+            return broker_error(e)
+
+    def serve(self):
+        import socketserver
+        broker = self
+
+        class handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                try:
+                    request = broker_receive(self.request)
+                except (ValueError, hitachi_raidcom_broker_error):
+                    return
+                broker_send(self.request, broker.handle(request))
+
+        directory = os.path.dirname(self.socket_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, 0o700)
+        if os.path.exists(self.socket_path):
+            if broker_available(self.socket_path):
+                raise hitachi_raidcom_broker_error('a broker is already listening on {}'.format(self.socket_path))
+            os.remove(self.socket_path)
+        # only the user running the broker may connect
+        umask = os.umask(0o077)
+        try:
+            self.server = socketserver.ThreadingUnixStreamServer(self.socket_path, handler)
+        finally:
+            os.umask(umask)
+        self.server.daemon_threads = True
+        if self.idle_timeout:
+            threading.Thread(target=self.watch_idle, daemon=True).start()
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    def watch_idle(self):
+        while time.time() - self.last_request < self.idle_timeout:
+            time.sleep(min(self.idle_timeout, 10))
+        self.server.shutdown()
+
+    def shutdown(self):
+        if self.server:
+            self.server.shutdown()
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='hitachi.raidcom session broker')
+    parser.add_argument('--socket', default=hitachi_raidcom_broker_socket, help='unix socket to listen on')
+    parser.add_argument('--cci-path', default='/usr/bin/', help='directory of the CCI binaries')
+    parser.add_argument('--idle-timeout', type=int, default=None, help='stop after this many seconds without requests')
+    options = parser.parse_args()
+    hitachi_raidcom_broker(os.path.expanduser(options.socket), hiraid_factory(options.cci_path),
+                           idle_timeout=options.idle_timeout).serve()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Hitachi Vantara, Inc. All rights reserved.
+# Author: Giacomo Chiapparini <@gchiapparini-hv>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+from ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom_result import result_encode, result_decode
+
+import fcntl
+import glob
+import hashlib
+import os
+import tempfile
+import time
+
+
+# default location of the local storage cache files (one set of files per storage serial)
+hitachi_raidcom_cache_dir = os.path.join(os.path.expanduser('~'), '.hitachi_raidcom')
+
+
+def cache_path(cache_dir, serial, name):
+    # <cache_dir>/<serial>_<name>.json
+    return os.path.join(os.path.expanduser(cache_dir or hitachi_raidcom_cache_dir), '{}_{}.json'.format(serial, name))
+
+
+def cache_load(path, ttl):
+    # return the cached data or None if there is no cache file, it is unreadable, not a cache file or older than ttl seconds
+    if not path or not ttl or ttl <= 0:
+        return None
+    try:
+        with open(path) as cachefile:
+            content = json.load(cachefile)
+    except (IOError, OSError, ValueError):
+        return None
+    if not isinstance(content, dict) or not isinstance(content.get('created', 0), (int, float)):
+        return None
+    if time.time() - content.get('created', 0) > ttl:
+        return None
+    return content.get('data')
+
+
+def cache_save(path, data):
+    # write to a temporary file first and rename it, parallel forks never read a half written cache
+    if not path:
+        return False
+    directory = os.path.dirname(path)
+    try:
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        fd, tmppath = tempfile.mkstemp(dir=directory, prefix='.tmp_')
+        with os.fdopen(fd, 'w') as cachefile:
+            json.dump({'created': time.time(), 'data': data}, cachefile, default=str)
+        os.rename(tmppath, path)
+    except (IOError, OSError):
+        # a cache that can not be written is not an error, the next task scans again
+        return False
+    return True
+
+
+def cache_invalidate(path):
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class cache_lock(object):
+    # serializes read-modify-write of a cache file between parallel forks (e.g. LDEV id reservations)
+    # a None path (no cache file) locks nothing
+    def __init__(self, path):
+        self.path = path and path + '.lock'
+        self.lockfile = None
+
+    def __enter__(self):
+        if not self.path:
+            return self
+        directory = os.path.dirname(self.path)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.lockfile = open(self.path, 'a')
+        fcntl.flock(self.lockfile, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *args):
+        if self.lockfile is None:
+            return
+        fcntl.flock(self.lockfile, fcntl.LOCK_UN)
+        self.lockfile.close()
+
+
+# Raidcom getters whose results change without a call of the task (the status of asynchronous commands, port
+# logins, snapshot copy states): they always run, without reading, writing or invalidating the query cache
+query_cache_volatile = ('getcommandstatus', 'getportlogin', 'getsnapshot', 'getsnapshotgroup')
+# methods of the hiraid objects whose results the query cache keeps, any other method call invalidates it
+query_cache_reads = {
+    'raidcom': lambda method: method.startswith('get') and method not in query_cache_volatile,
+    'cci': lambda method: method in ('pairdisplayx', 'pairdisplay', 'raidvchkdsp'),
+}
+# methods that neither read the storage nor change it
+query_cache_neutral = ('broker_getattr',)
+
+
+class hitachi_raidcom_query_cache(object):
+    # results of read-only Raidcom/Cci queries, one file per serial, horcm_inst, command and arguments,
+    # shared by all tasks (and forks) on the host for ttl seconds
+    def __init__(self, cache_dir, serial, horcm_inst, ttl):
+        self.cache_dir = cache_dir
+        self.serial = serial
+        self.horcm_inst = horcm_inst
+        self.ttl = ttl
+
+    def path(self, target, method, args, kwargs):
+        key = hashlib.sha1(json.dumps([method, args, kwargs], sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        return cache_path(self.cache_dir, self.serial, 'query_{}_{}_{}'.format(target, self.horcm_inst, key))
+
+    def load(self, path):
+        # (True, result) on a hit, (False, None) otherwise
+        data = cache_load(path, self.ttl)
+        if data is None:
+            return False, None
+        return True, result_decode(data)
+
+    def save(self, path, result):
+        cache_save(path, result_encode(result))
+
+    def invalidate(self, target):
+        # a raidcom change only affects its own storage, a pair change both sides of the pairs (any serial)
+        directory = os.path.dirname(cache_path(self.cache_dir, self.serial, 'query'))
+        patterns = ['{}_query_*.json'.format(self.serial)]
+        if target == 'cci':
+            patterns.append('*_query_cci_*.json')
+        for pattern in patterns:
+            for path in glob.glob(os.path.join(directory, pattern)):
+                cache_invalidate(path)
+
+
+class hitachi_raidcom_cached(object):
+    # stands in for the Raidcom or Cci of a task: read-only queries are answered from the query cache,
+    # any other method call invalidates the cache before and after it runs
+    # factory() sets up the real object, only when a call is not answered from the cache
+    def __init__(self, factory, name, cache, metrics=None):
+        object.__setattr__(self, 'cached_factory', factory)
+        object.__setattr__(self, 'cached_name', name)
+        object.__setattr__(self, 'cached_cache', cache)
+        object.__setattr__(self, 'cached_metrics', metrics)
+
+    def __getattr__(self, attribute):
+        if attribute.startswith('_'):
+            return getattr(self.cached_factory(), attribute)
+        if query_cache_reads[self.cached_name](attribute):
+            return self.cached_read(attribute)
+        value = getattr(self.cached_factory(), attribute)
+        if not callable(value) or attribute in query_cache_neutral or attribute in query_cache_volatile:
+            return value
+
+        def change(*args, **kwargs):
+            self.cached_cache.invalidate(self.cached_name)
+            try:
+                return value(*args, **kwargs)
+            finally:
+                self.cached_cache.invalidate(self.cached_name)
+        return change
+
+    def cached_read(self, method):
+        def read(*args, **kwargs):
+            path = self.cached_cache.path(self.cached_name, method, args, kwargs)
+            start = time.time()
+            hit, result = self.cached_cache.load(path)
+            if hit:
+                if self.cached_metrics is not None:
+                    self.cached_metrics.record('query_cache', '{}.{}'.format(self.cached_name, method), kwargs, time.time() - start)
+                return result
+            result = getattr(self.cached_factory(), method)(*args, **kwargs)
+            self.cached_cache.save(path, result)
+            return result
+        return read
+
+    def __setattr__(self, attribute, value):
+        setattr(self.cached_factory(), attribute, value)
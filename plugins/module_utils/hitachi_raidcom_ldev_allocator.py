@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Hitachi Vantara, Inc. All rights reserved.
+# Author: Giacomo Chiapparini <@gchiapparini-hv>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import base64
+
+
+# LDEV ids next_free reads from the bitmap at a time
+allocator_window = 4096
+
+
+class hitachi_raidcom_ldev_allocator(object):
+    # free LDEV ids of one storage, one bitmap per resource group: bit n set = LDEV n is free
+    # marking an id is constant time, lookups read only the bytes of the start..end range they search as one python int
+    def __init__(self, max_ldev_id, bitmaps=None):
+        self.max_ldev_id = int(max_ldev_id)
+        self.bitmaps = bitmaps or {}
+
+    @classmethod
+    def from_ldevlist(cls, undefined, max_ldev_id):
+        # undefined: view of getldevlist(ldevtype='undefined'), one entry per free LDEV with its RSGID
+        allocator = cls(max_ldev_id)
+        for ldevId, ldev in undefined.items():
+            if int(ldevId) <= allocator.max_ldev_id:
+                allocator.mark_free([ldevId], ldev.get('RSGID', '0'))
+        return allocator
+
+    @classmethod
+    def from_data(cls, data):
+        return cls(data['max_ldev_id'], {rsgid: bytearray(base64.b64decode(bitmap)) for rsgid, bitmap in data['bitmaps'].items()})
+
+    def to_data(self):
+        return {'max_ldev_id': self.max_ldev_id,
+                'bitmaps': {rsgid: base64.b64encode(bytes(bitmap)).decode('ascii') for rsgid, bitmap in self.bitmaps.items()}}
+
+    def bitmap(self, rsgid):
+        return self.bitmaps.setdefault(str(rsgid), bytearray((self.max_ldev_id >> 3) + 1))
+
+    def mark_free(self, ldev_ids, rsgid='0'):
+        bitmap = self.bitmap(rsgid)
+        for ldevId in ldev_ids:
+            ldevId = int(ldevId)
+            if 0 <= ldevId <= self.max_ldev_id:
+                bitmap[ldevId >> 3] |= 1 << (ldevId & 7)
+
+    def mark_used(self, ldev_ids):
+        # used in whatever resource group it was free in, ids outside of the model (never free) are ignored
+        for bitmap in self.bitmaps.values():
+            for ldevId in ldev_ids:
+                ldevId = int(ldevId)
+                if 0 <= ldevId <= self.max_ldev_id:
+                    bitmap[ldevId >> 3] &= ~(1 << (ldevId & 7)) & 0xff
+
+    def free_mask(self, rsgid, start, end):
+        # free bits of start..end, bit 0 is LDEV start
+        start = max(int(start), 0)
+        end = self.max_ldev_id if end is None else min(int(end), self.max_ldev_id)
+        if end < start:
+            return 0
+        mask = int.from_bytes(bytes(self.bitmap(rsgid)[start >> 3:(end >> 3) + 1]), 'little')
+        return (mask >> (start & 7)) & ((1 << (end - start + 1)) - 1)
+
+    def free_count(self, rsgid='0', start=0, end=None):
+        return bin(self.free_mask(rsgid, start, end)).count('1')
+
+    def next_free(self, rsgid='0', start=0, end=None):
+        # searched in windows from start on, the cost grows with the distance to the first free id
+        end = self.max_ldev_id if end is None else min(int(end), self.max_ldev_id)
+        window = max(int(start), 0)
+        while window <= end:
+            mask = self.free_mask(rsgid, window, min(window + allocator_window - 1, end))
+            if mask:
+                return window + (mask & -mask).bit_length() - 1
+            window += allocator_window
+        return None
+
+    def contiguous_free(self, count, rsgid='0', start=0, end=None):
+        # first LDEV of count free ids in a row: after the loop bit n is set if bits n..n+count-1 were
+        runs = self.free_mask(rsgid, start, end)
+        length = 1
+        while length < count and runs:
+            shift = min(length, count - length)
+            runs &= runs >> shift
+            length += shift
+        if not runs:
+            return None
+        return start + (runs & -runs).bit_length() - 1
+
+    def reserve(self, count, rsgid='0', start=0, end=None, contiguous=True):
+        # take count free ids out of the bitmap, one contiguous range or (contiguous=False) the first free ones
+        if count <= 0:
+            return []
+        first = self.contiguous_free(count, rsgid, start, end)
+        if first is not None:
+            ldevIds = list(range(first, first + count))
+        elif contiguous:
+            return None
+        else:
+            ldevIds = []
+            mask = self.free_mask(rsgid, start, end)
+            while mask and len(ldevIds) < count:
+                lowest = mask & -mask
+                ldevIds.append(start + lowest.bit_length() - 1)
+                mask ^= lowest
+            if len(ldevIds) < count:
+                return None
+        self.mark_used(ldevIds)
+        return ldevIds
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Hitachi Vantara, Inc. All rights reserved.
+# Author: Giacomo Chiapparini <@gchiapparini-hv>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+import threading
+import time
+
+
+def call_returncode(cmdreturn):
+    # hiraid Raidcom returns a Cmdview (returncode), hiraid Cci a dict (cmdreturn), Cci.execute (stdout, stderr, returncode)
+    if isinstance(cmdreturn, dict):
+        return cmdreturn.get('cmdreturn')
+    if isinstance(cmdreturn, (tuple, list)) and len(cmdreturn) == 3:
+        return cmdreturn[2]
+    returncode = getattr(cmdreturn, 'returncode', None)
+    return returncode if isinstance(returncode, int) else None
+
+
+def call_cmd(cmdreturn):
+    cmd = getattr(cmdreturn, 'cmd', None)
+    return cmd if isinstance(cmd, str) else None
+
+
+def call_output_size(cmdreturn):
+    if isinstance(cmdreturn, dict):
+        stdout = cmdreturn.get('stdout')
+    elif isinstance(cmdreturn, (tuple, list)) and len(cmdreturn) == 3:
+        stdout = cmdreturn[0]
+    else:
+        stdout = getattr(cmdreturn, 'stdout', None)
+    if isinstance(stdout, list):
+        # concurrent Cmdview, one stdout per command
+        return sum(len(out) for out in stdout if isinstance(out, str))
+    return len(stdout) if isinstance(stdout, str) else 0
+
+
+class hitachi_raidcom_metrics(object):
+    # one sample per call into hiraid: command, arguments, wall time, exit code and output size
+    def __init__(self, logfile=None, serial=None, horcm_inst=None):
+        self.logfile = logfile
+        self.serial = serial
+        self.horcm_inst = horcm_inst
+        self.start = time.time()
+        # in-process, broker (hitachi_raidcom_broker) or replay (hitachi_raidcom_trace)
+        self.backend = 'in-process'
+        # trace_record/trace_replay: the calls are recorded or answered by hitachi_raidcom_trace
+        self.trace = None
+        self.samples = []
+        self.lock = threading.Lock()
+
+    def record(self, target, method, kwargs, elapsed, cmdreturn=None, error=None):
+        sample = {
+            'time': round(time.time(), 3),
+            'serial': self.serial,
+            'horcm_inst': self.horcm_inst,
+            'command': '{}.{}'.format(target, method),
+            'args': kwargs,
+            'cmd': call_cmd(cmdreturn),
+            'elapsed_seconds': round(elapsed, 6),
+            'returncode': call_returncode(cmdreturn),
+            'output_bytes': call_output_size(cmdreturn),
+            'error': error,
+        }
+        with self.lock:
+            self.samples.append(sample)
+            if self.logfile:
+                try:
+                    with open(self.logfile, 'a') as logfile:
+                        logfile.write(json.dumps(sample, default=str) + '\n')
+                except (IOError, OSError):
+                    # metrics never fail a task
+                    self.logfile = None
+        return sample
+
+    def summary(self):
+        # totals per command, the time not spent in calls is the python side of the task
+        with self.lock:
+            samples = list(self.samples)
+        commands = {}
+        for sample in samples:
+            command = commands.setdefault(sample['command'], {'calls': 0, 'errors': 0, 'total_seconds': 0.0, 'max_seconds': 0.0, 'output_bytes': 0})
+            command['calls'] += 1
+            command['errors'] += (0, 1)[sample['error'] is not None]
+            command['total_seconds'] += sample['elapsed_seconds']
+            command['max_seconds'] = max(command['max_seconds'], sample['elapsed_seconds'])
+            command['output_bytes'] += sample['output_bytes']
+        for command in commands.values():
+            command['total_seconds'] = round(command['total_seconds'], 3)
+            command['max_seconds'] = round(command['max_seconds'], 3)
+        callSeconds = sum(sample['elapsed_seconds'] for sample in samples)
+        taskSeconds = time.time() - self.start
+        return {
+            'backend': self.backend,
+            'calls': len(samples),
+            'call_seconds': round(callSeconds, 3),
+            'task_seconds': round(taskSeconds, 3),
+            # calls can run in parallel (copy_groups), so this can be negative
+            'python_seconds': round(taskSeconds - callSeconds, 3),
+            'commands': commands,
+        }
+
+    def timed(self, target, method, function, *args, **kwargs):
+        # call function and record it, exceptions are recorded and raised again
+        arguments = dict(kwargs, args=list(args)) if args else kwargs
+        if self.trace is not None:
+            function = self.trace.traced(target, method, function)
+        start = time.time()
+        try:
+            cmdreturn = function(*args, **kwargs)
+        except Exception as e:
+            self.record(target, method, arguments, time.time() - start, error=str(e))
+            raise
+        self.record(target, method, arguments, time.time() - start, cmdreturn)
+        return cmdreturn
+
+
+class hitachi_raidcom_timed(object):
+    # stands in for a hiraid Raidcom or Cci object, every method call goes through metrics.timed
+    def __init__(self, target, name, metrics):
+        object.__setattr__(self, 'timed_target', target)
+        object.__setattr__(self, 'timed_name', name)
+        object.__setattr__(self, 'timed_metrics', metrics)
+
+    def __getattr__(self, attribute):
+        value = getattr(self.timed_target, attribute)
+        if attribute.startswith('_') or not callable(value):
+            return value
+
+        def timed(*args, **kwargs):
+            return self.timed_metrics.timed(self.timed_name, attribute, value, *args, **kwargs)
+        return timed
+
+    def __setattr__(self, attribute, value):
+        setattr(self.timed_target, attribute, value)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Hitachi Vantara, Inc. All rights reserved.
+# Author: Giacomo Chiapparini <@gchiapparini-hv>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# Plan mode (check_mode): the read-only queries of a task go to the storage (or the query cache), every changing
+# Raidcom/Cci call is only recorded. The plan is the ordered list of raidcom/CCI command lines the task would run,
+# the raidcom ones rendered by hiraid itself (noexec), with the command_status calls around asynchronous raidcom commands.
+
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+from ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom_cache import query_cache_reads, query_cache_neutral, query_cache_volatile
+
+import threading
+
+
+# Raidcom methods that change the storage, hiraid renders their command lines (noexec)
+# LDEVs are added through a transaction (hitachi_raidcom_transaction), which plans its own command lines
+plan_raidcom_methods = ('extendldev', 'deleteldev', 'modifyldevname', 'lockresource', 'unlockresource', 'resetcommandstatus')
+# asynchronous ones run after the reset command_status of hiraid and are followed by a get command_status
+plan_raidcom_asynchronous = ('extendldev', 'deleteldev')
+# CCI commands of the Cci methods that change pairs or HORCM, with the defaults of the Cci methods: hiraid Cci has no noexec
+plan_cci_commands = {
+    'paircreate': ['paircreate -g {group} -vl {journals} -f {fence} -c {copy_pace} -I{mode}{inst}'],
+    'pairsplit': ['pairsplit -g {group} -I{inst} {opts}'],
+    'pairresync': ['pairresync -g {group} -c {pace} -I{mode}{inst} {opts}'],
+    'pairtakeover': ['horctakeover -g {group} -t {timeout} -I{mode}{inst}'],
+    'restart_horcm_inst': ['horcmshutdown.sh {inst}', 'horcmstart.sh {inst}'],
+}
+plan_cci_defaults = {'mode': '', 'opts': '', 'fence': '', 'copy_pace': 15, 'pace': 15, 'timeout': 60, 'jp': '', 'js': ''}
+
+
+def plan_raidcom_command(storage, method, **kwargs):
+    # the command line hiraid builds for a Raidcom call, nothing is run
+    if method == 'getcommandstatus':
+        # hiraid getcommandstatus parses the output also with noexec, its line only differs from the reset one in the verb
+        return plan_raidcom_command(storage, 'resetcommandstatus', **kwargs).replace(' reset command_status', ' get command_status', 1)
+    return getattr(storage, method)(noexec=True, **kwargs).cmd.rstrip()
+
+
+class plan_cmdreturn(object):
+    # what a planned Raidcom call returns instead of the hiraid Cmdview, nothing was run
+    def __init__(self, cmd):
+        self.cmd = cmd
+        self.returncode = 0
+        self.stdout = ''
+        self.stderr = ''
+        self.planned = True
+
+
+class hitachi_raidcom_plan(object):
+    # the recorded steps of one task, [{target, method, args, commands, copy_group}, ...] in call order
+    # session() returns the Raidcom that renders the raidcom command lines, it is only set up for the first one
+    def __init__(self, cci_path, serial, horcm_inst, session):
+        self.cci_path = cci_path
+        self.serial = serial
+        self.horcm_inst = horcm_inst
+        self.session = session
+        self.recorded = []
+        self.lock = threading.Lock()
+
+    def commands(self, target, method, args, kwargs):
+        # the command lines of one call, None for a method without a known command line
+        if target == 'raidcom':
+            if method not in plan_raidcom_methods:
+                return None
+            storage = self.session()
+            commands = [plan_raidcom_command(storage, method, **kwargs)]
+            if method in plan_raidcom_asynchronous:
+                commands = [plan_raidcom_command(storage, 'resetcommandstatus')] + commands + [plan_raidcom_command(storage, 'getcommandstatus')]
+            return commands
+        templates = plan_cci_commands.get(method)
+        if templates is None:
+            return None
+        values = dict(plan_cci_defaults)
+        values.update(kwargs)
+        if args:
+            # restart_horcm_inst(inst)
+            values['inst'] = args[0]
+        # paircreate only passes -jp/-js when both journals are given
+        values['journals'] = ('', '-jp {} -js {}'.format(values['jp'], values['js']))[str(values['jp']).isdigit() and str(values['js']).isdigit()]
+        return [' '.join('{}{}'.format(self.cci_path, template.format(**values)).split()) for template in templates]
+
+    def record(self, target, method, args, kwargs, commands=None):
+        # commands: the command lines of a caller that builds them itself (e.g. a transaction)
+        commands = commands or self.commands(target, method, args, kwargs)
+        step = {'target': target, 'method': method, 'args': dict(kwargs, **({'args': list(args)} if args else {})),
+                'commands': commands or ['{}.{}({})'.format(target, method, ', '.join(
+                    [repr(arg) for arg in args] + ['{}={!r}'.format(key, value) for key, value in sorted(kwargs.items())]))],
+                'copy_group': kwargs.get('group')}
+        with self.lock:
+            self.recorded.append(step)
+        return step
+
+    def steps(self):
+        # copy_groups handled in parallel record in any order, the steps of one copy_group stay in their order
+        return sorted(self.recorded, key=lambda step: step['copy_group'] or '')
+
+    def command_lines(self):
+        return [command for step in self.steps() for command in step['commands']]
+
+    def diff(self):
+        # ansible diff: nothing before, the planned command lines after
+        lines = self.command_lines()
+        return {'before_header': 'storage {} (horcm_inst {})'.format(self.serial, self.horcm_inst),
+                'after_header': 'planned raidcom/CCI commands', 'before': '',
+                'after': '\n'.join(lines) + ('\n' if lines else '')}
+
+
+class hitachi_raidcom_planned(object):
+    # stands in for the Raidcom (target raidcom) or Cci (target cci) of a task in plan mode: read-only queries
+    # go to target, any other method call is recorded in the plan and returns without running anything
+    def __init__(self, target, name, plan):
+        object.__setattr__(self, 'planned_target', target)
+        object.__setattr__(self, 'planned_name', name)
+        object.__setattr__(self, 'planned_plan', plan)
+
+    def __getattr__(self, attribute):
+        if attribute.startswith('_') or query_cache_reads[self.planned_name](attribute) or attribute in query_cache_neutral + query_cache_volatile:
+            return getattr(self.planned_target, attribute)
+        # the known changing calls do not need the real object, it may not even be set up
+        if attribute not in (plan_cci_commands, plan_raidcom_methods)[self.planned_name == 'raidcom']:
+            value = getattr(self.planned_target, attribute)
+            if not callable(value):
+                return value
+
+        def planned(*args, **kwargs):
+            step = self.planned_plan.record(self.planned_name, attribute, args, kwargs)
+            if self.planned_name == 'cci':
+                return {'stdout': '', 'stderr': '', 'cmdreturn': 0, 'cmd': step['commands'][-1], 'planned': True}
+            return plan_cmdreturn(step['commands'][-1])
+        return planned
+
+    def __setattr__(self, attribute, value):
+        setattr(self.planned_target, attribute, value)
@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Hitachi Vantara, Inc. All rights reserved.
+# Author: Giacomo Chiapparini <@gchiapparini-hv>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# Results of Raidcom/Cci calls as json: what the broker sends, the query cache stores and a trace records.
+
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+
+class hitachi_raidcom_result(object):
+    # a hiraid Cmdview as decoded from json, attributes only
+    def __init__(self, attributes):
+        self.__dict__.update(attributes)
+
+
+def result_encode(value):
+    # hiraid Cci returns dicts, hiraid Raidcom returns Cmdview objects which are encoded as their attributes
+    if isinstance(value, (dict, list, tuple, str, int, float, bool)) or value is None:
+        return {'type': 'value', 'value': value}
+    return {'type': 'object', 'value': vars(value)}
+
+
+def result_decode(message):
+    if message['type'] == 'object':
+        return hitachi_raidcom_result(message['value'])
+    return message['value']
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Hitachi Vantara, Inc. All rights reserved.
+# Author: Giacomo Chiapparini <@gchiapparini-hv>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# HORCM instance pool: the CCI commands of all forks and threads on the host that go to one storage serial
+# are spread over several HORCM instances of it, with at most max_inflight commands per instance.
+# Every instance has max_inflight slot lock files, a command runs while it holds one of them.
+# Commands queue on one queue lock, the head of the queue takes the next free slot.
+
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+from ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom_cache import cache_path
+from ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom_metrics import hitachi_raidcom_timed
+
+import fcntl
+import os
+import threading
+import time
+
+
+# seconds between two looks for a free slot, doubled up to the maximum while the queue head waits
+scheduler_min_poll = 0.02
+scheduler_max_poll = 0.5
+
+
+def scheduler_open(path):
+    directory = os.path.dirname(path)
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    return open(path, 'a+')
+
+
+class hitachi_raidcom_scheduler(object):
+    def __init__(self, cache_dir, serial, instances, max_inflight=1):
+        self.cache_dir = cache_dir
+        self.serial = serial
+        self.instances = [int(inst) for inst in instances]
+        self.max_inflight = max(int(max_inflight or 1), 1)
+
+    def path(self, name):
+        return cache_path(self.cache_dir, self.serial, name) + '.lock'
+
+    def try_slot(self):
+        # (inst, slotfile) of a free slot or None, instances are tried round robin from the one after the last taken
+        with scheduler_open(self.path('horcm_pool_next')) as nextfile:
+            fcntl.flock(nextfile, fcntl.LOCK_EX)
+            nextfile.seek(0)
+            content = nextfile.read().strip()
+            first = int(content) % len(self.instances) if content.isdigit() else 0
+            for offset in range(len(self.instances)):
+                position = (first + offset) % len(self.instances)
+                inst = self.instances[position]
+                for slot in range(self.max_inflight):
+                    slotfile = scheduler_open(self.path('horcm_{}_slot{}'.format(inst, slot)))
+                    try:
+                        fcntl.flock(slotfile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except (IOError, OSError):
+                        slotfile.close()
+                        continue
+                    nextfile.seek(0)
+                    nextfile.truncate()
+                    nextfile.write(str(position + 1))
+                    return inst, slotfile
+        return None
+
+    def acquire(self):
+        # (inst, slotfile, waited seconds), commands take their slot in the order they queued
+        start = time.time()
+        with scheduler_open(self.path('horcm_pool_queue')) as queuefile:
+            fcntl.flock(queuefile, fcntl.LOCK_EX)
+            poll = scheduler_min_poll
+            taken = self.try_slot()
+            while taken is None:
+                time.sleep(poll)
+                poll = min(poll * 2, scheduler_max_poll)
+                taken = self.try_slot()
+        return taken + (time.time() - start,)
+
+    def release(self, slotfile):
+        fcntl.flock(slotfile, fcntl.LOCK_UN)
+        slotfile.close()
+
+    def slot(self, metrics=None):
+        # with scheduler.slot(metrics) as inst: ...
+        return scheduler_slot(self, metrics)
+
+
+class scheduler_slot(object):
+    def __init__(self, scheduler, metrics=None):
+        self.scheduler = scheduler
+        self.metrics = metrics
+        self.slotfile = None
+
+    def __enter__(self):
+        inst, self.slotfile, waited = self.scheduler.acquire()
+        if waited >= scheduler_min_poll and self.metrics is not None:
+            # time spent queued for an instance, not part of the command
+            self.metrics.record('horcm_pool', 'wait', {'horcm_inst': inst}, waited)
+        return inst
+
+    def __exit__(self, *args):
+        self.scheduler.release(self.slotfile)
+
+
+class hitachi_raidcom_pooled(object):
+    # stands in for a Raidcom (target raidcom) or Cci (target cci) like hitachi_raidcom_timed, every method call
+    # runs on the instance the scheduler hands out and is timed once it has it: Raidcom as its own session of that
+    # instance, Cci with inst= set to it; Cci calls for an instance outside of the pool (e.g. the other site) are not scheduled
+    # target is the session of the first instance of the pool, factory(inst) sets up the Raidcom of another one
+    # (in process or from the broker), once per instance
+    def __init__(self, target, name, scheduler, metrics, factory=None):
+        object.__setattr__(self, 'pooled_target', target)
+        object.__setattr__(self, 'pooled_name', name)
+        object.__setattr__(self, 'pooled_scheduler', scheduler)
+        object.__setattr__(self, 'pooled_metrics', metrics)
+        object.__setattr__(self, 'pooled_factory', factory)
+        object.__setattr__(self, 'pooled_sessions', {scheduler.instances[0]: target})
+        # attributes set on the pooled Raidcom, given to every session set up later
+        object.__setattr__(self, 'pooled_attributes', {})
+        object.__setattr__(self, 'pooled_lock', threading.Lock())
+
+    def pooled_session(self, inst):
+        # the Raidcom/Cci of inst; Cci takes the instance per call, a Raidcom session is bound to its instance
+        if self.pooled_name != 'raidcom' or self.pooled_factory is None:
+            return self.pooled_target
+        with self.pooled_lock:
+            if int(inst) not in self.pooled_sessions:
+                session = self.pooled_factory(int(inst))
+                for attribute, value in self.pooled_attributes.items():
+                    setattr(session, attribute, value)
+                self.pooled_sessions[int(inst)] = session
+            return self.pooled_sessions[int(inst)]
+
+    def pooled_pin(self, inst):
+        # the timed Raidcom/Cci on one instance, not scheduled: for a caller that holds a slot of inst for several calls
+        return hitachi_raidcom_timed(self.pooled_session(inst), self.pooled_name, self.pooled_metrics)
+
+    def __getattr__(self, attribute):
+        target = self.pooled_target
+        value = getattr(target, attribute)
+        if attribute.startswith('_') or attribute == 'broker_getattr' or not callable(value):
+            return value
+
+        def pooled(*args, **kwargs):
+            if self.pooled_name == 'cci':
+                if kwargs.get('inst') is None or int(kwargs['inst']) not in self.pooled_scheduler.instances:
+                    return self.pooled_metrics.timed(self.pooled_name, attribute, value, *args, **kwargs)
+                with self.pooled_scheduler.slot(self.pooled_metrics) as inst:
+                    kwargs['inst'] = inst
+                    return self.pooled_metrics.timed(self.pooled_name, attribute, value, *args, **kwargs)
+            with self.pooled_scheduler.slot(self.pooled_metrics) as inst:
+                return getattr(self.pooled_pin(inst), attribute)(*args, **kwargs)
+        return pooled
+
+    def __setattr__(self, attribute, value):
+        with self.pooled_lock:
+            self.pooled_attributes[attribute] = value
+            for session in self.pooled_sessions.values():
+                setattr(session, attribute, value)
@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Hitachi Vantara, Inc. All rights reserved.
+# Author: Giacomo Chiapparini <@gchiapparini-hv>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# Call traces: with trace_record every Raidcom/Cci call of a task (the calls hitachi_raidcom_metrics times) is
+# written with its arguments, result and timing to a gzip file of JSON lines. With trace_replay
+# the calls are answered from such a file and nothing runs on the storage, at the recorded timing or at full speed,
+# so the python side of a task (parsing, lookups, result building) can be profiled against the trace of a large array.
+#
+# a trace file holds one gzip member per recorded task: a header line {trace, serial, horcm_inst, task, started},
+# then one line per call {t, s, target, method, args, result, error}; a task replays the first recorded task with
+# the same parameters and fails if there is none
+#
+# summary of a trace file:
+#   python -m ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom_trace <trace file>
+
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+from ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom_result import result_encode, result_decode
+from ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom_cache import cache_lock
+
+import gzip
+import hashlib
+import os
+import threading
+import time
+
+
+# trace file format version
+trace_version = 1
+# module parameters that do not identify the task of a trace, a replay may run on another host
+trace_params_ignored = ('trace_record', 'trace_replay', 'trace_replay_speed', 'metrics_log', 'log_level', 'log_max_bytes',
+                        'log_backup_count', 'log_rotate_when', 'cci_path', 'cache_dir', 'broker_socket')
+
+
+class hitachi_raidcom_trace_error(Exception):
+    pass
+
+
+def trace_task(params):
+    # sha1 of the module parameters that make the task, a replayed task looks up its recording by it
+    task = dict((key, value) for key, value in (params or {}).items() if key not in trace_params_ignored and not key.startswith('_'))
+    return hashlib.sha1(json.dumps(task, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def trace_arguments(args, kwargs):
+    # arguments as they are written to the trace, so recorded and replayed calls compare equal
+    arguments = dict(kwargs, args=list(args)) if args else dict(kwargs)
+    return json.loads(json.dumps(arguments, sort_keys=True, default=str))
+
+
+def trace_init_attributes(value):
+    # the data attributes (e.g. maxldevid, serial) of a Raidcom/Cci set up while recording, a replay stands in with them
+    if value is None or isinstance(value, (dict, list, tuple, str, int, float, bool)):
+        return None
+    return dict((key, item) for key, item in vars(value).items()
+                if not key.startswith('_') and (item is None or isinstance(item, (str, int, float, bool))))
+
+
+def trace_load(path):
+    # [(header, [call, ...]), ...] of a trace file, one entry per recorded task
+    tasks = []
+    try:
+        with gzip.open(path, 'rt') as tracefile:
+            for line in tracefile:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if 'trace' in entry:
+                    tasks.append((entry, []))
+                elif tasks:
+                    tasks[-1][1].append(entry)
+    except (IOError, OSError, ValueError) as e:
+        raise hitachi_raidcom_trace_error('trace error - {} can not be read: {}'.format(path, str(e)))
+    if not tasks:
+        raise hitachi_raidcom_trace_error('trace error - {} holds no recorded task'.format(path))
+    return tasks
+
+
+class hitachi_raidcom_replayed(object):
+    # stands in for the Raidcom or Cci of a replayed task: its calls are answered by the trace in metrics.timed,
+    # data attributes come from the recording
+    def __init__(self, name, attributes=None):
+        self.replayed_name = name
+        self.__dict__.update(attributes or {})
+
+    def __getattr__(self, attribute):
+        if attribute.startswith('_'):
+            raise AttributeError(attribute)
+
+        def replayed(*args, **kwargs):
+            raise hitachi_raidcom_trace_error('trace error - {}.{} called outside of the replay'.format(self.replayed_name, attribute))
+        return replayed
+
+
+class hitachi_raidcom_trace(object):
+    # record: trace = hitachi_raidcom_trace(path, params, ...); metrics.trace = trace; the file is written at exit
+    # replay: trace = hitachi_raidcom_trace(path, params, replay=True, speed='full'); metrics.trace = trace
+    def __init__(self, path, params, serial=None, horcm_inst=None, replay=False, speed='full'):
+        self.path = os.path.expanduser(path)
+        self.task = trace_task(params)
+        self.serial = serial
+        self.horcm_inst = horcm_inst
+        self.replaying = replay
+        self.speed = speed
+        self.start = time.time()
+        self.calls = []
+        self.saved = False
+        self.lock = threading.Lock()
+        if replay:
+            tasks = trace_load(self.path)
+            matching = [calls for header, calls in tasks if header.get('task') == self.task]
+            if not matching:
+                raise hitachi_raidcom_trace_error('trace error - none of the {} tasks recorded in {} has the parameters of this task'.format(
+                    len(tasks), self.path))
+            self.calls = matching[0]
+            for call in self.calls:
+                call['replayed'] = False
+        else:
+            import atexit
+            atexit.register(self.save)
+
+    def traced(self, target, method, function):
+        # function as metrics.timed calls it: recorded, or replaced by its recorded call
+        def recorded(*args, **kwargs):
+            start = time.time()
+            try:
+                value = function(*args, **kwargs)
+            except Exception as e:
+                self.add(target, method, trace_arguments(args, kwargs), start, None, str(e))
+                raise
+            if method == '__init__':
+                self.add(target, method, trace_arguments(args, kwargs), start, trace_init_attributes(value), None)
+            else:
+                self.add(target, method, trace_arguments(args, kwargs), start, result_encode(value), None)
+            return value
+
+        def replayed(*args, **kwargs):
+            if method == '__init__':
+                return hitachi_raidcom_replayed(target, self.replay_attributes(target))
+            return result_decode(self.replay(target, method, trace_arguments(args, kwargs))['result'])
+
+        return (recorded, replayed)[self.replaying]
+
+    def add(self, target, method, args, start, result, error):
+        call = {'t': round(start - self.start, 6), 's': round(time.time() - start, 6), 'target': target, 'method': method,
+                'args': args, 'result': result, 'error': error}
+        with self.lock:
+            self.calls.append(call)
+        return call
+
+    def replay(self, target, method, args):
+        # the first unreplayed call of target.method with these arguments, else the first one with any arguments
+        # (e.g. another instance of horcm_inst_pool); a recorded error is raised again
+        with self.lock:
+            calls = [call for call in self.calls if not call['replayed'] and call['target'] == target and call['method'] == method]
+            matching = [call for call in calls if call['args'] == args] or calls
+            if not matching:
+                raise hitachi_raidcom_trace_error('trace error - no recorded {}.{} call left in {}'.format(target, method, self.path))
+            call = matching[0]
+            call['replayed'] = True
+        if self.speed == 'recorded' and call['s'] > 0:
+            time.sleep(call['s'])
+        if call['error'] is not None:
+            raise Exception(call['error'])
+        return call
+
+    def replay_attributes(self, target):
+        # data attributes of the recorded Raidcom/Cci set up, or the ones read through the broker when it was recorded with one
+        for call in self.calls:
+            if call['target'] == target and call['method'] == '__init__':
+                if not call['replayed']:
+                    call['replayed'] = True
+                    if self.speed == 'recorded' and call['s'] > 0:
+                        time.sleep(call['s'])
+                return call['result']
+        return dict((call['args']['args'][0], result_decode(call['result'])) for call in self.calls
+                    if call['target'] == target and call['method'] == 'broker_getattr' and call['error'] is None)
+
+    def save(self):
+        # append the task to the trace file as one gzip member, parallel forks append one after the other
+        with self.lock:
+            if self.replaying or self.saved:
+                return False
+            self.saved = True
+            calls = list(self.calls)
+        header = {'trace': trace_version, 'serial': self.serial, 'horcm_inst': self.horcm_inst, 'task': self.task,
+                  'started': round(self.start, 3)}
+        lines = [json.dumps(entry, separators=(',', ':'), default=str) for entry in [header] + calls]
+        try:
+            with cache_lock(self.path):
+                with gzip.open(self.path, 'ab') as tracefile:
+                    tracefile.write(('\n'.join(lines) + '\n').encode('utf-8'))
+        except (IOError, OSError):
+            # a trace that can not be written never fails a task
+            return False
+        return True
+
+    def summary(self):
+        with self.lock:
+            calls = list(self.calls)
+        return {'mode': ('record', 'replay')[self.replaying], 'path': self.path, 'calls': len(calls),
+                'replayed': len([call for call in calls if call.get('replayed')]) if self.replaying else None,
+                'call_seconds': round(sum(call['s'] for call in calls), 3)}
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='summary of a hitachi_raidcom call trace')
+    parser.add_argument('trace', help='trace file written with trace_record')
+    options = parser.parse_args()
+    summary = []
+    for header, calls in trace_load(options.trace):
+        commands = {}
+        for call in calls:
+            command = commands.setdefault('{}.{}'.format(call['target'], call['method']), {'calls': 0, 'errors': 0, 'total_seconds': 0.0})
+            command['calls'] += 1
+            command['errors'] += (0, 1)[call['error'] is not None]
+            command['total_seconds'] = round(command['total_seconds'] + call['s'], 6)
+        summary.append({'serial': header.get('serial'), 'horcm_inst': header.get('horcm_inst'), 'task': header.get('task'),
+                        'started': header.get('started'), 'calls': len(calls), 'commands': commands})
+    print(json.dumps(summary, indent=4, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Hitachi Vantara, Inc. All rights reserved.
+# Author: Giacomo Chiapparini <@gchiapparini-hv>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# Transactions: changing raidcom commands are queued and run together under one raidcom lock resource,
+# in one session on one HORCM instance (also with horcm_inst_pool). Asynchronous commands are started with
+# -request_id auto and checked in bulk with one get command_status, each request is only read when that
+# reports errors. Every queued operation gets its own outcome (ok, failed, skipped).
+
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+from ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom_plan import plan_raidcom_command
+
+
+# the hiraid Raidcom method that renders the command line of an operation with noexec: hiraid addldev takes the
+# id through -ldev_range and reads it back from get command_status, which a command that is not run can not do
+transaction_methods = {
+    'addldev': 'addldev_legacy',
+    'extendldev': 'extendldev',
+    'deleteldev': 'deleteldev',
+    'modifyldevname': 'modifyldevname',
+}
+# operations the storage runs asynchronously, their outcome comes from get command_status
+transaction_asynchronous = ('addldev', 'extendldev', 'deleteldev')
+
+
+def transaction_table(stdout):
+    # [{column: value}, ...] of a raidcom table output
+    lines = [line.split() for line in (stdout or '').splitlines() if line.strip()]
+    if not lines:
+        return []
+    return [dict(zip(lines[0], values)) for values in lines[1:]]
+
+
+class hitachi_raidcom_transaction(object):
+    # transaction = hitachi_raidcom_transaction(raidcom); transaction.add('addldev', key=..., ldev_id=...); transaction.execute()
+    def __init__(self, raidcom):
+        self.raidcom = raidcom
+        self.operations = []
+
+    def add(self, method, key=None, **kwargs):
+        # queue one operation, once an operation failed the later ones with the same key are skipped
+        if method not in transaction_methods:
+            raise Exception('transaction error - {} can not be queued'.format(method))
+        operation = {'method': method, 'key': key, 'args': kwargs, 'status': 'queued'}
+        self.operations.append(operation)
+        return operation
+
+    def command(self, storage, operation):
+        # the command line hiraid builds (and validates) for the operation on the instance of storage, nothing is run
+        cmd = getattr(storage, transaction_methods[operation['method']])(noexec=True, **operation['args']).cmd
+        if operation['method'] in transaction_asynchronous:
+            cmd = '{} -request_id auto'.format(cmd.rstrip())
+        return cmd
+
+    def undo(self, storage, operation):
+        # the undo hiraid records for an LDEV it added, once get command_status confirmed it
+        if operation['method'] == 'addldev':
+            storage.populateundo({'undodef': 'deleteldev', 'args': {'ldev_id': operation['args']['ldev_id']}}, storage.undocmds, storage.undodefs)
+
+    def execute(self):
+        # run all queued operations, returns them with status, cmd, returncode, stdout, stderr and msg
+        if not self.operations:
+            return []
+        if self.raidcom.plan is not None:
+            return self.planned()
+        session = self.raidcom.raidcom_session()
+        # other tasks must not keep reading what this changes from the query cache
+        self.raidcom.query_cache_invalidate('raidcom')
+        scheduler = self.raidcom.horcm_scheduler()
+        try:
+            if not scheduler:
+                return self.run(session)
+            # lock resource and command_status belong to one instance, all operations run on the same one
+            with scheduler.slot(self.raidcom.metrics) as inst:
+                return self.run(session.pooled_pin(inst))
+        finally:
+            self.raidcom.query_cache_invalidate('raidcom')
+
+    def run(self, storage):
+        try:
+            storage.lockresource()
+        except Exception as e:
+            for operation in self.operations:
+                operation.update(status='failed', msg='lock resource error: {}'.format(str(e)))
+            return self.operations
+        try:
+            storage.resetcommandstatus()
+            failedKeys = set()
+            for operation in self.operations:
+                if operation['key'] is not None and operation['key'] in failedKeys:
+                    operation.update(status='skipped', msg='an earlier operation of {} failed'.format(operation['key']))
+                    continue
+                if operation['method'] not in transaction_asynchronous and self.submitted(operation['key']):
+                    # e.g. the name of an LDEV that is still being added: wait for everything started so far
+                    failedKeys.update(self.check(storage))
+                    if operation['key'] is not None and operation['key'] in failedKeys:
+                        operation.update(status='skipped', msg='an earlier operation of {} failed'.format(operation['key']))
+                        continue
+                operation['cmd'] = self.command(storage, operation)
+                cmdreturn = storage.execute(operation['cmd'], raise_err=False)
+                operation.update(returncode=cmdreturn.returncode, stdout=cmdreturn.stdout, stderr=cmdreturn.stderr)
+                if cmdreturn.returncode:
+                    operation.update(status='failed', msg=(cmdreturn.stderr or '').strip())
+                    failedKeys.add(operation['key'])
+                elif operation['method'] in transaction_asynchronous:
+                    # REQID : <id>
+                    operation.update(status='submitted', request_id=(cmdreturn.stdout or '').rsplit(':', 1)[-1].strip())
+                else:
+                    operation['status'] = 'ok'
+            self.check(storage)
+        finally:
+            storage.unlockresource()
+        return self.operations
+
+    def submitted(self, key):
+        # operations started but not yet checked, of key or (key None) of any key
+        return [operation for operation in self.operations
+                if operation['status'] == 'submitted' and (key is None or operation['key'] in (key, None))]
+
+    def check(self, storage):
+        # one get command_status for all submitted operations, returns the keys of the failed ones
+        submitted = self.submitted(None)
+        if not submitted:
+            return set()
+        status = transaction_table(storage.getcommandstatus().stdout)
+        if not [row for row in status if row.get('ERR_CNT', '0') not in ('0', '-')]:
+            for operation in submitted:
+                operation['status'] = 'ok'
+                self.undo(storage, operation)
+            return set()
+        failedKeys = set()
+        for operation in submitted:
+            try:
+                request = transaction_table(storage.getcommandstatus(request_id=operation['request_id']).stdout)
+                errors = [row for row in request if row.get('SSB1', '-') != '-']
+                msg = errors and 'SSB1 {} SSB2 {}'.format(errors[0].get('SSB1'), errors[0].get('SSB2'))
+            except Exception as e:
+                msg = str(e)
+            operation.update(status=('ok', 'failed')[bool(msg)], msg=msg or None)
+            if msg:
+                failedKeys.add(operation['key'])
+            else:
+                self.undo(storage, operation)
+        # the error count is for the whole session
+        storage.resetcommandstatus()
+        return failedKeys
+
+    def planned(self):
+        # check_mode: the command lines the transaction would run go to the plan, nothing runs
+        plan = self.raidcom.plan
+        # the session renders the command lines, its changing calls do not go through the plan
+        storage = self.raidcom.raidcom_session()
+
+        def line(method):
+            return plan_raidcom_command(storage, method)
+
+        plan.record('raidcom', 'lockresource', (), {}, commands=[line('lockresource'), line('resetcommandstatus')])
+        # keys of the asynchronous operations not checked yet
+        pending = set()
+        for operation in self.operations:
+            asynchronous = operation['method'] in transaction_asynchronous
+            if not asynchronous and pending and (operation['key'] is None or operation['key'] in pending or None in pending):
+                plan.record('raidcom', 'getcommandstatus', (), {}, commands=[line('getcommandstatus')])
+                pending = set()
+            operation.update(status='planned', cmd=self.command(storage, operation), returncode=0, stdout='', stderr='')
+            plan.record('raidcom', operation['method'], (), operation['args'], commands=[operation['cmd']])
+            if asynchronous:
+                pending.add(operation['key'])
+        plan.record('raidcom', 'unlockresource', (), {}, commands=([], [line('getcommandstatus')])[bool(pending)] + [line('unlockresource')])
+        return self.operations
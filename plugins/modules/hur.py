@@ -35,24 +35,268 @@ options:
     - storage serial ID. (e.g 495101).
     type: int
     required: false
+  cache_dir:
+    description:
+    - Directory for the local storage cache files, one set of files per storage serial.
+    - Defaults to C(~/.hitachi_raidcom) of the user running the module.
+    type: path
+    required: false
+  metrics_log:
+    description:
+    - JSON-lines file every CCI/raidcom call of the task is appended to (command, arguments, wall time, exit code, output size).
+    - The totals are always returned in I(metrics).
+    type: path
+    required: false
+  broker_socket:
+    description:
+    - Unix socket of a running hitachi.raidcom session broker, which keeps a warm Raidcom/Cci per storage_serial and horcm_inst.
+    - Defaults to C(~/.hitachi_raidcom/broker.sock). Without an answering broker the module runs as before.
+    - Start the broker with C(python -m ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom_broker --socket <path>).
+    type: path
+    required: false
+  trace_record:
+    description:
+    - Trace file (gzip, JSON lines) every Raidcom/CCI call of the task is appended to with its arguments, output and timing,
+      to replay the task later without the storage with I(trace_replay).
+    - A trace can hold the tasks of a whole playbook. The task is written when the module exits.
+    type: path
+    required: false
+  trace_replay:
+    description:
+    - Answer every Raidcom/CCI call of the task from a trace file written with I(trace_record), nothing runs on the storage
+      and no broker is used. The task replays the first recorded task with the same parameters and fails if there is none.
+    - A replay has no side effects, no cache file in I(cache_dir) is read or written and no horcm.conf file is written.
+    - For profiling the module itself, I(metrics) then shows the time spent outside of the calls.
+    - Summary of a trace file with C(python -m ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom_trace <file>).
+    type: path
+    required: false
+  trace_replay_speed:
+    description:
+    - C(full) answers the calls at once, C(recorded) takes as long for each call as it took when it was recorded.
+    type: str
+    required: false
+    default: full
+    choices: [ full, recorded ]
+  cci_path:
+    description:
+    - Directory of the CCI binaries (raidcom, pairdisplay, ...).
+    - Point it at the bin directory of tests/simulator/cci_simulator.py to run against the offline CCI simulator.
+    type: path
+    required: false
+    default: /usr/bin/
+  cache_ttl:
+    description:
+    - Seconds a cached storage listing (e.g. the volume_name index) is reused before the storage is queried again.
+    - C(0) disables the cache. A cached listing does not see volumes or volume_names changed outside of this collection.
+    - The listings are cached per I(storage_serial), without it nothing is cached.
+    type: int
+    required: false
+    default: 0
+  horcm_inst_pool:
+    description:
+    - More HORCM instances of the same storage (with the same copy_groups as I(horcm_inst)).
+    - The CCI commands of all tasks on the host for this storage_serial are then spread round robin over I(horcm_inst) and the pool,
+      with at most I(horcm_inst_max_inflight) commands per instance, the others wait in a first come first served queue (lock files in I(cache_dir)).
+    - Commands for instances outside of the pool (e.g. the other site) are not scheduled.
+    type: list
+    elements: int
+    required: false
+  horcm_inst_max_inflight:
+    description:
+    - Commands running at the same time on one HORCM instance of I(horcm_inst_pool).
+    type: int
+    required: false
+    default: 1
+  log_level:
+    description:
+    - Level of the hitachi_raidcom log (C(/var/log/hitachi_raidcom_collection.log)), written by a background thread.
+    type: str
+    required: false
+    default: INFO
+    choices: [ DEBUG, INFO, WARNING, ERROR, CRITICAL ]
+  log_max_bytes:
+    description:
+    - Size in bytes at which the log is rotated.
+    type: int
+    required: false
+    default: 10485760
+  log_backup_count:
+    description:
+    - Rotated log files that are kept.
+    type: int
+    required: false
+    default: 5
+  log_rotate_when:
+    description:
+    - Rotate the log by time instead of size, e.g. C(midnight) or C(H) (see python TimedRotatingFileHandler).
+    - C(W0) to C(W6) rotate on a weekday, C(W0) is Monday.
+    type: str
+    required: false
+    choices: [ S, M, H, D, midnight, W0, W1, W2, W3, W4, W5, W6 ]
+  query_cache_ttl:
+    description:
+    - Seconds the results of read-only Raidcom/CCI queries (get ..., pairdisplay, raidvchkdsp) are shared by all tasks on the host,
+      cached per storage_serial, horcm_inst, command and arguments in I(cache_dir).
+    - Any changing Raidcom/CCI call invalidates them. The pair state read before a transition and the I(wait_for) polls are never cached.
+    - C(0) disables the query cache.
+    type: int
+    required: false
+    default: 0
   state:
     description:
-    - Either create/expand(present) or delete(absent) or query a volume.
+    - C(present) (paircreate), C(absent) (pairsplit -S), C(splitted) (pairsplit), C(resynced) (pairresync) and C(takeover) (horctakeover)
+      first read the pair status with one pairdisplay and only run their command when the copy_group is not yet in the target state.
+    - I(changed) is only true when a command was run.
+    - C(present) fails for a copy_group with pairs in SMPL and already paired pairs (MIXED) without running paircreate.
+    - C(query)/C(display) (pairdisplay) and C(chkdsp) (raidvchkdsp) never change anything.
+    - C(monitor) samples the journals of the copy_group (pairdisplay -v jnl) I(samples) times, I(interval) seconds apart,
+      and returns per journal the usage, fill/drain rate, time to full, write rate and RPO with the series of samples.
+    - C(provisioned) creates the copy_groups of I(primary_ldevs) and I(secondary_ldevs), their HORCM_LDEV and HORCM_INST lines are added
+      to the horcm.conf files of I(horcm_inst) (and I(horcm_inst_pool)) and I(peer_horcm_inst) in I(horcm_dir) if missing,
+      paircreate runs for the copy_groups in SMPL with at most I(max_workers) at a time, then the initial copy of all of them
+      is polled in one loop until PAIR, an error state or I(timeout), a copy_group without pairs until I(timeout).
+      In check_mode the horcm.conf files are not written, otherwise they are updated under a lock file next to them.
     type: str
     required: true
-    choices: [ absent, present, query ]
+    choices: [ absent, present, resynced, splitted, takeover, display, query, chkdsp, monitor, provisioned ]
   copy_group:
     description:
     - The specific copy_group name as defined in the horcm file
+    - Either I(copy_group) or I(copy_groups) is required.
     type: str
-    required: true
-  
+    required: false
+  copy_groups:
+    description:
+    - List of copy_groups handled in one task, the CCI commands of the groups run in parallel.
+    - An entry is a copy_group name or a dict with C(copy_group) and the C(horcm_inst) to use for it.
+    - I(facts) is a dict keyed by copy_group with C(facts), C(failed), C(msg), C(horcm_inst) and C(elapsed_seconds) per group.
+    - A group that fails does not stop the other groups, the task fails after all groups are done.
+    type: list
+    elements: raw
+    required: false
+  journal_primary:
+    description:
+    - Journal ID of the P-VOLs for paircreate (C(present), C(provisioned)).
+    type: int
+    required: false
+  journal_secondary:
+    description:
+    - Journal ID of the S-VOLs for paircreate (C(present), C(provisioned)).
+    type: int
+    required: false
+  primary_ldevs:
+    description:
+    - C(provisioned) only. P-VOL LDEVs on I(storage_serial), LDEV ids or ranges C(start-end) (both included),
+      an LDEV id is decimal, hex (C(0x04D2)) or CU:LDEV (C(04:D2)).
+    type: list
+    elements: str
+    required: false
+  secondary_ldevs:
+    description:
+    - C(provisioned) only. S-VOL LDEVs on I(remote_storage_serial) in the same format, the n-th S-VOL pairs with the n-th P-VOL.
+    type: list
+    elements: str
+    required: false
+  pairs_per_group:
+    description:
+    - C(provisioned) only. Pairs per copy_group. The copy_groups are then named C(<copy_group>_000), C(<copy_group>_001), ...
+    - C(0) puts all pairs in one copy_group named I(copy_group).
+    - The pairs are named C(<copy_group name>_0000), C(<copy_group name>_0001), ...
+    type: int
+    required: false
+    default: 0
+  remote_storage_serial:
+    description:
+    - C(provisioned) only. Serial of the storage of I(peer_horcm_inst), written to its HORCM_LDEV lines.
+    type: int
+    required: false
+  horcm_dir:
+    description:
+    - C(provisioned) only. Directory of the horcm<inst>.conf files.
+    type: path
+    required: false
+    default: /etc
+  horcm_restart:
+    description:
+    - C(provisioned) only. Restart the HORCM instances whose horcm.conf got new copy_groups (horcmshutdown/horcmstart),
+      HORCM only reads its horcm.conf when it starts.
+    - Without it paircreate of new copy_groups fails until the instances are restarted.
+    type: bool
+    required: false
+    default: false
+  wait_for:
+    description:
+    - After the I(state) action, wait until all pairs of the copy_group(s) are in this pair status.
+    - C(PSUS) also accepts C(SSUS) on the S-VOL side, C(PAIR) also accepts C(PFUL).
+    - The pair status is polled in the same task. The poll interval adapts to the copy progress.
+    - Waiting stops with an error after I(timeout) seconds, when a pair goes to C(PSUE) or C(PDUB) or when the copy_group has no pairs.
+    - The result is returned in I(wait) with the final state, the elapsed time, the copy ETA and the poll history.
+    type: str
+    required: false
+    choices: [ PAIR, PSUS, SSWS, SMPL ]
+  timeout:
+    description:
+    - Seconds for horctakeover (-t) and the maximum seconds to wait for I(wait_for).
+    type: int
+    required: false
+    default: 60
+  max_workers:
+    description:
+    - Maximum number of copy_groups handled at the same time, for C(provisioned) the paircreate parallelism.
+    type: int
+    required: false
+    default: 10
+  peer_horcm_inst:
+    description:
+    - HORCM instance of the other site. After the I(state) action (and I(wait_for)) pairdisplay and raidvchkdsp run
+      on I(horcm_inst) and I(peer_horcm_inst) at the same time.
+    - The merged per pair view is returned in I(sites) with the local and remote status, the raidvchkdsp guard flags
+      of both sides and the mismatches found between them (status, LDEV, P-VOL/S-VOL role, missing pair).
+    type: int
+    required: false
+  samples:
+    description:
+    - C(monitor) only. Number of journal samples taken in the task.
+    type: int
+    required: false
+    default: 10
+  interval:
+    description:
+    - C(monitor) only. Seconds between two journal samples.
+    type: int
+    required: false
+    default: 10
+  fields:
+    description:
+    - C(query)/C(display) only. pairdisplay columns (e.g. C(Status), C(Fence), C(JID), C(LDEV#)) to return per pair side.
+    - I(facts) then only holds C(pairdisplaydata) with these columns, the raw pairdisplay output is not returned.
+    - With I(summary) the columns returned for the pairs not in I(expected_state).
+    type: list
+    elements: str
+    required: false
+  summary:
+    description:
+    - C(query)/C(display) only. Return counts of the local pair side per C(Status), C(Fence), journal (C(JID)) and C(P/S)
+      and only the pairs that are not in I(expected_state), with their remote status.
+    - The counts are taken from the full pairdisplay of the copy group, only the module result is reduced, not the pairdisplay the module reads.
+    type: bool
+    required: false
+    default: false
+  expected_state:
+    description:
+    - Pair status I(summary) compares the local side against, with the same accepted values as I(wait_for).
+    type: str
+    required: false
+    default: PAIR
+    choices: [ PAIR, PSUS, SSWS, SMPL ]
+
 requirements:
 - CCI/raidcom CLI software from support.hitachivantara.com (customer login required)
 - horcm.conf file, horcmstart and login done (work is in progress to automate this)
 notes:
-- Supports C(check_mode).
-- Supports D(diff_mode).
+- Supports C(check_mode). The pair status is read (with I(query_cache_ttl) from the query cache, so the tasks
+  of a batch share one snapshot), the CCI commands the task would run are returned in order in I(plan) and nothing is changed. I(wait_for) is not polled.
+- Supports D(diff_mode). In check_mode the diff lists the planned CCI commands.
 '''
 
 EXAMPLES = r'''
@@ -65,6 +309,77 @@ EXAMPLES = r'''
       state: query
       copy_group: "hur"
 
+  - name: get pairstatus of several copy_groups in one task
+    hur:
+      horcm_inst: "1"
+      storage_serial: "495101"
+      state: query
+      copy_groups:
+        - "hur"
+        - copy_group: "hur_db"
+          horcm_inst: "3"
+      max_workers: 8
+
+  - name: resync and wait until the copy_group is in PAIR again
+    hur:
+      horcm_inst: "1"
+      storage_serial: "495101"
+      state: resynced
+      copy_group: "hur"
+      wait_for: PAIR
+      timeout: 3600
+
+  - name: resync and check both sites in one round-trip
+    hur:
+      horcm_inst: "1"
+      peer_horcm_inst: "2"
+      storage_serial: "495101"
+      state: resynced
+      copy_group: "hur"
+
+  - name: journal fill rate, time to full and RPO over 5 minutes
+    hur:
+      horcm_inst: "1"
+      storage_serial: "495101"
+      state: monitor
+      copy_group: "hur"
+      samples: 30
+      interval: 10
+
+  - name: counts per status, fence and journal and the pairs that are not in PAIR
+    hur:
+      horcm_inst: "1"
+      storage_serial: "495101"
+      state: query
+      copy_group: "hur"
+      summary: true
+      expected_state: PAIR
+
+  - name: pair status and journal of every pair only
+    hur:
+      horcm_inst: "1"
+      storage_serial: "495101"
+      state: query
+      copy_group: "hur"
+      fields: [ Status, JID ]
+
+  - name: 400 pairs in copy_groups of 100, created 2 at a time, initial copy tracked up to 2 hours
+    hur:
+      horcm_inst: "1"
+      peer_horcm_inst: "2"
+      storage_serial: "495101"
+      remote_storage_serial: "495102"
+      state: provisioned
+      copy_group: "hur_app"
+      primary_ldevs: [ "1000-1399" ]
+      secondary_ldevs: [ "05:00-06:8F" ]
+      pairs_per_group: 100
+      journal_primary: 1
+      journal_secondary: 1
+      horcm_restart: true
+      max_workers: 2
+      timeout: 7200
+
 '''
 
 RETURN = r'''
@@ -73,7 +388,7 @@ changed:
     returned: always
     type: bool
 diff:
-    description: status "before" and "after"
+    description: in check_mode the planned CCI command lines as "after"
     returned: when -D is used
     type: dict
 facts:
@@ -92,23 +407,64 @@ message:
     description: status and activity
     returned: always
     type: str
+metrics:
+    description: number of CCI/raidcom calls, their wall time per command and the task time spent outside of them
+    returned: always
+    type: dict
+plan:
+    description: ordered CCI/raidcom calls the task would run (target, method, args, commands, copy_group)
+    returned: in check_mode
+    type: list
+sites:
+    description: two-site view per pair (local, remote, local_gflags, remote_gflags, consistent, mismatches), keyed by copy_group with copy_groups
+    returned: when peer_horcm_inst is used
+    type: dict
+trace:
+    description: trace_record/trace_replay file, mode and number of calls recorded or replayed
+    returned: when trace_record or trace_replay is used
+    type: dict
+wait:
+    description: wait_for result (reached, state, elapsed_seconds, eta_seconds, history), keyed by copy_group with copy_groups
+    returned: when wait_for is used
+    type: dict
 '''
 
 from ansible.module_utils.basic import AnsibleModule
 from ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom import hitachi_raidcom, hitachi_raidcom_argument_spec
 
 
+def hur_changed(module, facts):
+    # the transitions only run their CCI command when a copy_group is not yet in the target state
+    if module.params["copy_groups"]:
+        return [group for group in facts if facts[group].get('facts', {}).get('changed')] != []
+    return facts['changed']
+
+
 def run_module():
 
     # # define available arguments/parameters a user can pass to the module
     # # add here the module specific values provided by the playbook
     argument_spec = {
-        "state": {"required": True, "type": "str", "choices": ["absent", "present", "resynced", "splitted", "takeover", "display", "query", "chkdsp"]},
-        "copy_group": {"required": True, "type": "str"},
+        "state": {"required": True, "type": "str", "choices": ["absent", "present", "resynced", "splitted", "takeover", "display", "query", "chkdsp", "monitor", "provisioned"]},
+        "copy_group": {"required": False, "type": "str"},
+        "copy_groups": {"required": False, "type": "list", "elements": "raw"},
         "timeout": {"required": False, "type": "int", "default": 60},
+        "wait_for": {"required": False, "type": "str", "choices": ["PAIR", "PSUS", "SSWS", "SMPL"]},
         "journal_primary": {"required": False, "type": "int"},
         "journal_secondary": {"required": False, "type": "int"},
         "options": {"required": False, "type": "str", "choices": ["-RB", "-rw", "-r", "-S","-l"]},
+        "peer_horcm_inst": {"required": False, "type": "int"},
+        "samples": {"required": False, "type": "int", "default": 10},
+        "interval": {"required": False, "type": "int", "default": 10},
+        "fields": {"required": False, "type": "list", "elements": "str"},
+        "summary": {"required": False, "type": "bool", "default": False},
+        "expected_state": {"required": False, "type": "str", "default": "PAIR", "choices": ["PAIR", "PSUS", "SSWS", "SMPL"]},
+        "primary_ldevs": {"required": False, "type": "list", "elements": "str"},
+        "secondary_ldevs": {"required": False, "type": "list", "elements": "str"},
+        "pairs_per_group": {"required": False, "type": "int", "default": 0},
+        "remote_storage_serial": {"required": False, "type": "int"},
+        "horcm_dir": {"required": False, "type": "path", "default": "/etc"},
+        "horcm_restart": {"required": False, "type": "bool", "default": False},
         # only used in split 
         # -RB (SSWS to SSUS(PSUE)), -rw (ReadWrite), -r (ReadOnly), -S (Simplex=Delete Replication)
     }
@@ -132,6 +488,9 @@ def run_module():
     # supports check mode
     module = AnsibleModule(
         argument_spec=argument_spec,
+        required_one_of=[["copy_group", "copy_groups"]],
+        mutually_exclusive=[["copy_group", "copy_groups"]],
+        required_if=[["state", "provisioned", ["copy_group", "primary_ldevs", "secondary_ldevs"]]],
         supports_check_mode=True,
     )
 
@@ -152,39 +511,91 @@ def run_module():
 
     # present: pair create
     if module.params["state"] == "present":
-        result['facts'] = raidcom.hur_create()
-        result['changed'] = True
+        try:
+            result['facts'] = raidcom.hur_create()
+        except Exception as e:
+            # e.g. a MIXED copy_group, paircreate was not run
+            module.fail_json(msg=str(e), **result)
+        result['changed'] = hur_changed(module, result['facts'])
 
     # absent: pair delete (simplex)
     if module.params["state"] == "absent":
         result['facts'] = raidcom.hur_delete()
-        result['changed'] = True
+        result['changed'] = hur_changed(module, result['facts'])
 
     # absent: pair splitted (psus/ssus)
     if module.params["state"] == "splitted":
         result['facts'] = raidcom.hur_split()
-        result['changed'] = True
+        result['changed'] = hur_changed(module, result['facts'])
 
     # absent: pair resync
     if module.params["state"] == "resynced":
         result['facts'] = raidcom.hur_resync()
-        result['changed'] = True
+        result['changed'] = hur_changed(module, result['facts'])
 
     # absent: pair horctakeover
     if module.params["state"] == "takeover":
         result['facts'] = raidcom.hur_takeover()
-        result['changed'] = True
+        result['changed'] = hur_changed(module, result['facts'])
         
     # absent: pair raidvchkdsp
     if module.params["state"] == "chkdsp":
         result['facts'] = raidcom.hur_chkdsp()
         result['changed'] = False
 
+    # monitor: journal usage and RPO sampled in this task
+    if module.params["state"] == "monitor":
+        result['facts'] = raidcom.hur_monitor()
+        result['changed'] = False
+
+    # provisioned: copy_groups generated from LDEV ranges, created and their initial copy tracked
+    failures = []
+    if module.params["state"] == "provisioned":
+        result['facts'] = raidcom.hur_provision()
+        result['changed'] = result['facts']['changed']
+        if result['facts'].get('failed_copy_groups'):
+            failures.append('provisioned error - paircreate failed or initial copy not in PAIR (error state, no pairs or timeout {} seconds) for: {}'.format(
+                module.params["timeout"], ', '.join(result['facts']['failed_copy_groups'])))
+
     # query/display: get current hur pair status information
     #if module.params["state"] == "splitted":
     #    result['facts'] = raidcom.hur_split()
     #    #result['changed'] = False
 
+    # wait_for: poll in this task until the pairs reached the wanted state, provisioned tracks its copy_groups itself
+    if module.params["wait_for"] and module.params["state"] != "provisioned" and not module.check_mode:
+        result['wait'] = raidcom.hur_wait()
+        if module.params["copy_groups"]:
+            notReached = [group for group in result['wait'] if result['wait'][group]['failed'] or not result['wait'][group]['facts']['reached']]
+        else:
+            notReached = ([], [module.params["copy_group"]])[not result['wait']['reached']]
+        if notReached:
+            failures.append('wait_for error - {} not reached (error state, no pairs or timeout {} seconds) for: {}'.format(
+                module.params["wait_for"], module.params["timeout"], ', '.join(notReached)))
+
+    # peer_horcm_inst: both sites read at the same time after the action
+    if module.params["peer_horcm_inst"] is not None and module.params["state"] != "provisioned":
+        result['sites'] = raidcom.hur_sites()
+
+    # copy_groups: groups fail independently, report all of them before failing
+    if module.params["copy_groups"]:
+        failedGroups = [group for group in result['facts'] if result['facts'][group]['failed']]
+        if failedGroups:
+            failures.append('copy_groups error - {} of {} copy_groups failed: {}'.format(
+                len(failedGroups), len(result['facts']), ', '.join(failedGroups)))
+
+    # check_mode: the planned commands, structured and as diff
+    if raidcom.plan is not None:
+        result['plan'] = raidcom.plan.steps()
+        if module._diff:
+            result['diff'] = raidcom.plan.diff()
+
+    result['metrics'] = raidcom.metrics.summary()
+    if raidcom.trace is not None:
+        result['trace'] = raidcom.trace.summary()
+    if failures:
+        module.fail_json(msg='; '.join(failures), **result)
+
     module.exit_json(**result)
 
 # Main
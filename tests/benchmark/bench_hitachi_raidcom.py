@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Hitachi Vantara, Inc. All rights reserved.
+# Author: Giacomo Chiapparini <@gchiapparini-hv>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# Time every hitachi_raidcom method and every hur state against the offline CCI simulator
+# (tests/simulator/cci_simulator.py). Each case gets a fresh hitachi_raidcom as a task would,
+# Raidcom/Cci setup is timed on its own (init.*) and not part of the other cases.
+#
+#   python tests/benchmark/bench_hitachi_raidcom.py --ldevs 64000 --pairs 2000 --host-groups 100 --latency-ms 20 --output now.json
+#   python tests/benchmark/bench_hitachi_raidcom.py --baseline before.json --max-regression 20   # exit 1 on a slowdown
+#   python tests/benchmark/bench_hitachi_raidcom.py --cases 'hur\.' --runs 5
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SIMULATOR = os.path.join(HERE, '..', 'simulator', 'cci_simulator.py')
+
+# hur states and the hitachi_raidcom method the hur module runs for them
+HUR_STATES = {
+    'query': 'hur_status', 'display': 'hur_status', 'present': 'hur_create', 'absent': 'hur_delete',
+    'splitted': 'hur_split', 'resynced': 'hur_resync', 'takeover': 'hur_takeover', 'chkdsp': 'hur_chkdsp',
+}
+
+
+class module(object):
+    # the parts of AnsibleModule hitachi_raidcom uses
+    check_mode = False
+
+    def __init__(self, params):
+        # _ansible_check_mode: plan mode, as ansible-playbook --check
+        self.check_mode = params.pop('_ansible_check_mode', False)
+        self.params = params
+
+    def fail_json(self, **kwargs):
+        raise Exception(kwargs.get('msg', kwargs))
+
+
+def cases(options):
+    # (name, params, method) in the order they run, the volume and hur cases go through a full lifecycle
+    # so every run starts from the same storage state
+    freeId = str(options.ldevs + 100)
+    batch = [{'volume_id': str(options.ldevs + 200 + n), 'volume_name': 'bench_{:03d}'.format(n), 'volume_size': '1GB'}
+             for n in range(options.batch)]
+    # the same without volume_id, the ids come from the free LDEV bitmap
+    batchAuto = [{'volume_name': 'bench_auto_{:03d}'.format(n), 'volume_size': '1GB'} for n in range(options.batch)]
+    group = 'HUR_{:03d}'.format(min(2, max(options.copy_groups - 1, 0)))
+    volume = {'volume_id': '', 'volume_name': '', 'volume_size': None, 'pool_id': 0}
+    hur = {'copy_group': group, 'copy_groups': None, 'options': '', 'timeout': 60, 'wait_for': None,
+           'journal_primary': 0, 'journal_secondary': 0, 'max_workers': 10,
+           'fields': None, 'summary': False, 'expected_state': 'PAIR', 'peer_horcm_inst': None}
+    return [
+        ('init.raidcom', {}, 'mystorage'),
+        ('init.cci', {}, 'cci'),
+        ('volume_get_properties', dict(volume, volume_id='5'), 'volume_get_properties'),
+        ('volume_get_properties.query_cache', dict(volume, volume_id='5', query_cache_ttl=300), 'volume_get_properties'),
+        ('volume_exists', dict(volume, volume_id='5'), 'volume_exists'),
+        ('volume_get_size', dict(volume, volume_id='5'), 'volume_get_size'),
+        ('volume_name_to_volume_id', dict(volume, volume_name='vol_00005'), 'volume_name_to_volume_id'),
+        ('volume_create', dict(volume, volume_id=freeId, volume_size='2097152'), 'volume_create'),
+        ('volume_set_name', dict(volume, volume_id=freeId, volume_name='bench_volume'), 'volume_set_name'),
+        ('volume_expand', dict(volume, volume_id=freeId, volume_size='2048'), 'volume_expand'),
+        ('volume_delete', dict(volume, volume_id=freeId), 'volume_delete'),
+        ('volumes.create.plan', dict(volume, volumes=batch, _ansible_check_mode=True), 'volume_create'),
+        ('volumes.create', dict(volume, volumes=batch), 'volume_create'),
+        ('volumes.delete', dict(volume, volumes=batch), 'volume_delete'),
+        ('volume_create.auto', dict(volume, volume_name='bench_auto', volume_size='2097152'), 'volume_create'),
+        ('volume_delete.auto', dict(volume, volume_name='bench_auto'), 'volume_delete'),
+        ('volumes.create.auto', dict(volume, volumes=batchAuto), 'volume_create'),
+        ('volumes.delete.auto', dict(volume, volumes=batchAuto), 'volume_delete'),
+        ('capacity_facts', {}, 'capacity_facts'),
+        # the python side alone: the same task recorded, then answered from the trace
+        ('capacity_facts.trace', {'trace_record': options.trace}, 'capacity_facts'),
+        ('capacity_facts.replay', {'trace_replay': options.trace}, 'capacity_facts'),
+        ('host_grp_get_facts', {'port': 'CL1-A', 'host_grp_name': 'hg_0000'}, 'host_grp_get_facts'),
+        ('host_grp_get_facts.ports', {'ports': 'all', 'host_grp_name': 'hg_00*', 'max_workers': 10}, 'host_grp_get_facts'),
+        ('hur.query', dict(hur, state='query'), HUR_STATES['query']),
+        ('hur.query.query_cache', dict(hur, state='query', query_cache_ttl=300), HUR_STATES['query']),
+        ('hur.query.copy_groups', dict(hur, state='query', copy_group=None,
+                                       copy_groups=['HUR_{:03d}'.format(n) for n in range(options.copy_groups)]), HUR_STATES['query']),
+        ('hur.query.copy_groups.trace', dict(hur, state='query', copy_group=None, trace_record=options.trace,
+                                             copy_groups=['HUR_{:03d}'.format(n) for n in range(options.copy_groups)]), HUR_STATES['query']),
+        ('hur.query.copy_groups.replay', dict(hur, state='query', copy_group=None, trace_replay=options.trace,
+                                              copy_groups=['HUR_{:03d}'.format(n) for n in range(options.copy_groups)]), HUR_STATES['query']),
+        ('hur.query.fields', dict(hur, state='query', fields=['Status', 'JID']), HUR_STATES['query']),
+        ('hur.query.summary', dict(hur, state='query', summary=True), HUR_STATES['query']),
+        ('hur.sites', dict(hur, state='query', peer_horcm_inst=options.remote_horcm_inst), 'hur_sites'),
+        ('hur.monitor', dict(hur, state='monitor', samples=3, interval=0), 'hur_monitor'),
+        ('hur.chkdsp', dict(hur, state='chkdsp'), HUR_STATES['chkdsp']),
+        ('hur.splitted.plan', dict(hur, state='splitted', _ansible_check_mode=True), HUR_STATES['splitted']),
+        ('hur.splitted', dict(hur, state='splitted'), HUR_STATES['splitted']),
+        ('hur.splitted.unchanged', dict(hur, state='splitted'), HUR_STATES['splitted']),
+        ('hur.resynced', dict(hur, state='resynced'), HUR_STATES['resynced']),
+        ('hur.resynced.wait_for', dict(hur, state='resynced', wait_for='PAIR'), 'hur_wait'),
+        ('hur.takeover', dict(hur, state='takeover', horcm_inst=options.remote_horcm_inst), HUR_STATES['takeover']),
+        ('hur.takeover.back', dict(hur, state='takeover'), HUR_STATES['takeover']),
+        ('hur.absent', dict(hur, state='absent'), HUR_STATES['absent']),
+        ('hur.present', dict(hur, state='present'), HUR_STATES['present']),
+        ('hur.present.wait_for', dict(hur, state='present', wait_for='PAIR'), 'hur_wait'),
+    ]
+
+
+def simulator_setup(options, directory):
+    args = [sys.executable, SIMULATOR, 'setup', '--dir', directory, '--ldevs', str(options.ldevs),
+            '--pairs', str(options.pairs), '--copy-groups', str(options.copy_groups),
+            '--host-groups', str(options.host_groups), '--latency-ms', str(options.latency_ms),
+            '--remote-horcm-inst', str(options.remote_horcm_inst), '--copy-seconds', '0']
+    for latency in options.latency:
+        args.extend(['--latency', latency])
+    return json.loads(subprocess.check_output(args, universal_newlines=True))
+
+
+def collection_root(collection):
+    # ansible_collections/hitachi/raidcom must point at the checkout
+    root = tempfile.mkdtemp(prefix='hitachi_raidcom_bench_')
+    os.makedirs(os.path.join(root, 'ansible_collections', 'hitachi'))
+    os.symlink(os.path.abspath(collection), os.path.join(root, 'ansible_collections', 'hitachi', 'raidcom'))
+    return root
+
+
+def run_case(hitachi_raidcom, base, params, method):
+    raidcom = hitachi_raidcom(module(dict(base, **params)))
+    # Raidcom (volume, host group cases) or Cci (hur cases) is set up before the clock starts
+    if method.startswith('hur_'):
+        raidcom.cci
+    elif method not in ('mystorage', 'cci'):
+        raidcom.mystorage
+    raidcom.metrics.samples = []
+    start = time.time()
+    error = None
+    try:
+        getattr(raidcom, method) if method in ('mystorage', 'cci') else getattr(raidcom, method)()
+    except Exception as e:
+        error = str(e)[:300]
+    elapsed = time.time() - start
+    if raidcom.trace is not None:
+        # written at exit in a task, the replay cases of this run read it
+        raidcom.trace.save()
+    summary = raidcom.metrics.summary()
+    return {'elapsed_ms': elapsed * 1000, 'calls': summary['calls'], 'call_ms': summary['call_seconds'] * 1000,
+            'commands': summary['commands'], 'error': error}
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2] if values else None
+
+
+def compare(results, baseline, maxRegression):
+    # median against the baseline median, only cases present in both
+    regressions = {}
+    for name, case in results.items():
+        before = baseline.get('cases', {}).get(name)
+        if not before or not before.get('median_ms') or case.get('median_ms') is None:
+            continue
+        ratio = case['median_ms'] / before['median_ms']
+        case['baseline_median_ms'] = before['median_ms']
+        case['ratio'] = round(ratio, 3)
+        if ratio > 1 + maxRegression / 100.0:
+            regressions[name] = case['ratio']
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='hitachi_raidcom benchmark against the offline CCI simulator')
+    parser.add_argument('--collection', default=os.path.join(HERE, '..', '..'))
+    parser.add_argument('--simulator-dir', default=None, help='use this simulator directory instead of a new one')
+    parser.add_argument('--ldevs', type=int, default=64000)
+    parser.add_argument('--pairs', type=int, default=2000)
+    parser.add_argument('--copy-groups', type=int, default=20)
+    parser.add_argument('--host-groups', type=int, default=100)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--latency', action='append', default=[], metavar='COMMAND=MS')
+    parser.add_argument('--horcm-inst', type=int, default=1)
+    parser.add_argument('--remote-horcm-inst', type=int, default=2)
+    parser.add_argument('--storage-serial', type=int, default=641900)
+    parser.add_argument('--batch', type=int, default=10, help='items of the volumes: cases')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--cases', default=None, help='regular expression, run only the matching cases')
+    parser.add_argument('--output', default=None, help='write the results to this json file')
+    parser.add_argument('--baseline', default=None, help='results of an earlier run to compare against')
+    parser.add_argument('--max-regression', type=float, default=20, help='percent slower than the baseline that fails the run')
+    options = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix='hitachi_raidcom_bench_')
+    directory = options.simulator_dir or os.path.join(work, 'simulator')
+    simulator = None if options.simulator_dir else simulator_setup(options, directory)
+    cciPath = os.path.join(directory, 'bin', '')
+    # trace file of the .trace (record) and .replay cases
+    options.trace = os.path.join(work, 'bench.trace.gz')
+
+    sys.path.insert(0, collection_root(options.collection))
+    # hiraid Raidcom runs horcctl with the default path of Horcctl, not the path Raidcom was given
+    import hiraid.horcctl
+    defaults = hiraid.horcctl.Horcctl.__init__.__defaults__
+    hiraid.horcctl.Horcctl.__init__.__defaults__ = (cciPath,) + defaults[1:]
+    from ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom import hitachi_raidcom
+
+    base = {'horcm_inst': options.horcm_inst, 'storage_serial': options.storage_serial, 'cci_path': cciPath,
+            'cache_dir': os.path.join(work, 'cache'), 'cache_ttl': 0, 'metrics_log': None,
+            'broker_socket': os.path.join(work, 'no_broker.sock')}
+    selected = [case for case in cases(options) if not options.cases or re.search(options.cases, case[0])]
+    samples = {name: [] for name, params, method in selected}
+    for run in range(options.runs):
+        for name, params, method in selected:
+            samples[name].append(run_case(hitachi_raidcom, base, params, method))
+
+    results = {}
+    for name, runs in samples.items():
+        results[name] = {
+            'runs': len(runs),
+            'median_ms': round(median([run['elapsed_ms'] for run in runs]), 1),
+            'min_ms': round(min(run['elapsed_ms'] for run in runs), 1),
+            'max_ms': round(max(run['elapsed_ms'] for run in runs), 1),
+            'calls': runs[-1]['calls'],
+            'call_ms': round(median([run['call_ms'] for run in runs]), 1),
+            'commands': sorted(runs[-1]['commands']),
+            'errors': [run['error'] for run in runs if run['error']][:1],
+        }
+    report = {'simulator': simulator or {'dir': directory}, 'runs': options.runs, 'cases': results}
+    regressions = {}
+    if options.baseline:
+        with open(options.baseline) as baselinefile:
+            regressions = compare(results, json.load(baselinefile), options.max_regression)
+        report['regressions'] = regressions
+    if options.output:
+        with open(options.output, 'w') as outputfile:
+            json.dump(report, outputfile, indent=2)
+    print(json.dumps(report, indent=2))
+    return (0, 1)[bool(regressions)]
+
+
+if __name__ == '__main__':
+    sys.exit(main())
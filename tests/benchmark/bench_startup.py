@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Hitachi Vantara, Inc. All rights reserved.
+# Author: Giacomo Chiapparini <@gchiapparini-hv>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# Startup cost of a "hur state: query" task: module_utils import and hitachi_raidcom() init,
+# each run in a fresh python process as Ansible does for every task.
+#
+#   python tests/benchmark/bench_startup.py --horcm-inst 1 --storage-serial 641900 --runs 10
+#   python tests/benchmark/bench_startup.py --collection /path/to/other/checkout   # compare before/after
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+TASK = r'''
+import json, sys, time
+start = time.time()
+from ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom import hitachi_raidcom
+imported = time.time()
+
+class module(object):
+    # the parameters AnsibleModule would hand over for a hur state: query task
+    check_mode = False
+    def __init__(self, params):
+        self.params = params
+    def fail_json(self, **kwargs):
+        raise Exception(kwargs)
+
+params = json.loads(sys.argv[1])
+result = {'import_ms': round((imported - start) * 1000, 1)}
+try:
+    raidcom = hitachi_raidcom(module(params))
+    result['init_ms'] = round((time.time() - imported) * 1000, 1)
+    if params.get('query'):
+        raidcom.hur_status()
+        result['query_ms'] = round((time.time() - imported) * 1000, 1)
+except Exception as e:
+    result['error'] = str(e)[:200]
+result['hiraid_modules'] = sorted(m for m in sys.modules if m.startswith('hiraid'))[:5]
+result['hiraid_module_count'] = len([m for m in sys.modules if m.startswith('hiraid')])
+print(json.dumps(result))
+'''
+
+
+def collection_root(collection):
+    # ansible_collections/hitachi/raidcom must point at the checkout
+    root = tempfile.mkdtemp(prefix='hitachi_raidcom_bench_')
+    os.makedirs(os.path.join(root, 'ansible_collections', 'hitachi'))
+    os.symlink(os.path.abspath(collection), os.path.join(root, 'ansible_collections', 'hitachi', 'raidcom'))
+    return root
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2] if values else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='hitachi.raidcom startup benchmark')
+    parser.add_argument('--collection', default=os.path.join(os.path.dirname(__file__), '..', '..'))
+    parser.add_argument('--horcm-inst', type=int, default=1)
+    parser.add_argument('--storage-serial', type=int, default=None)
+    parser.add_argument('--copy-group', default='HUR')
+    parser.add_argument('--query', action='store_true', help='also run the pairdisplay of the task')
+    parser.add_argument('--runs', type=int, default=5)
+    options = parser.parse_args()
+
+    params = {'horcm_inst': options.horcm_inst, 'storage_serial': options.storage_serial, 'state': 'query',
+              'copy_group': options.copy_group, 'copy_groups': None, 'options': None, 'timeout': 60,
+              'query': options.query}
+    env = dict(os.environ, PYTHONPATH=collection_root(options.collection))
+    runs = []
+    for run in range(options.runs):
+        out = subprocess.run([sys.executable, '-c', TASK, json.dumps(params)], env=env,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    summary = {'runs': len(runs)}
+    for key in ('import_ms', 'init_ms', 'query_ms'):
+        summary['median_' + key] = median([run[key] for run in runs if key in run])
+    summary['last_run'] = runs[-1]
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,684 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Hitachi Vantara, Inc. All rights reserved.
+# Author: Giacomo Chiapparini <@gchiapparini-hv>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# Offline CCI simulator: stands in for raidcom, raidqry, horcctl, pairdisplay, paircreate, pairsplit,
+# pairresync, horctakeover and raidvchkdsp with output hiraid parses like the real one.
+# Two storages (local and remote) and HUR copy_groups between them, state kept in json files.
+# <dir>/horcm<inst>.conf describes the copy_groups of every instance, horcmstart.sh <inst> adds the
+# copy_groups found in it that the simulator does not know yet (in SMPL).
+#
+# set up a simulator directory, <dir>/bin holds one wrapper per CCI command:
+#   python tests/simulator/cci_simulator.py setup --dir /tmp/ccisim --ldevs 64000 --pairs 2000 \
+#       --copy-groups 20 --host-groups 100 --latency-ms 20 --latency pairdisplay=150
+#
+# point the modules at it with cci_path: /tmp/ccisim/bin/ (horcm_inst 1 is the local, 2 the remote storage)
+#   /tmp/ccisim/bin/pairdisplay -g HUR_000 -IH1 -fce -CLI
+#
+# hiraid runs horcctl from /usr/bin/ whatever path Raidcom gets, tests/benchmark/bench_hitachi_raidcom.py
+# points hiraid.horcctl at <dir>/bin/ for that reason.
+
+import argparse
+import fcntl
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+
+COMMANDS = ('raidcom', 'raidqry', 'horcctl', 'inqraid', 'pairdisplay', 'paircreate', 'pairsplit',
+            'pairresync', 'horctakeover', 'raidvchkdsp', 'horcmstart.sh', 'horcmshutdown.sh')
+
+# v_id (get resource), micro code (raidqry) and highest LDEV id per simulated model
+MODELS = {
+    'R9F': {'micro_ver': '90-08-81-00/00', 'max_ldev_id': 65279},
+    'M8M': {'micro_ver': '83-06-23-40/00', 'max_ldev_id': 4095},
+    'M850H': {'micro_ver': '88-08-10-60/00', 'max_ldev_id': 65279},
+    'RH10MHF': {'micro_ver': '93-07-23-80/00', 'max_ldev_id': 65279},
+}
+
+PORTS = ('CL1-A', 'CL2-A', 'CL3-A', 'CL4-A', 'CL1-B', 'CL2-B', 'CL3-B', 'CL4-B')
+
+PAIRDISPLAY_HEADER = 'Group PairVol L/R Port# TID LU-M Seq# LDEV# P/S Status Fence % P-LDEV# M CTG JID AP EM E-Seq# E-LDEV# R/W QM DM P PR'
+RAIDVCHKDSP_HEADER = 'Group PairVol Port# TID LU Seq# LDEV# GI-C-R-W-S PI-C-R-W-S R-Time'
+JOURNAL_HEADER = 'JID MU CTG JNLS AP U(%) Q-Marker Q-CNT D-SZ(BLK) Seq# Num LDEV#'
+# blocks one journal entry takes (8KB writes)
+JOURNAL_ENTRY_BLOCKS = 16
+
+BLOCKS_PER = {'K': 2, 'M': 2048, 'G': 2048 * 1024, 'T': 2048 * 1024 * 1024}
+
+
+class cci_error(Exception):
+    def __init__(self, message, returncode=1):
+        Exception.__init__(self, message)
+        self.returncode = returncode
+
+
+# #####
+# # state files
+# #####
+
+def state_path(directory, name):
+    return os.path.join(directory, '{}.json'.format(name))
+
+
+def state_load(directory, name):
+    with open(state_path(directory, name)) as statefile:
+        return json.load(statefile)
+
+
+def state_save(directory, name, data):
+    # rename, a command reading at the same time sees the old or the new file
+    fd, tmppath = tempfile.mkstemp(dir=directory, prefix='.tmp_')
+    with os.fdopen(fd, 'w') as statefile:
+        json.dump(data, statefile, separators=(',', ':'))
+    os.rename(tmppath, state_path(directory, name))
+
+
+class state_lock(object):
+    # mutating commands are serialized, like the resource lock of the real storage
+    def __init__(self, directory):
+        self.path = os.path.join(directory, '.lock')
+
+    def __enter__(self):
+        self.lockfile = open(self.path, 'a')
+        fcntl.flock(self.lockfile, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *args):
+        fcntl.flock(self.lockfile, fcntl.LOCK_UN)
+        self.lockfile.close()
+
+
+# #####
+# # setup
+# #####
+
+def host_group_name(index):
+    return 'hg_{:04d}'.format(index)
+
+
+def setup_storage(options, serial, ldevs, pairs_svol):
+    model = MODELS[options.model]
+    storage = {'serial': serial, 'model': options.model, 'micro_ver': model['micro_ver'],
+               'max_ldev_id': model['max_ldev_id'], 'request_id': 0, 'requests': {},
+               'resource_groups': [['meta_resource', 0]], 'ports': {}, 'ldevs': {}}
+    for rsgid in range(1, options.resource_groups + 1):
+        storage['resource_groups'].append(['rsg_{:02d}'.format(rsgid), rsgid])
+    # ports: GID 0 plus the host groups spread round robin, two hba wwns each
+    for port in PORTS:
+        storage['ports'][port] = {'0': {'name': '{}-G00'.format(port[2:].replace('-', '')), 'rgid': 0,
+                                        'hmd': 'LINUX/IRIX', 'hmo': [], 'wwns': []}}
+    for index in range(options.host_groups if serial == options.serial else 0):
+        port = PORTS[index % len(PORTS)]
+        gid = str(index // len(PORTS) + 1)
+        storage['ports'][port][gid] = {
+            'name': host_group_name(index), 'rgid': 0, 'hmd': 'VMWARE_EX', 'hmo': [54, 63],
+            'wwns': ['21000024ff{:06x}'.format(index * 2 + n) for n in (0, 1)]}
+    hostGroups = [(port, gid) for port in PORTS for gid in sorted(storage['ports'][port], key=int) if gid != '0']
+    # ldevs: [name, blocks, pool, rsgid, [[port, gid, lun], ...]]
+    sliceSize = max(ldevs // (options.resource_groups + 1), 1)
+    for ldev in range(ldevs):
+        rsgid = min(ldev // sliceSize, options.resource_groups)
+        storage['ldevs'][str(ldev)] = ['vol_{:05d}'.format(ldev), options.ldev_blocks * (1 + ldev % 4),
+                                       ldev % options.pools, rsgid, []]
+    # the first luns_per_host_group * host_groups ldevs are mapped
+    for index, (port, gid) in enumerate(hostGroups):
+        for lun in range(options.luns_per_host_group):
+            ldev = str(index * options.luns_per_host_group + lun)
+            if ldev in storage['ldevs']:
+                storage['ldevs'][ldev][4].append([port, gid, lun])
+    for ldev in pairs_svol:
+        storage['ldevs'].setdefault(str(ldev), ['svol_{:05d}'.format(ldev), options.ldev_blocks, 0, 0, []])
+    return storage
+
+
+def horcm_conf_lines(inst, serial, remote_inst, groups):
+    # horcm<inst>.conf of an instance, LDEVs as CU:LDEV
+    lines = ['HORCM_MON', '#ip_address service poll(10ms) timeout(10ms)', 'localhost {} 1000 3000'.format(11000 + int(inst)), '',
+             'HORCM_CMD', '\\\\.\\IPCMD-127.0.0.1-{}'.format(31000 + int(inst)), '',
+             'HORCM_LDEV', '#dev_group dev_name Serial# CU:LDEV(LDEV#) MU#']
+    for name, group in groups.items():
+        for pairvol, ldev in group['pairs']:
+            ldev = group_ldev(group, pairvol, ldev, serial)
+            lines.append('{} {} {} {:02X}:{:02X}'.format(name, pairvol, serial, ldev >> 8, ldev & 0xff))
+    lines.extend(['', 'HORCM_INST', '#dev_group ip_address service'])
+    for name in groups:
+        lines.append('{} localhost {}'.format(name, 11000 + int(remote_inst)))
+    return lines
+
+
+def setup(options):
+    directory = os.path.abspath(options.dir)
+    os.makedirs(os.path.join(directory, 'bin'), exist_ok=True)
+    # HUR pairs: P-VOLs from the end of the local ldevs, S-VOLs with the same ids on the remote storage
+    pairsPerGroup = max(options.pairs // max(options.copy_groups, 1), 1)
+    firstPvol = max(options.ldevs - options.pairs, 0)
+    groups = {}
+    for pair in range(options.pairs):
+        name = 'HUR_{:03d}'.format(pair // pairsPerGroup)
+        group = groups.setdefault(name, {'primary': options.serial, 'secondary': options.remote_serial,
+                                         'status': 'PAIR', 'changed': time.time(), 'jp': 0, 'js': 0,
+                                         'ctg': len(groups), 'pairs': [], 'errors': {}})
+        group['pairs'].append(['{}_{:04d}'.format(name, len(group['pairs'])), firstPvol + pair])
+    for name in list(groups)[:options.psue_groups]:
+        # one pair per group in PSUE, the others keep their group state
+        groups[name]['errors'][groups[name]['pairs'][0][0]] = 'PSUE'
+    latency = {'default': options.latency_ms}
+    for entry in options.latency:
+        command, milliseconds = entry.split('=')
+        latency[command] = float(milliseconds)
+    instances = {str(options.horcm_inst): options.serial, str(options.remote_horcm_inst): options.remote_serial}
+    # more HORCM instances of the local storage (horcm_inst_pool)
+    for inst in options.pool_horcm_insts:
+        instances[str(inst)] = options.serial
+    config = {'instances': instances,
+              'latency_ms': latency, 'latency_per_line_us': options.latency_per_line_us,
+              'copy_seconds': options.copy_seconds, 'journal_blocks': options.journal_blocks, 'journal_rate': options.journal_rate}
+    state_save(directory, 'config', config)
+    state_save(directory, 'pairs', {'groups': groups})
+    for inst, serial in instances.items():
+        remoteInst = (options.horcm_inst, options.remote_horcm_inst)[serial == options.serial]
+        with open(os.path.join(directory, 'horcm{}.conf'.format(inst)), 'w') as conffile:
+            conffile.write('\n'.join(horcm_conf_lines(inst, serial, remoteInst, groups)) + '\n')
+    state_save(directory, 'storage_{}'.format(options.serial), setup_storage(options, options.serial, options.ldevs, []))
+    state_save(directory, 'storage_{}'.format(options.remote_serial),
+               setup_storage(options, options.remote_serial, 0, [ldev for group in groups.values() for pairvol, ldev in group['pairs']]))
+    # wrappers: the command name is the first argument of the simulator
+    for command in COMMANDS:
+        wrapper = os.path.join(directory, 'bin', command)
+        with open(wrapper, 'w') as wrapperfile:
+            wrapperfile.write('#!/bin/sh\nexec "{}" "{}" --dir "{}" {} "$@"\n'.format(
+                sys.executable, os.path.abspath(__file__), directory, command))
+        os.chmod(wrapper, 0o755)
+    print(json.dumps({'dir': directory, 'cci_path': os.path.join(directory, 'bin', ''), 'instances': config['instances'],
+                      'ldevs': options.ldevs, 'pairs': options.pairs, 'copy_groups': len(groups),
+                      'host_groups': options.host_groups}, indent=2))
+
+
+# #####
+# # argument helpers
+# #####
+
+def option_value(args, name, default=None):
+    # raidcom style "-name value"
+    if name in args:
+        position = args.index(name)
+        if position + 1 < len(args):
+            return args[position + 1]
+    return default
+
+
+def group_ldev(group, pairvol, ldev, serial):
+    # LDEV of a pair on the storage serial, copy_groups added by horcmstart.sh can have other LDEV ids on the two sides
+    return group.get('ldevs', {}).get(str(serial), {}).get(pairvol, ldev)
+
+
+def instance_of(args):
+    # -I1, -IH1, -ITC1, -ISI1
+    for arg in args:
+        match = re.match(r'^-I(H|TC|SI)?(\d+)$', arg)
+        if match:
+            return match.group(2)
+    return os.environ.get('HORCMINST')
+
+
+def capacity_blocks(capacity):
+    # raidcom -capacity: blocks or <n>K/M/G/T
+    match = re.match(r'^(\d+(?:\.\d+)?)([kKmMgGtT])?$', str(capacity))
+    if not match:
+        raise cci_error('raidcom: [EX_REQARG] Invalid capacity {}'.format(capacity), 202)
+    if match.group(2):
+        return int(float(match.group(1)) * BLOCKS_PER[match.group(2).upper()])
+    return int(match.group(1))
+
+
+# #####
+# # raidcom
+# #####
+
+class raidcom_simulator(object):
+    def __init__(self, directory, config, args):
+        self.directory = directory
+        self.config = config
+        self.args = args
+        self.serial = option_value(args, '-s') or str(config['instances'].get(instance_of(args), ''))
+        if not os.path.exists(state_path(directory, 'storage_{}'.format(self.serial))):
+            raise cci_error('raidcom: [EX_ENOUNT] No such unit ({})'.format(self.serial), 214)
+
+    def load(self):
+        return state_load(self.directory, 'storage_{}'.format(self.serial))
+
+    def save(self, storage):
+        state_save(self.directory, 'storage_{}'.format(self.serial), storage)
+
+    def run(self):
+        words = [arg for arg in self.args[:2]]
+        handler = getattr(self, '_'.join(words).replace('-', '_'), None)
+        if handler is None:
+            raise cci_error('raidcom: [EX_CMDIOE] Not simulated: raidcom {}'.format(' '.join(words)), 217)
+        if words[0] in ('get', 'reset'):
+            return handler(self.load())
+        with state_lock(self.directory):
+            storage = self.load()
+            out = handler(storage)
+            if option_value(self.args, '-request_id') == 'auto' and not out:
+                # asynchronous command, its outcome is read with get command_status -request_id
+                storage['request_id'] += 1
+                storage['requests'][str(storage['request_id'])] = {'id': option_value(self.args, '-ldev_id', '-')}
+                out = ['REQID : {}'.format(storage['request_id'])]
+            self.save(storage)
+        return out
+
+    def get_port(self, storage):
+        lines = ['PORT TYPE ATTR SPD LPID FAB CONN SSW SL Serial# WWN PHY_PORT']
+        for number, port in enumerate(sorted(storage['ports'])):
+            lines.append('{} FIBRE TAR AUT {:02X} N FCAL N 0 {} 50060e80{:08x} -'.format(port, 0xEF - number, storage['serial'], number))
+        return lines
+
+    def get_resource(self, storage):
+        lines = ['RS_GROUP RGID V_Serial# V_ID V_IF Serial#']
+        for name, rgid in storage['resource_groups']:
+            lines.append('{} {} {} {} Y {}'.format(name, rgid, storage['serial'], storage['model'], storage['serial']))
+        return lines
+
+    def get_command_status(self, storage):
+        requestId = option_value(self.args, '-request_id')
+        if requestId is None:
+            return ['HANDLE SSB1 SSB2 ERR_CNT Serial# Description', '00c3 - - 0 {} -'.format(storage['serial'])]
+        request = storage['requests'].get(str(int(requestId)))
+        if request is None:
+            raise cci_error('raidcom: [EX_EGPERM] No such request_id {}'.format(requestId), 206)
+        return ['REQID R SSB1 SSB2 Serial# ID Description',
+                '{:08d} - - - {} {} -'.format(int(requestId), storage['serial'], request['id'])]
+
+    def reset_command_status(self, storage):
+        return []
+
+    def lock_resource(self, storage):
+        return []
+
+    def unlock_resource(self, storage):
+        return []
+
+    def ldev_lines(self, storage, ldev):
+        data = storage['ldevs'].get(str(ldev))
+        if data is None:
+            return ['Serial# : {}'.format(storage['serial']), 'LDEV : {}'.format(ldev), 'SL : -', 'CL : -',
+                    'VOL_TYPE : NOT DEFINED', 'SSID : -', 'RSGID : 0']
+        name, blocks, pool, rsgid, luns = data
+        ports = ' : '.join('{}-{} {} {}'.format(port, gid, lun, storage['ports'][port][gid]['name'][:16])
+                           for port, gid, lun in luns)
+        return ['Serial# : {}'.format(storage['serial']), 'LDEV : {}'.format(ldev), 'SL : 0', 'CL : 0',
+                'VOL_TYPE : OPEN-V-CVS', 'VOL_Capacity(BLK) : {}'.format(blocks), 'NUM_PORT : {}'.format(len(luns)),
+                'PORTs : {}'.format(ports), 'F_POOLID : NONE', 'VOL_ATTR : CVS : HDP', 'B_POOLID : {}'.format(pool),
+                'LDEV_NAMING : {}'.format(name), 'STS : NML', 'OPE_TYPE : NONE', 'OPE_RATE : 100', 'MP# : {}'.format(int(ldev) % 8),
+                'SSID : {:04X}'.format(int(ldev) // 256 + 4), 'Used_Block(BLK) : {}'.format(blocks // 10),
+                'RSGID : {}'.format(rsgid)]
+
+    def get_ldev(self, storage):
+        ldevId = option_value(self.args, '-ldev_id')
+        if ldevId is not None:
+            return self.ldev_lines(storage, int(ldevId))
+        ldevList = option_value(self.args, '-ldev_list', 'defined')
+        if ldevList == 'undefined':
+            ldevs = [ldev for ldev in range(storage['max_ldev_id'] + 1) if str(ldev) not in storage['ldevs']]
+        else:
+            ldevs = sorted(int(ldev) for ldev in storage['ldevs'])
+            if ldevList == 'mapped':
+                ldevs = [ldev for ldev in ldevs if storage['ldevs'][str(ldev)][4]]
+            elif ldevList == 'unmapped':
+                ldevs = [ldev for ldev in ldevs if not storage['ldevs'][str(ldev)][4]]
+        lines = []
+        for ldev in ldevs:
+            lines.extend(self.ldev_lines(storage, ldev))
+            lines.append('')
+        return lines
+
+    def get_host_grp(self, storage):
+        port = option_value(self.args, '-port')
+        if port not in storage['ports']:
+            raise cci_error('raidcom: [EX_ENOOBJ] No such Object in the RAID (port {})'.format(port), 205)
+        lines = ['PORT GID RGID GROUP_NAME Serial# HMD HMO_BITs']
+        for gid in sorted(storage['ports'][port], key=int):
+            hostGroup = storage['ports'][port][gid]
+            lines.append('{} {} {} "{}" {} {} {}'.format(port, gid, hostGroup['rgid'], hostGroup['name'], storage['serial'],
+                                                         hostGroup['hmd'], ':'.join(str(hmo) for hmo in hostGroup['hmo']) or '-'))
+        return lines
+
+    def get_hba_wwn(self, storage):
+        port, gid = option_value(self.args, '-port').rsplit('-', 1)
+        hostGroup = storage['ports'].get(port, {}).get(gid)
+        if hostGroup is None:
+            raise cci_error('raidcom: [EX_ENOOBJ] No such Object in the RAID (port {}-{})'.format(port, gid), 205)
+        lines = ['PORT GID GROUP_NAME HWWN Serial# NICK_NAME']
+        for wwn in hostGroup['wwns']:
+            lines.append('{} {} {} {}    {} -'.format(port, gid, hostGroup['name'], wwn, storage['serial']))
+        return lines
+
+    def add_ldev(self, storage):
+        ldevId = option_value(self.args, '-ldev_id')
+        if ldevId == 'auto':
+            start, end = [int(value) for value in option_value(self.args, '-ldev_range').split('-')]
+        else:
+            start = end = int(ldevId)
+        free = [ldev for ldev in range(start, min(end, storage['max_ldev_id']) + 1) if str(ldev) not in storage['ldevs']]
+        if not free:
+            raise cci_error('raidcom: [EX_CMDRJE] An order to the control/command device was rejected (no free LDEV in {}-{})'.format(start, end), 221)
+        ldev = free[0]
+        storage['ldevs'][str(ldev)] = ['', capacity_blocks(option_value(self.args, '-capacity')),
+                                       int(option_value(self.args, '-pool', 0)), 0, []]
+        if option_value(self.args, '-request_id') == 'auto':
+            storage['request_id'] += 1
+            storage['requests'][str(storage['request_id'])] = {'id': ldev}
+            return ['REQID : {}'.format(storage['request_id'])]
+        return []
+
+    def extend_ldev(self, storage):
+        data = self.defined(storage)
+        data[1] += capacity_blocks(option_value(self.args, '-capacity'))
+        return []
+
+    def delete_ldev(self, storage):
+        ldevId = option_value(self.args, '-ldev_id')
+        if self.defined(storage)[4]:
+            raise cci_error('raidcom: [EX_CMDRJE] An order to the control/command device was rejected (LDEV {} has LU paths)'.format(ldevId), 221)
+        del storage['ldevs'][str(int(ldevId))]
+        return []
+
+    def modify_ldev(self, storage):
+        name = option_value(self.args, '-ldev_name')
+        if name is not None:
+            self.defined(storage)[0] = name
+        return []
+
+    def defined(self, storage):
+        ldevId = option_value(self.args, '-ldev_id')
+        data = storage['ldevs'].get(str(int(ldevId)))
+        if data is None:
+            raise cci_error('raidcom: [EX_ENOOBJ] No such Object in the RAID (LDEV {})'.format(ldevId), 205)
+        return data
+
+
+def raidqry(directory, config, args):
+    lines = ['No Group Hostname HORCM_ver Uid Serial# Micro_ver Cache(MB)']
+    serial = config['instances'].get(instance_of(args))
+    if serial is None:
+        raise cci_error('raidqry: [EX_ATTHOR] Can not attach to HORCM', 251)
+    storage = state_load(directory, 'storage_{}'.format(serial))
+    lines.append('1 --- simulator 01-77-03/02 0 {} {} 1048576'.format(serial, storage['micro_ver']))
+    return lines
+
+
+def horcctl(directory, config, args):
+    instance = instance_of(args)
+    return ['Current control device = \\\\.\\IPCMD-127.0.0.1-{}'.format(31000 + int(instance or 0))]
+
+
+def horcm_conf_groups(directory, inst):
+    # {copy_group: [[pairvol, ldev], ...]} of the HORCM_LDEV section of <dir>/horcm<inst>.conf
+    groups = {}
+    section = None
+    with open(os.path.join(directory, 'horcm{}.conf'.format(inst))) as conffile:
+        for line in conffile:
+            values = line.split('#')[0].split()
+            if len(values) == 1 and values[0].startswith('HORCM_'):
+                section = values[0]
+            elif section == 'HORCM_LDEV' and len(values) >= 4:
+                ldev = int(values[3].replace(':', ''), 16) if ':' in values[3] else int(values[3])
+                groups.setdefault(values[0], []).append([values[1], ldev])
+    return groups
+
+
+def horcmstart(directory, config, args):
+    # the copy_groups of horcm<inst>.conf the simulator does not know yet are added in SMPL
+    with state_lock(directory):
+        pairs = state_load(directory, 'pairs')
+        for inst in args:
+            serial = config['instances'].get(inst)
+            if serial is None:
+                raise cci_error('horcmstart.sh: no HORCM instance {}'.format(inst), 1)
+            other = [value for value in config['instances'].values() if value != serial][0]
+            for name, groupPairs in horcm_conf_groups(directory, inst).items():
+                group = pairs['groups'].setdefault(name, {'primary': serial, 'secondary': other, 'status': 'SMPL',
+                                                          'changed': time.time(), 'jp': 0, 'js': 0, 'ctg': len(pairs['groups']),
+                                                          'pairs': groupPairs, 'errors': {}})
+                group.setdefault('ldevs', {})[str(serial)] = dict((pairvol, ldev) for pairvol, ldev in groupPairs)
+        state_save(directory, 'pairs', pairs)
+    return ['starting HORCM inst {}'.format(' '.join(args)), 'HORCM inst {} starts successfully.'.format(' '.join(args))]
+
+
+def horcmshutdown(directory, config, args):
+    return ['inst {}:'.format(' '.join(args)), 'horcmshutdown inst {} !!!'.format(' '.join(args))]
+
+
+def inqraid(directory, config, args):
+    # no command device on a simulated host
+    return ['DEVICE_FILE PORT SERIAL LDEV CTG H/M/12 SSID R:Group PRODUCT_ID']
+
+
+# #####
+# # HUR pairs
+# #####
+
+class pair_simulator(object):
+    def __init__(self, directory, config, command, args):
+        self.directory = directory
+        self.config = config
+        self.command = command
+        self.args = args
+        self.instance = instance_of(args)
+        self.serial = config['instances'].get(self.instance)
+        if self.serial is None:
+            raise cci_error('{}: [EX_ATTHOR] Can not attach to HORCM'.format(command), 251)
+
+    def group(self, pairs):
+        name = option_value(self.args, '-g')
+        if name not in pairs['groups']:
+            raise cci_error('{}: [EX_ENOGRP] No such group ({})'.format(self.command, name), 239)
+        return name, pairs['groups'][name]
+
+    def group_status(self, group):
+        # COPY becomes PAIR copy_seconds after the copy started, % follows the elapsed time
+        if group['status'] != 'COPY':
+            return group['status'], 100
+        copySeconds = self.config['copy_seconds']
+        percent = 100 if copySeconds <= 0 else int((time.time() - group['changed']) * 100 / copySeconds)
+        if percent >= 100:
+            return 'PAIR', 100
+        return 'COPY', percent
+
+    def pair_side(self, group, status, pairvol, serial):
+        # Status and P/S as seen from the storage serial
+        primary = serial == group['primary']
+        status = group['errors'].get(pairvol, status)
+        if status == 'SMPL':
+            return 'SMPL', 'SMPL'
+        if status == 'PSUS' and not primary:
+            return 'SSUS', 'S-VOL'
+        if status == 'SSWS' and primary:
+            return 'PSUS', 'P-VOL'
+        return status, ('S-VOL', 'P-VOL')[primary]
+
+    def run(self):
+        handler = getattr(self, self.command)
+        if self.command in ('pairdisplay', 'raidvchkdsp'):
+            return handler(state_load(self.directory, 'pairs'))
+        with state_lock(self.directory):
+            pairs = state_load(self.directory, 'pairs')
+            out = handler(pairs)
+            state_save(self.directory, 'pairs', pairs)
+        return out
+
+    def pairdisplay(self, pairs):
+        name, group = self.group(pairs)
+        status, percent = self.group_status(group)
+        if option_value(self.args, '-v') in ('jnl', 'jnlt'):
+            return self.journal(group, status)
+        remote = (group['primary'], group['secondary'])[self.serial == group['primary']]
+        lines = [PAIRDISPLAY_HEADER]
+        for number, (pairvol, ldev) in enumerate(group['pairs']):
+            sides = (('L', self.serial), ('R', remote))[:(2, 1)['-l' in self.args]]
+            for side, serial in sides:
+                sideStatus, role = self.pair_side(group, status, pairvol, serial)
+                paired = role != 'SMPL'
+                port = PORTS[number % len(PORTS)]
+                lines.append(' '.join(str(column) for column in (
+                    name, pairvol, side, '{}-0'.format(port), 0, '{}-h1'.format(number % 2048), serial, group_ldev(group, pairvol, ldev, serial),
+                    role, sideStatus, ('-', 'ASYNC')[paired], ('-', percent)[paired], (group_ldev(group, pairvol, ldev, (remote, self.serial)[serial == remote]), '-')[not paired], ('-', 'W')[paired],
+                    (group['ctg'], '-')[not paired], (group['jp'] if serial == group['primary'] else group['js'], '-')[not paired],
+                    ('-', 1)[paired], '-', '-', '-', ('-', 'L/M')[paired], '-', '-', '-', '-')))
+        return lines
+
+    def journal(self, group, status):
+        # pairdisplay -v jnl: the journal of this side. Entries are written at journal_rate since the last change;
+        # in PAIR/COPY 1-3 seconds of them wait for the transfer, with a pair in PSUE the primary journal fills up
+        rate = self.config.get('journal_rate', 500)
+        capacity = self.config.get('journal_blocks', 2097152)
+        primary = self.serial == group['primary']
+        age = time.time() - group['changed']
+        if status == 'SMPL':
+            return [JOURNAL_HEADER]
+        if status in ('PAIR', 'COPY') and not group['errors']:
+            pending = int(rate * (1 + (age % 60) / 30.0))
+        elif group['errors'] or status == 'PFUL':
+            pending = int(rate * age)
+        else:
+            # split, nothing is journaled
+            pending = 0
+        pending = min(pending, capacity // JOURNAL_ENTRY_BLOCKS)
+        usage = pending * JOURNAL_ENTRY_BLOCKS * 100 // capacity
+        marker = int(rate * age) - (0, pending)[not primary]
+        state = ('S', 'P')[primary] + 'J' + ('SN' if pending == 0 and status not in ('PAIR', 'COPY') else ('NN', 'NF')[usage >= 100])
+        jid = (group['js'], group['jp'])[primary]
+        return [JOURNAL_HEADER, '{:03d} 0 {} {} 1 {} {:08x} {} {} {} 1 {}'.format(
+            jid, group['ctg'], state, usage, max(marker, 0), pending, capacity, self.serial, 60000 + jid)]
+
+    def raidvchkdsp(self, pairs):
+        name, group = self.group(pairs)
+        lines = [RAIDVCHKDSP_HEADER]
+        for number, (pairvol, ldev) in enumerate(group['pairs']):
+            lines.append('{} {} {}-0 0 {} {} {} E E E E E E E E E E 0'.format(
+                name, pairvol, PORTS[number % len(PORTS)], number % 2048, self.serial, group_ldev(group, pairvol, ldev, self.serial)))
+        return lines
+
+    def paircreate(self, pairs):
+        name, group = self.group(pairs)
+        if group['status'] != 'SMPL':
+            raise cci_error('paircreate: [EX_CMDRJE] An order to the control/command device was rejected ({} is {})'.format(name, group['status']), 221)
+        other = [serial for serial in self.config['instances'].values() if serial != self.serial][0]
+        # -vl: the local storage becomes the primary
+        group.update(primary=self.serial, secondary=other, status='COPY', changed=time.time(), errors={},
+                     jp=int(option_value(self.args, '-jp', 0)), js=int(option_value(self.args, '-js', 0)))
+        return []
+
+    def pairsplit(self, pairs):
+        name, group = self.group(pairs)
+        status, percent = self.group_status(group)
+        if '-S' in self.args:
+            group.update(status='SMPL', errors={})
+        elif '-RB' in self.args:
+            if status == 'SSWS':
+                group['status'] = 'PSUS'
+        elif status in ('PAIR', 'COPY'):
+            group['status'] = 'PSUS'
+        group['changed'] = time.time()
+        return []
+
+    def pairresync(self, pairs):
+        name, group = self.group(pairs)
+        status, percent = self.group_status(group)
+        if status == 'SMPL':
+            raise cci_error('pairresync: [EX_CMDRJE] An order to the control/command device was rejected ({} is SMPL)'.format(name), 221)
+        if '-swaps' in self.args or '-swapp' in self.args:
+            group['primary'], group['secondary'] = group['secondary'], group['primary']
+        group.update(status='COPY', changed=time.time(), errors={})
+        return []
+
+    def horctakeover(self, pairs):
+        name, group = self.group(pairs)
+        status, percent = self.group_status(group)
+        if self.serial == group['primary'] or status == 'SSWS':
+            # Nop-Takeover
+            raise cci_error('horctakeover: Nop-Takeover on {}'.format(name), 1)
+        if status == 'PAIR':
+            # Swap-Takeover: the S-VOL side becomes the primary, the pairs stay in PAIR
+            group['primary'], group['secondary'] = group['secondary'], group['primary']
+        else:
+            # SVOL-Takeover: the link is down, the S-VOL side gets writable
+            group['status'] = 'SSWS'
+        group['changed'] = time.time()
+        return []
+
+
+# #####
+# # main
+# #####
+
+def simulate(directory, command, args):
+    config = state_load(directory, 'config')
+    start = time.time()
+    try:
+        if command == 'raidcom':
+            lines = raidcom_simulator(directory, config, args).run()
+        elif command in ('raidqry', 'horcctl', 'inqraid', 'horcmstart.sh', 'horcmshutdown.sh'):
+            lines = globals()[command.split('.')[0]](directory, config, args)
+        else:
+            lines = pair_simulator(directory, config, command, args).run()
+        returncode = 0
+        out, err = '\n'.join(lines) + ('\n' if lines else ''), ''
+    except cci_error as e:
+        returncode = e.returncode
+        out, err = '', str(e) + '\n'
+        lines = []
+    # latency: per command plus per output line, the time spent simulating counts against it
+    latency = config['latency_ms'].get(command, config['latency_ms'].get('default', 0)) / 1000.0
+    latency += len(lines) * config.get('latency_per_line_us', 0) / 1000000.0
+    time.sleep(max(latency - (time.time() - start), 0))
+    sys.stdout.write(out)
+    sys.stderr.write(err)
+    return returncode
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == 'setup':
+        parser = argparse.ArgumentParser(description='set up an offline CCI simulator directory')
+        parser.add_argument('setup')
+        parser.add_argument('--dir', required=True, help='simulator directory, commands are in <dir>/bin')
+        parser.add_argument('--serial', type=int, default=641900, help='local storage serial')
+        parser.add_argument('--remote-serial', type=int, default=641901, help='remote (HUR secondary) storage serial')
+        parser.add_argument('--horcm-inst', type=int, default=1, help='horcm_inst of the local storage')
+        parser.add_argument('--remote-horcm-inst', type=int, default=2, help='horcm_inst of the remote storage')
+        parser.add_argument('--pool-horcm-insts', type=int, nargs='*', default=[], help='more horcm_insts of the local storage')
+        parser.add_argument('--model', choices=sorted(MODELS), default='R9F')
+        parser.add_argument('--ldevs', type=int, default=64000, help='defined LDEVs on the local storage')
+        parser.add_argument('--ldev-blocks', type=int, default=2097152, help='capacity of the smallest LDEV in blocks')
+        parser.add_argument('--pools', type=int, default=4)
+        parser.add_argument('--resource-groups', type=int, default=3, help='resource groups besides meta_resource')
+        parser.add_argument('--host-groups', type=int, default=100)
+        parser.add_argument('--luns-per-host-group', type=int, default=8)
+        parser.add_argument('--pairs', type=int, default=2000, help='HUR pairs, P-VOLs are the last local LDEVs')
+        parser.add_argument('--copy-groups', type=int, default=20)
+        parser.add_argument('--psue-groups', type=int, default=0, help='copy_groups with one pair in PSUE')
+        parser.add_argument('--copy-seconds', type=float, default=10, help='seconds from COPY to PAIR')
+        parser.add_argument('--journal-blocks', type=int, default=2097152, help='journal (D-SZ) capacity in blocks')
+        parser.add_argument('--journal-rate', type=float, default=500, help='journal entries written per second')
+        parser.add_argument('--latency-ms', type=float, default=0, help='latency of every command')
+        parser.add_argument('--latency', action='append', default=[], metavar='COMMAND=MS', help='latency of one command')
+        parser.add_argument('--latency-per-line-us', type=float, default=0, help='additional latency per output line')
+        options = parser.parse_args()
+        options.ldevs = min(options.ldevs, MODELS[options.model]['max_ldev_id'] + 1)
+        setup(options)
+        return 0
+    if len(sys.argv) < 4 or sys.argv[1] != '--dir' or sys.argv[3] not in COMMANDS:
+        sys.stderr.write('usage: cci_simulator.py setup --dir DIR [options] | cci_simulator.py --dir DIR COMMAND [args]\n')
+        return 2
+    return simulate(sys.argv[2], sys.argv[3], sys.argv[4:])
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Hitachi Vantara, Inc. All rights reserved.
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# The session broker against a stub backend (the factory hiraid_factory stands for), no CCI needed:
+#   ansible-test units --python 3.11 tests/unit/plugins/module_utils/test_hitachi_raidcom_broker.py
+# or with the collection on the python path:
+#   python -m pytest tests/unit/plugins/module_utils/test_hitachi_raidcom_broker.py
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom_broker import (
+    hitachi_raidcom_broker, hitachi_raidcom_broker_client, hitachi_raidcom_broker_error, broker_available)
+
+
+class stub_cmdview(object):
+    # the attributes of a hiraid Cmdview the module reads
+    def __init__(self, cmd, stdout):
+        self.cmd = cmd
+        self.returncode = 0
+        self.stdout = stdout
+        self.stderr = ''
+
+
+class stub_raidcom(object):
+    def __init__(self, serial, horcm_inst):
+        self.serial = serial
+        self.instance = horcm_inst
+        self.maxldevid = 65279
+        self.calls = 0
+
+    def getldev(self, ldev_id):
+        self.calls += 1
+        return stub_cmdview('raidcom get ldev -ldev_id {} -I{}'.format(ldev_id, self.instance), 'LDEV : {}\n'.format(ldev_id))
+
+    def getport(self):
+        raise KeyError('PORT')
+
+    def deleteldev(self, ldev_id):
+        # hiraid raises Exception with a dict of the failed command
+        raise Exception({'return': 1, 'stdout': '', 'stderr': 'ldev {} is in use'.format(ldev_id), 'cmd': 'raidcom delete ldev'})
+
+
+class stub_cci(object):
+    def pairdisplayx(self, inst, group, opts=''):
+        return {'cmdreturn': 0, 'pairdisplaydata': {'pairs': {group: {}}}, 'inst': inst}
+
+
+def stub_factory(serial, horcm_inst, target):
+    if target == 'raidcom':
+        return stub_raidcom(serial, horcm_inst)
+    return stub_cci()
+
+
+class test_hitachi_raidcom_broker(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='hitachi_raidcom_broker_')
+        self.socket = os.path.join(self.directory, 'broker.sock')
+        self.broker = hitachi_raidcom_broker(self.socket, stub_factory)
+        self.thread = threading.Thread(target=self.broker.serve)
+        self.thread.daemon = True
+        self.thread.start()
+        deadline = time.time() + 10
+        while not broker_available(self.socket):
+            if time.time() > deadline:
+                self.fail('broker did not start')
+            time.sleep(0.05)
+        self.raidcom = hitachi_raidcom_broker_client(self.socket, 641900, 1, 'raidcom')
+        self.cci = hitachi_raidcom_broker_client(self.socket, 641900, 1, 'cci')
+
+    def tearDown(self):
+        self.broker.shutdown()
+        self.thread.join(10)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_method_call_returns_the_cmdview_attributes(self):
+        cmdview = self.raidcom.getldev(ldev_id=5)
+        self.assertEqual(cmdview.stdout, 'LDEV : 5\n')
+        self.assertEqual(cmdview.returncode, 0)
+        self.assertEqual(cmdview.cmd, 'raidcom get ldev -ldev_id 5 -I1')
+
+    def test_cci_dict_result(self):
+        result = self.cci.pairdisplayx(inst=1, group='HUR_000')
+        self.assertEqual(result['pairdisplaydata']['pairs'], {'HUR_000': {}})
+
+    def test_data_attribute_is_a_value(self):
+        self.assertEqual(self.raidcom.maxldevid, 65279)
+        self.assertEqual(self.raidcom.broker_getattr('maxldevid'), 65279)
+        self.assertFalse(callable(self.raidcom.maxldevid))
+
+    def test_session_is_kept_warm(self):
+        self.raidcom.getldev(ldev_id=1)
+        self.raidcom.getldev(ldev_id=2)
+        self.assertEqual(self.raidcom.calls, 2)
+
+    def test_sessions_per_horcm_inst(self):
+        other = hitachi_raidcom_broker_client(self.socket, 641900, 2, 'raidcom')
+        self.assertEqual(other.instance, 2)
+        self.assertEqual(self.raidcom.instance, 1)
+
+    def test_builtin_error_type_is_raised_again(self):
+        with self.assertRaises(KeyError) as raised:
+            self.raidcom.getport()
+        self.assertEqual(raised.exception.args, ('PORT',))
+
+    def test_hiraid_error_keeps_its_args(self):
+        with self.assertRaises(Exception) as raised:
+            self.raidcom.deleteldev(ldev_id=7)
+        self.assertNotIsInstance(raised.exception, hitachi_raidcom_broker_error)
+        self.assertEqual(raised.exception.args[0]['stderr'], 'ldev 7 is in use')
+
+    def test_unknown_attribute(self):
+        self.assertFalse(hasattr(self.raidcom, 'nosuchattribute'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Hitachi Vantara, Inc. All rights reserved.
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# The cache files and the query cache in front of a stub Raidcom/Cci, no CCI needed:
+#   python -m pytest tests/unit/plugins/module_utils/test_hitachi_raidcom_cache.py
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom_cache import (
+    cache_path, cache_load, cache_save, cache_invalidate, cache_lock, hitachi_raidcom_query_cache, hitachi_raidcom_cached)
+
+
+class stub_cmdview(object):
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+class stub_raidcom(object):
+    # counts its calls, getldev answers with the number of the call
+    def __init__(self):
+        self.calls = []
+
+    def getldev(self, ldev_id):
+        self.calls.append('getldev')
+        return stub_cmdview(ldev_id=ldev_id, call=len(self.calls))
+
+    def getcommandstatus(self):
+        self.calls.append('getcommandstatus')
+        return stub_cmdview(stdout='HANDLE SSB1 SSB2 ERR_CNT Serial# Description', call=len(self.calls))
+
+    def deleteldev(self, ldev_id):
+        self.calls.append('deleteldev')
+        return stub_cmdview(returncode=0)
+
+
+class test_hitachi_raidcom_cache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def cached(self, serial=641900, ttl=60, name='raidcom', target=None):
+        target = target or stub_raidcom()
+        cache = hitachi_raidcom_query_cache(self.cache_dir, serial, 1, ttl)
+        return target, hitachi_raidcom_cached(lambda: target, name, cache)
+
+    def test_save_and_load(self):
+        path = cache_path(self.cache_dir, 641900, 'ldevs')
+        self.assertTrue(cache_save(path, {'0': 'NOT DEFINED'}))
+        self.assertEqual(cache_load(path, 60), {'0': 'NOT DEFINED'})
+        self.assertIsNone(cache_load(path, 0))
+        cache_invalidate(path)
+        self.assertIsNone(cache_load(path, 60))
+
+    def test_load_ignores_expired_and_foreign_files(self):
+        path = cache_path(self.cache_dir, 641900, 'ldevs')
+        with open(path, 'w') as cachefile:
+            json.dump({'created': time.time() - 120, 'data': 1}, cachefile)
+        self.assertIsNone(cache_load(path, 60))
+        with open(path, 'w') as cachefile:
+            cachefile.write('[1, 2]')
+        self.assertIsNone(cache_load(path, 60))
+
+    def test_no_path_is_no_cache(self):
+        self.assertFalse(cache_save(None, 1))
+        self.assertIsNone(cache_load(None, 60))
+        cache_invalidate(None)
+        with cache_lock(None) as lock:
+            self.assertIsNone(lock.lockfile)
+
+    def test_lock_file_next_to_the_cache_file(self):
+        path = cache_path(self.cache_dir, 641900, 'ldev_allocator')
+        with cache_lock(path):
+            self.assertTrue(os.path.exists(path + '.lock'))
+
+    def test_reads_are_answered_from_the_cache(self):
+        raidcom, cached = self.cached()
+        first = cached.getldev(ldev_id=1)
+        second = cached.getldev(ldev_id=1)
+        self.assertEqual(raidcom.calls, ['getldev'])
+        self.assertEqual(second.call, first.call)
+        cached.getldev(ldev_id=2)
+        self.assertEqual(raidcom.calls, ['getldev', 'getldev'])
+
+    def test_reads_are_shared_between_tasks(self):
+        raidcom, cached = self.cached()
+        cached.getldev(ldev_id=1)
+        other, cachedOther = self.cached()
+        self.assertEqual(cachedOther.getldev(ldev_id=1).call, 1)
+        self.assertEqual(other.calls, [])
+
+    def test_a_change_invalidates_the_storage(self):
+        raidcom, cached = self.cached()
+        cached.getldev(ldev_id=1)
+        cached.deleteldev(ldev_id=1)
+        cached.getldev(ldev_id=1)
+        self.assertEqual(raidcom.calls, ['getldev', 'deleteldev', 'getldev'])
+
+    def test_a_raidcom_change_keeps_other_storages(self):
+        other, cachedOther = self.cached(serial=641901)
+        cachedOther.getldev(ldev_id=1)
+        raidcom, cached = self.cached()
+        cached.deleteldev(ldev_id=1)
+        cachedOther.getldev(ldev_id=1)
+        self.assertEqual(other.calls, ['getldev'])
+
+    def test_a_pair_change_invalidates_both_sides(self):
+        class stub_cci(object):
+            def __init__(self):
+                self.calls = []
+
+            def pairdisplayx(self, group):
+                self.calls.append('pairdisplayx')
+                return {'pairdisplaydata': {}, 'call': len(self.calls)}
+
+            def pairsplit(self, group):
+                self.calls.append('pairsplit')
+                return {'cmdreturn': 0}
+
+        remote, cachedRemote = self.cached(serial=641901, name='cci', target=stub_cci())
+        cachedRemote.pairdisplayx(group='hur')
+        local, cachedLocal = self.cached(name='cci', target=stub_cci())
+        cachedLocal.pairsplit(group='hur')
+        cachedRemote.pairdisplayx(group='hur')
+        self.assertEqual(remote.calls, ['pairdisplayx', 'pairdisplayx'])
+
+    def test_volatile_getters_always_run(self):
+        raidcom, cached = self.cached()
+        cached.getldev(ldev_id=1)
+        first = cached.getcommandstatus()
+        second = cached.getcommandstatus()
+        self.assertNotEqual(first.call, second.call)
+        # a status read is not a change, the cached getldev stays
+        cached.getldev(ldev_id=1)
+        self.assertEqual(raidcom.calls, ['getldev', 'getcommandstatus', 'getcommandstatus'])
+
+    def test_expired_results_are_read_again(self):
+        raidcom, cached = self.cached(ttl=1)
+        cached.getldev(ldev_id=1)
+        for path in os.listdir(self.cache_dir):
+            with open(os.path.join(self.cache_dir, path)) as cachefile:
+                content = json.load(cachefile)
+            content['created'] -= 10
+            with open(os.path.join(self.cache_dir, path), 'w') as cachefile:
+                json.dump(content, cachefile)
+        cached.getldev(ldev_id=1)
+        self.assertEqual(raidcom.calls, ['getldev', 'getldev'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Hitachi Vantara, Inc. All rights reserved.
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# The journal sampler of hur state monitor against stub pairdisplay -v jnl outputs, no CCI needed:
+#   python -m pytest tests/unit/plugins/module_utils/test_hitachi_raidcom_journal.py
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import unittest
+
+from ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom import hitachi_raidcom
+
+
+journal_header = 'JID MU CTG JNLS AP U(%) Q-Marker Q-CNT D-SZ(BLK) Seq# Num LDEV#'
+
+
+class stub_module(object):
+    def __init__(self, **params):
+        self.params = dict({'horcm_inst': 1, 'storage_serial': 641900}, **params)
+        self.check_mode = False
+
+    def fail_json(self, **kwargs):
+        raise Exception(kwargs['msg'])
+
+
+class test_hitachi_raidcom_journal(unittest.TestCase):
+
+    def sampler(self, outputs, **params):
+        # a hitachi_raidcom whose pairdisplay -v jnl returns outputs one after the other
+        raidcom = hitachi_raidcom(stub_module(**params))
+        outputs = list(outputs)
+        raidcom.hur_journal_display = lambda copy_group, inst: outputs.pop(0)
+        return raidcom
+
+    def journal(self, usage, qMarker, qCnt, jnls='PJNN'):
+        return '{}\n000 0 0 {} 1 {} {:08x} {} 2097152 641900 1 512\n'.format(journal_header, jnls, usage, qMarker, qCnt)
+
+    def test_rate_is_the_least_squares_slope(self):
+        raidcom = self.sampler([])
+        self.assertEqual(raidcom.hur_rate([(0, 1), (1, 3), (2, 5)]), 2)
+        self.assertIsNone(raidcom.hur_rate([(0, 1)]))
+        self.assertIsNone(raidcom.hur_rate([(1, 1), (1, 2)]))
+
+    def test_journal_rows_are_parsed(self):
+        raidcom = self.sampler([self.journal(10.5, 0x100, 4)])
+        rows = raidcom.hur_journal_rows('hur', 1)
+        self.assertEqual(rows, [{'JID': '000', 'MU': '0', 'CTG': '0', 'JNLS': 'PJNN', 'AP': '1', 'U(%)': '10.5', 'Q-Marker': '00000100',
+                                 'Q-CNT': '4', 'D-SZ(BLK)': '2097152', 'Seq#': '641900', 'Num': '1', 'LDEV#': '512'}])
+        self.assertEqual(self.sampler(['']).hur_journal_rows('hur', 1), [])
+
+    def test_filling_journal(self):
+        raidcom = self.sampler([])
+        rates = raidcom.hur_journal_rates([[0, 10.0, 50, 100, 'PJNN'], [10, 20.0, 100, 200, 'PJNN'], [20, 30.0, 150, 300, 'PJNN']], 2097152)
+        self.assertEqual(rates['fill_rate_percent_per_second'], 1)
+        self.assertEqual(rates['fill_rate_blks_per_second'], 20972)
+        self.assertEqual(rates['time_to_full_seconds'], 70)
+        self.assertIsNone(rates['time_to_empty_seconds'])
+        self.assertEqual(rates['write_rate_entries_per_second'], 10)
+        self.assertEqual(rates['rpo_seconds'], 15)
+
+    def test_draining_and_empty_journal(self):
+        raidcom = self.sampler([])
+        rates = raidcom.hur_journal_rates([[0, 40.0, 20, 100, 'PJNN'], [10, 20.0, 0, 100, 'PJNN']], 2097152)
+        self.assertEqual(rates['time_to_empty_seconds'], 10)
+        self.assertIsNone(rates['time_to_full_seconds'])
+        self.assertEqual(rates['rpo_seconds'], 0)
+        # no writes: the RPO of a backlog is not known
+        rates = raidcom.hur_journal_rates([[0, 20.0, 20, 100, 'PJNN'], [10, 20.0, 20, 100, 'PJNN']], 2097152)
+        self.assertIsNone(rates['rpo_seconds'])
+        self.assertIsNone(raidcom.hur_journal_rates([[0, 20.0, 20, 100, 'PJNN']], 2097152)['fill_rate_percent_per_second'])
+
+    def test_monitor_samples_every_journal(self):
+        outputs = [self.journal(10, 100, 50), self.journal(20, 200, 100, jnls='PJNF')]
+        raidcom = self.sampler(outputs, samples=2, interval=0)
+        result = raidcom.hur_monitor_group('hur', 1)
+        self.assertEqual((result['samples'], result['interval']), (2, 0))
+        journal = result['journals']['000']
+        self.assertEqual(journal['jnls'], 'PJNF')
+        self.assertEqual(journal['capacity_blks'], 2097152)
+        self.assertEqual(journal['series']['columns'], ['seconds', 'usage_percent', 'q_cnt', 'q_marker', 'jnls'])
+        self.assertEqual([row[1:] for row in journal['series']['rows']], [[10.0, 50, 100, 'PJNN'], [20.0, 100, 200, 'PJNF']])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Hitachi Vantara, Inc. All rights reserved.
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# The free LDEV id bitmap of volume_create, no CCI needed:
+#   python -m pytest tests/unit/plugins/module_utils/test_hitachi_raidcom_ldev_allocator.py
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import json
+import unittest
+
+from ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom_ldev_allocator import (
+    hitachi_raidcom_ldev_allocator, allocator_window)
+
+
+def allocator(free, max_ldev_id=65279, rsgid='0'):
+    # an allocator with the ids of free free in resource group rsgid
+    ldevs = hitachi_raidcom_ldev_allocator(max_ldev_id)
+    ldevs.mark_free(free, rsgid)
+    return ldevs
+
+
+class test_hitachi_raidcom_ldev_allocator(unittest.TestCase):
+
+    def test_from_ldevlist(self):
+        undefined = {'10': {'RSGID': '0'}, '11': {'RSGID': '0'}, '12': {'RSGID': '3'}, '70000': {'RSGID': '0'}}
+        ldevs = hitachi_raidcom_ldev_allocator.from_ldevlist(undefined, 65279)
+        self.assertEqual(ldevs.free_count('0'), 2)
+        self.assertEqual(ldevs.free_count('3'), 1)
+        self.assertEqual(ldevs.next_free('3'), 12)
+
+    def test_free_mask_of_a_range_not_on_byte_bounds(self):
+        ldevs = allocator([3, 9, 10, 17])
+        self.assertEqual(ldevs.free_mask('0', 9, 17), 0b100000011)
+        self.assertEqual(ldevs.free_mask('0', 4, 8), 0)
+        self.assertEqual(ldevs.free_mask('0', 20, 10), 0)
+
+    def test_next_free_across_windows(self):
+        ldevs = allocator([allocator_window * 3 + 5])
+        self.assertEqual(ldevs.next_free('0'), allocator_window * 3 + 5)
+        self.assertIsNone(ldevs.next_free('0', end=allocator_window * 3))
+        self.assertIsNone(ldevs.next_free('1'))
+
+    def test_contiguous_free(self):
+        ldevs = allocator([1, 2, 4, 5, 6, 7, 8, 20, 21, 22])
+        self.assertEqual(ldevs.contiguous_free(3), 4)
+        self.assertEqual(ldevs.contiguous_free(5), 4)
+        self.assertIsNone(ldevs.contiguous_free(6))
+        self.assertEqual(ldevs.contiguous_free(3, start=9), 20)
+        self.assertIsNone(ldevs.contiguous_free(3, start=9, end=21))
+
+    def test_reserve_takes_a_contiguous_range(self):
+        ldevs = allocator([1, 2, 4, 5, 6])
+        self.assertEqual(ldevs.reserve(3), [4, 5, 6])
+        self.assertEqual(ldevs.free_count(), 2)
+
+    def test_reserve_falls_back_to_the_first_free_ids(self):
+        ldevs = allocator([1, 2, 4, 5, 6])
+        self.assertIsNone(ldevs.reserve(4))
+        self.assertEqual(ldevs.reserve(4, contiguous=False), [1, 2, 4, 5])
+        self.assertIsNone(ldevs.reserve(2, contiguous=False))
+        self.assertEqual(ldevs.reserve(0), [])
+
+    def test_reserve_in_resource_group_and_range(self):
+        ldevs = allocator([1, 2, 3])
+        ldevs.mark_free([100, 101], '5')
+        self.assertEqual(ldevs.reserve(2, '5'), [100, 101])
+        self.assertIsNone(ldevs.reserve(2, '0', start=3))
+
+    def test_mark_used_ignores_ids_outside_of_the_model(self):
+        ldevs = allocator([0, 1, 255], max_ldev_id=255)
+        ldevs.mark_used([1, -1, 256, 70000])
+        self.assertEqual(ldevs.free_count(), 2)
+        ldevs.mark_free([-1, 256])
+        self.assertEqual(ldevs.free_count(), 2)
+
+    def test_mark_used_in_every_resource_group(self):
+        ldevs = allocator([7])
+        ldevs.mark_free([7], '2')
+        ldevs.mark_used(['7'])
+        self.assertEqual(ldevs.free_count('0') + ldevs.free_count('2'), 0)
+
+    def test_data_round_trip(self):
+        ldevs = allocator([1, 2, 4000, 65279])
+        ldevs.mark_free([9], '4')
+        data = json.loads(json.dumps(ldevs.to_data()))
+        copy = hitachi_raidcom_ldev_allocator.from_data(data)
+        self.assertEqual(copy.max_ldev_id, 65279)
+        self.assertEqual(copy.to_data(), ldevs.to_data())
+        self.assertEqual(copy.reserve(2), [1, 2])
+        self.assertEqual(copy.next_free('0'), 4000)
+        self.assertEqual(copy.next_free('4'), 9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Hitachi Vantara, Inc. All rights reserved.
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# The per call metrics of hiraid calls against stub results, no CCI needed:
+#   python -m pytest tests/unit/plugins/module_utils/test_hitachi_raidcom_metrics.py
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom_metrics import (
+    hitachi_raidcom_metrics, hitachi_raidcom_timed, call_returncode, call_output_size)
+
+
+class stub_cmdview(object):
+    def __init__(self, cmd, stdout, returncode=0):
+        self.cmd = cmd
+        self.stdout = stdout
+        self.returncode = returncode
+
+
+class stub_raidcom(object):
+    serial = 641900
+
+    def getldev(self, ldev_id):
+        return stub_cmdview('raidcom get ldev -ldev_id {}'.format(ldev_id), 'LDEV : {}\n'.format(ldev_id))
+
+    def deleteldev(self, ldev_id):
+        raise Exception('ldev {} is in use'.format(ldev_id))
+
+
+class test_hitachi_raidcom_metrics(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_returncode_and_output_of_every_result_shape(self):
+        self.assertEqual(call_returncode(stub_cmdview('', 'abc', 2)), 2)
+        self.assertEqual(call_returncode({'cmdreturn': 1, 'stdout': 'ab'}), 1)
+        self.assertEqual(call_returncode(('out', '', 3)), 3)
+        self.assertIsNone(call_returncode('view'))
+        self.assertEqual(call_output_size(stub_cmdview('', 'abc')), 3)
+        self.assertEqual(call_output_size({'cmdreturn': 0, 'stdout': 'ab'}), 2)
+        self.assertEqual(call_output_size(('out', '', 0)), 3)
+        self.assertEqual(call_output_size(stub_cmdview('', ['ab', 'cd', None])), 4)
+
+    def test_timed_calls_are_summed_per_command(self):
+        metrics = hitachi_raidcom_metrics(serial=641900, horcm_inst=1)
+        raidcom = hitachi_raidcom_timed(stub_raidcom(), 'raidcom', metrics)
+        raidcom.getldev(ldev_id=1)
+        raidcom.getldev(ldev_id=2)
+        self.assertEqual(raidcom.serial, 641900)
+        with self.assertRaises(Exception):
+            raidcom.deleteldev(ldev_id=1)
+        summary = metrics.summary()
+        self.assertEqual(summary['calls'], 3)
+        self.assertEqual(summary['backend'], 'in-process')
+        self.assertEqual(summary['commands']['raidcom.getldev']['calls'], 2)
+        self.assertEqual(summary['commands']['raidcom.getldev']['output_bytes'], 18)
+        self.assertEqual(summary['commands']['raidcom.deleteldev']['errors'], 1)
+        self.assertEqual(metrics.samples[0]['cmd'], 'raidcom get ldev -ldev_id 1')
+        self.assertEqual(metrics.samples[0]['args'], {'ldev_id': 1})
+
+    def test_positional_arguments_are_recorded(self):
+        metrics = hitachi_raidcom_metrics()
+        metrics.timed('cci', 'restart_horcm_inst', lambda inst: {'cmdreturn': 0}, 3)
+        self.assertEqual(metrics.samples[0]['args'], {'args': [3]})
+        self.assertEqual(metrics.samples[0]['returncode'], 0)
+
+    def test_samples_are_appended_to_the_log_file(self):
+        logfile = os.path.join(self.directory, 'metrics.jsonl')
+        metrics = hitachi_raidcom_metrics(logfile, 641900, 1)
+        raidcom = hitachi_raidcom_timed(stub_raidcom(), 'raidcom', metrics)
+        raidcom.getldev(ldev_id=1)
+        raidcom.getldev(ldev_id=2)
+        with open(logfile) as samples:
+            lines = [json.loads(line) for line in samples]
+        self.assertEqual([line['command'] for line in lines], ['raidcom.getldev', 'raidcom.getldev'])
+        self.assertEqual(lines[1]['horcm_inst'], 1)
+
+    def test_an_unwritable_log_file_does_not_fail_the_call(self):
+        metrics = hitachi_raidcom_metrics(os.path.join(self.directory, 'missing', 'metrics.jsonl'))
+        metrics.timed('raidcom', 'getldev', stub_raidcom().getldev, ldev_id=1)
+        self.assertIsNone(metrics.logfile)
+        self.assertEqual(metrics.summary()['calls'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
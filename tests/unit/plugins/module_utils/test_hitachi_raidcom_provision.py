@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Hitachi Vantara, Inc. All rights reserved.
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# The LDEV ranges and horcm.conf merge of hur state provisioned, no CCI needed:
+#   python -m pytest tests/unit/plugins/module_utils/test_hitachi_raidcom_provision.py
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom import hitachi_raidcom
+
+
+class stub_module_failed(Exception):
+    pass
+
+
+class stub_module(object):
+    # the parts of AnsibleModule hitachi_raidcom uses, fail_json raises
+    def __init__(self, **params):
+        self.params = dict({'horcm_inst': 1, 'storage_serial': 641900, 'copy_group': 'hur', 'pairs_per_group': 0,
+                            'primary_ldevs': None, 'secondary_ldevs': None}, **params)
+        self.check_mode = False
+
+    def fail_json(self, **kwargs):
+        raise stub_module_failed(kwargs['msg'])
+
+
+horcm_conf = '''HORCM_MON
+#ip_address\tservice\tpoll(10ms)\ttimeout(10ms)
+localhost\t11001\t1000\t3000
+
+HORCM_CMD
+\\\\.\\CMD-641900:/dev/sd
+
+HORCM_LDEV
+#dev_group\tdev_name\tSerial#\tCU:LDEV(LDEV#)
+old\told_0000\t641900\t00:10
+
+HORCM_INST
+#dev_group\tip_address\tservice
+old\tremotehost\t11002
+'''
+
+
+class test_hitachi_raidcom_provision(unittest.TestCase):
+
+    def setUp(self):
+        self.horcm_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.horcm_dir)
+
+    def raidcom(self, **params):
+        return hitachi_raidcom(stub_module(horcm_dir=self.horcm_dir, **params))
+
+    def conf(self, content):
+        path = os.path.join(self.horcm_dir, 'horcm1.conf')
+        with open(path, 'w') as conffile:
+            conffile.write(content)
+        return path
+
+    def test_ldev_ranges(self):
+        raidcom = self.raidcom()
+        self.assertEqual(raidcom.hur_ldev_ranges(['10-12', '0x20', '01:00-01:01', 7]), [10, 11, 12, 32, 256, 257, 7])
+        self.assertEqual(raidcom.hur_ldev_ranges(None), [])
+
+    def test_reversed_range_fails(self):
+        raidcom = self.raidcom()
+        with self.assertRaises(stub_module_failed):
+            raidcom.hur_ldev_ranges(['06:00-05:00'])
+        with self.assertRaises(stub_module_failed):
+            raidcom.hur_ldev_ranges(['1-2-3'])
+
+    def test_provision_groups(self):
+        raidcom = self.raidcom(primary_ldevs=['100-102'], secondary_ldevs=['200-202'], pairs_per_group=2)
+        groups = raidcom.hur_provision_groups()
+        self.assertEqual([copyGroup for copyGroup, pairs in groups], ['hur_000', 'hur_001'])
+        self.assertEqual(groups[1][1], [('hur_001_0000', 102, 202)])
+        raidcom = self.raidcom(primary_ldevs=['100-102'], secondary_ldevs=['200'])
+        with self.assertRaises(stub_module_failed):
+            raidcom.hur_provision_groups()
+
+    def test_merge_adds_missing_groups(self):
+        raidcom = self.raidcom()
+        path = self.conf(horcm_conf)
+        definitions = raidcom.hur_horcm_ldev_lines([('hur', [('hur_0000', 256, 512)])], 641900, 1)
+        lines, added = raidcom.hur_horcm_conf_merge(path, definitions)
+        self.assertEqual(added, ['hur\thur_0000\t641900\t01:00', 'hur\tremotehost\t11002'])
+        ldev = lines.index('HORCM_LDEV')
+        inst = lines.index('HORCM_INST')
+        self.assertEqual(lines[ldev + 3], 'hur\thur_0000\t641900\t01:00')
+        self.assertTrue(ldev < inst)
+        self.assertEqual(lines[inst + 3], 'hur\tremotehost\t11002')
+
+    def test_merge_keeps_known_groups(self):
+        raidcom = self.raidcom()
+        path = self.conf(horcm_conf)
+        lines, added = raidcom.hur_horcm_conf_merge(path, {'old': ['old\told_0000\t641900\t00:10']})
+        self.assertEqual(added, [])
+        self.assertEqual(lines, horcm_conf.splitlines())
+
+    def test_merge_without_horcm_ldev_section(self):
+        raidcom = self.raidcom()
+        path = self.conf(horcm_conf.replace('HORCM_LDEV\n#dev_group\tdev_name\tSerial#\tCU:LDEV(LDEV#)\nold\told_0000\t641900\t00:10\n\n', ''))
+        lines, added = raidcom.hur_horcm_conf_merge(path, {'hur': ['hur\thur_0000\t641900\t01:00']})
+        self.assertEqual(lines[lines.index('HORCM_LDEV') + 1], 'hur\thur_0000\t641900\t01:00')
+        self.assertTrue(lines.index('HORCM_LDEV') < lines.index('HORCM_INST'))
+        self.assertEqual(lines[-1], 'hur\tremotehost\t11002')
+
+    def test_merge_with_horcm_inst_before_horcm_ldev(self):
+        raidcom = self.raidcom()
+        ldevSection = 'HORCM_LDEV\n#dev_group\tdev_name\tSerial#\tCU:LDEV(LDEV#)\nold\told_0000\t641900\t00:10\n'
+        path = self.conf(horcm_conf.replace(ldevSection + '\n', '') + '\n' + ldevSection)
+        lines, added = raidcom.hur_horcm_conf_merge(path, {'hur': ['hur\thur_0000\t641900\t01:00']})
+        self.assertEqual(lines[lines.index('HORCM_INST') + 3], 'hur\tremotehost\t11002')
+        self.assertEqual(lines[-1], 'hur\thur_0000\t641900\t01:00')
+
+    def test_merge_needs_a_horcm_inst_entry(self):
+        raidcom = self.raidcom()
+        path = self.conf(horcm_conf.replace('old\tremotehost\t11002\n', ''))
+        with self.assertRaises(Exception):
+            raidcom.hur_horcm_conf_merge(path, {'hur': ['hur\thur_0000\t641900\t01:00']})
+
+    def test_update_writes_only_outside_of_check_mode(self):
+        raidcom = self.raidcom()
+        path = self.conf(horcm_conf)
+        raidcom.module.check_mode = True
+        self.assertEqual(len(raidcom.hur_horcm_conf_update(path, {'hur': ['hur\thur_0000\t641900\t01:00']})), 2)
+        with open(path) as conffile:
+            self.assertEqual(conffile.read(), horcm_conf)
+        raidcom.module.check_mode = False
+        raidcom.hur_horcm_conf_update(path, {'hur': ['hur\thur_0000\t641900\t01:00']})
+        self.assertEqual(raidcom.hur_horcm_conf_update(path, {'hur': ['hur\thur_0000\t641900\t01:00']}), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Hitachi Vantara, Inc. All rights reserved.
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# The slots of the HORCM instance pool and the pooled Raidcom/Cci against stubs, no CCI needed:
+#   python -m pytest tests/unit/plugins/module_utils/test_hitachi_raidcom_scheduler.py
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom_metrics import hitachi_raidcom_metrics
+from ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom_scheduler import (
+    hitachi_raidcom_scheduler, hitachi_raidcom_pooled)
+
+
+class stub_raidcom(object):
+    def __init__(self, horcm_inst):
+        self.instance = horcm_inst
+
+    def getldev(self, ldev_id):
+        return {'cmdreturn': 0, 'inst': self.instance}
+
+
+class stub_cci(object):
+    def pairdisplayx(self, inst, group):
+        return {'cmdreturn': 0, 'inst': inst}
+
+
+class test_hitachi_raidcom_scheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def scheduler(self, instances=(1, 3, 4), max_inflight=1):
+        return hitachi_raidcom_scheduler(self.cache_dir, 641900, instances, max_inflight)
+
+    def test_slots_are_handed_out_round_robin(self):
+        scheduler = self.scheduler()
+        taken = [scheduler.try_slot() for count in range(3)]
+        self.assertEqual([inst for inst, slotfile in taken], [1, 3, 4])
+        # every slot of every instance is held
+        self.assertIsNone(scheduler.try_slot())
+        scheduler.release(taken[1][1])
+        inst, slotfile = scheduler.try_slot()
+        self.assertEqual(inst, 3)
+        for held in [taken[0][1], taken[2][1], slotfile]:
+            scheduler.release(held)
+
+    def test_max_inflight_slots_per_instance(self):
+        scheduler = self.scheduler(instances=[1], max_inflight=2)
+        taken = [scheduler.try_slot(), scheduler.try_slot()]
+        self.assertEqual([inst for inst, slotfile in taken], [1, 1])
+        self.assertIsNone(scheduler.try_slot())
+        for inst, slotfile in taken:
+            scheduler.release(slotfile)
+
+    def test_slots_are_shared_between_schedulers(self):
+        # other forks on the host set up their own scheduler on the same lock files
+        first = self.scheduler(instances=[1])
+        inst, slotfile = first.try_slot()
+        self.assertIsNone(self.scheduler(instances=[1]).try_slot())
+        first.release(slotfile)
+        second = self.scheduler(instances=[1])
+        inst, slotfile = second.try_slot()
+        second.release(slotfile)
+
+    def test_a_queued_command_waits_for_a_slot(self):
+        scheduler = self.scheduler(instances=[1])
+        metrics = hitachi_raidcom_metrics()
+        inst, slotfile = scheduler.try_slot()
+        threading.Timer(0.2, scheduler.release, [slotfile]).start()
+        with scheduler.slot(metrics) as inst:
+            self.assertEqual(inst, 1)
+        waits = [sample for sample in metrics.samples if sample['command'] == 'horcm_pool.wait']
+        self.assertEqual(len(waits), 1)
+        self.assertTrue(waits[0]['elapsed_seconds'] >= 0.1)
+
+    def test_parallel_commands_never_share_a_slot(self):
+        scheduler = self.scheduler(instances=[1, 3])
+        inflight = {1: 0, 3: 0}
+        peaks = {1: 0, 3: 0}
+        lock = threading.Lock()
+
+        def command():
+            with scheduler.slot() as inst:
+                with lock:
+                    inflight[inst] += 1
+                    peaks[inst] = max(peaks[inst], inflight[inst])
+                time.sleep(0.02)
+                with lock:
+                    inflight[inst] -= 1
+
+        threads = [threading.Thread(target=command) for count in range(8)]
+        [thread.start() for thread in threads]
+        [thread.join() for thread in threads]
+        self.assertEqual(peaks, {1: 1, 3: 1})
+
+    def test_pooled_raidcom_runs_on_a_session_per_instance(self):
+        scheduler = self.scheduler(instances=[1, 3])
+        metrics = hitachi_raidcom_metrics()
+        pooled = hitachi_raidcom_pooled(stub_raidcom(1), 'raidcom', scheduler, metrics, stub_raidcom)
+        pooled.cci = 'cci'
+        self.assertEqual(sorted(pooled.getldev(ldev_id=1)['inst'] for count in range(2)), [1, 3])
+        self.assertEqual(sorted(pooled.pooled_sessions), [1, 3])
+        self.assertEqual(pooled.pooled_sessions[3].cci, 'cci')
+        self.assertEqual(pooled.pooled_pin(3).getldev(ldev_id=1)['inst'], 3)
+        self.assertEqual(metrics.summary()['commands']['raidcom.getldev']['calls'], 3)
+
+    def test_pooled_cci_only_schedules_instances_of_the_pool(self):
+        scheduler = self.scheduler(instances=[1, 3])
+        pooled = hitachi_raidcom_pooled(stub_cci(), 'cci', scheduler, hitachi_raidcom_metrics())
+        self.assertIn(pooled.pairdisplayx(inst=1, group='hur')['inst'], (1, 3))
+        # the instance of the other site
+        self.assertEqual(pooled.pairdisplayx(inst=2, group='hur')['inst'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Hitachi Vantara, Inc. All rights reserved.
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# Recording the calls of a stub Raidcom/Cci to a trace file and replaying them without it, no CCI needed:
+#   python -m pytest tests/unit/plugins/module_utils/test_hitachi_raidcom_trace.py
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom_metrics import hitachi_raidcom_metrics, hitachi_raidcom_timed
+from ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom_trace import (
+    hitachi_raidcom_trace, hitachi_raidcom_trace_error, trace_load, trace_task)
+
+
+class stub_cmdview(object):
+    def __init__(self, cmd, stdout):
+        self.cmd = cmd
+        self.returncode = 0
+        self.stdout = stdout
+
+
+class stub_raidcom(object):
+    def __init__(self, serial, horcm_inst):
+        self.serial = serial
+        self.instance = horcm_inst
+        self.maxldevid = 65279
+
+    def getldev(self, ldev_id):
+        return stub_cmdview('raidcom get ldev -ldev_id {}'.format(ldev_id), 'LDEV : {}\n'.format(ldev_id))
+
+    def deleteldev(self, ldev_id):
+        raise Exception('ldev {} is in use'.format(ldev_id))
+
+
+class stub_cci(object):
+    def pairdisplayx(self, inst, group):
+        return {'cmdreturn': 0, 'pairdisplaydata': {'pairs': {group: {}}}, 'inst': inst}
+
+
+params = {'horcm_inst': 1, 'storage_serial': 641900, 'volume_id': '1', 'cache_dir': '/tmp/one'}
+
+
+class test_hitachi_raidcom_trace(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'task.trace.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def task(self, trace):
+        # what a task does through metrics.timed: set up Raidcom, read, fail a change, read a pair
+        metrics = hitachi_raidcom_metrics(serial=641900, horcm_inst=1)
+        metrics.trace = trace
+        raidcom = hitachi_raidcom_timed(metrics.timed('raidcom', '__init__', stub_raidcom, 641900, 1), 'raidcom', metrics)
+        cci = hitachi_raidcom_timed(stub_cci(), 'cci', metrics)
+        result = {'maxldevid': raidcom.maxldevid, 'ldev': vars(raidcom.getldev(ldev_id=1)),
+                  'pairs': cci.pairdisplayx(inst=1, group='hur')}
+        try:
+            raidcom.deleteldev(ldev_id=1)
+        except Exception as e:
+            result['error'] = str(e)
+        return result
+
+    def record(self, task_params=params):
+        trace = hitachi_raidcom_trace(self.path, task_params, 641900, 1)
+        result = self.task(trace)
+        self.assertTrue(trace.save())
+        return result
+
+    def test_task_ignores_host_specific_parameters(self):
+        self.assertEqual(trace_task(params), trace_task(dict(params, cache_dir='/tmp/other', trace_record='/tmp/t')))
+        self.assertNotEqual(trace_task(params), trace_task(dict(params, volume_id='2')))
+
+    def test_a_replay_answers_like_the_recording(self):
+        recorded = self.record()
+        trace = hitachi_raidcom_trace(self.path, params, 641900, 1, replay=True)
+        self.assertEqual(self.task(trace), recorded)
+        self.assertEqual(trace.summary()['replayed'], 4)
+
+    def test_a_saved_trace_is_not_written_twice(self):
+        trace = hitachi_raidcom_trace(self.path, params, 641900, 1)
+        self.task(trace)
+        self.assertTrue(trace.save())
+        self.assertFalse(trace.save())
+        header, calls = trace_load(self.path)[0]
+        self.assertEqual(header['task'], trace_task(params))
+        self.assertEqual([call['method'] for call in calls], ['__init__', 'getldev', 'pairdisplayx', 'deleteldev'])
+        self.assertEqual(calls[-1]['error'], 'ldev 1 is in use')
+
+    def test_every_task_is_appended_and_replayed_by_its_parameters(self):
+        self.record()
+        other = dict(params, volume_id='2')
+        self.record(other)
+        self.assertEqual(len(trace_load(self.path)), 2)
+        trace = hitachi_raidcom_trace(self.path, other, replay=True)
+        self.assertEqual(len(trace.calls), 4)
+
+    def test_a_task_without_recording_fails(self):
+        self.record()
+        with self.assertRaises(hitachi_raidcom_trace_error):
+            hitachi_raidcom_trace(self.path, dict(params, volume_id='3'), replay=True)
+        with self.assertRaises(hitachi_raidcom_trace_error):
+            hitachi_raidcom_trace(os.path.join(self.directory, 'missing.trace.gz'), params, replay=True)
+
+    def test_calls_beyond_the_recording_fail(self):
+        self.record()
+        trace = hitachi_raidcom_trace(self.path, params, replay=True)
+        self.task(trace)
+        metrics = hitachi_raidcom_metrics()
+        metrics.trace = trace
+        with self.assertRaises(hitachi_raidcom_trace_error):
+            metrics.timed('raidcom', 'getldev', stub_raidcom(641900, 1).getldev, ldev_id=1)
+
+    def test_other_arguments_take_the_next_call_of_the_method(self):
+        # e.g. the same query on another instance of the pool
+        self.record()
+        trace = hitachi_raidcom_trace(self.path, params, replay=True)
+        metrics = hitachi_raidcom_metrics()
+        metrics.trace = trace
+        result = metrics.timed('cci', 'pairdisplayx', stub_cci().pairdisplayx, inst=3, group='hur')
+        self.assertEqual(result['inst'], 1)
+
+    def test_a_replayed_object_runs_nothing_itself(self):
+        self.record()
+        trace = hitachi_raidcom_trace(self.path, params, replay=True)
+        metrics = hitachi_raidcom_metrics()
+        metrics.trace = trace
+        raidcom = metrics.timed('raidcom', '__init__', stub_raidcom, 641900, 1)
+        self.assertEqual((raidcom.serial, raidcom.maxldevid), (641900, 65279))
+        with self.assertRaises(hitachi_raidcom_trace_error):
+            raidcom.getldev(ldev_id=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
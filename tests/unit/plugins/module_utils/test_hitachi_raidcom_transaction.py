@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023 Hitachi Vantara, Inc. All rights reserved.
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# Transactions against a stub Raidcom session that answers command_status like the storage, no CCI needed:
+#   python -m pytest tests/unit/plugins/module_utils/test_hitachi_raidcom_transaction.py
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import re
+import unittest
+
+from ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom_plan import hitachi_raidcom_plan
+from ansible_collections.hitachi.raidcom.plugins.module_utils.hitachi_raidcom_transaction import hitachi_raidcom_transaction
+
+
+class stub_cmdview(object):
+    def __init__(self, cmd, returncode=0, stdout='', stderr=''):
+        self.cmd = cmd
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+
+
+class stub_storage(object):
+    # rejected: LDEV ids whose command the storage rejects, failed: LDEV ids whose asynchronous command fails later
+    def __init__(self, rejected=(), failed=(), locked=False):
+        self.rejected = [str(ldevId) for ldevId in rejected]
+        self.failed = [str(ldevId) for ldevId in failed]
+        self.locked = locked
+        self.executed = []
+        self.requests = {}
+        self.undocmds = []
+        self.undodefs = []
+
+    def line(self, command, noexec):
+        cmd = 'raidcom {} -I1 -s 641900'.format(command)
+        if not noexec:
+            self.executed.append(cmd)
+        return stub_cmdview(cmd)
+
+    def lockresource(self, noexec=False):
+        if self.locked and not noexec:
+            raise Exception('resource is locked by another session')
+        return self.line('lock resource', noexec)
+
+    def unlockresource(self, noexec=False):
+        return self.line('unlock resource', noexec)
+
+    def resetcommandstatus(self, noexec=False):
+        return self.line('reset command_status', noexec)
+
+    def getcommandstatus(self, request_id=None):
+        header = 'HANDLE SSB1 SSB2 ERR_CNT Serial# Description\n'
+        if request_id is None:
+            self.executed.append('raidcom get command_status')
+            errors = len([request for request in self.requests.values() if request in self.failed])
+            return stub_cmdview('', stdout=header + '00c3 - - {} 641900 -\n'.format(errors))
+        self.executed.append('raidcom get command_status -request_id {}'.format(request_id))
+        if self.requests[request_id] in self.failed:
+            return stub_cmdview('', stdout=header + '00c3 2E11 6001 1 641900 -\n')
+        return stub_cmdview('', stdout=header + '00c3 - - 0 641900 -\n')
+
+    def addldev_legacy(self, ldev_id, poolid, capacity, noexec=False):
+        return stub_cmdview('raidcom add ldev -ldev_id {} -pool {} -capacity {}'.format(ldev_id, poolid, capacity))
+
+    def extendldev(self, ldev_id, capacity, noexec=False):
+        return stub_cmdview('raidcom extend ldev -ldev_id {} -capacity {}'.format(ldev_id, capacity))
+
+    def deleteldev(self, ldev_id, noexec=False):
+        return stub_cmdview('raidcom delete ldev -ldev_id {}'.format(ldev_id))
+
+    def modifyldevname(self, ldev_id, ldev_name, noexec=False):
+        return stub_cmdview('raidcom modify ldev -ldev_id {} -ldev_name "{}"'.format(ldev_id, ldev_name))
+
+    def execute(self, cmd, raise_err=True):
+        self.executed.append(cmd)
+        ldevId = re.search(r'-ldev_id (\d+)', cmd).group(1)
+        if ldevId in self.rejected:
+            return stub_cmdview(cmd, 1, stderr='raidcom: [EX_CMDRJE] rejected\n')
+        if cmd.endswith(' -request_id auto'):
+            requestId = str(len(self.requests) + 1)
+            self.requests[requestId] = ldevId
+            return stub_cmdview(cmd, stdout='REQID : {}\n'.format(requestId))
+        return stub_cmdview(cmd)
+
+    def populateundo(self, undodef, undocmds, undodefs):
+        undocmds.insert(0, getattr(self, undodef['undodef'])(noexec=True, **undodef['args']).cmd)
+        undodefs.insert(0, undodef)
+
+
+class stub_raidcom(object):
+    # the parts of hitachi_raidcom a transaction uses
+    cci_path = ''
+    horcm_inst = 1
+    serial = 641900
+    metrics = None
+
+    def __init__(self, storage, check_mode=False):
+        self.storage = storage
+        self.invalidated = 0
+        self.plan = hitachi_raidcom_plan('', 641900, 1, self.raidcom_session) if check_mode else None
+
+    def raidcom_session(self):
+        return self.storage
+
+    def horcm_scheduler(self):
+        return None
+
+    def query_cache_invalidate(self, name):
+        self.invalidated += 1
+
+
+class test_hitachi_raidcom_transaction(unittest.TestCase):
+
+    def transaction(self, storage, check_mode=False):
+        raidcom = stub_raidcom(storage, check_mode)
+        transaction = hitachi_raidcom_transaction(raidcom)
+        for ldevId in (600, 601):
+            transaction.add('addldev', key=ldevId, ldev_id=ldevId, poolid=0, capacity=2048)
+            transaction.add('modifyldevname', key=ldevId, ldev_id=ldevId, ldev_name='v_{}'.format(ldevId))
+        return raidcom, transaction
+
+    def test_only_known_operations_are_queued(self):
+        raidcom, transaction = self.transaction(stub_storage())
+        with self.assertRaises(Exception):
+            transaction.add('addhostgrp', port='CL1-A')
+        self.assertEqual(hitachi_raidcom_transaction(raidcom).execute(), [])
+
+    def test_all_operations_run_under_one_lock(self):
+        storage = stub_storage()
+        raidcom, transaction = self.transaction(storage)
+        operations = transaction.execute()
+        self.assertEqual([operation['status'] for operation in operations], ['ok'] * 4)
+        self.assertEqual(storage.executed[0], 'raidcom lock resource -I1 -s 641900')
+        self.assertEqual(storage.executed[-1], 'raidcom unlock resource -I1 -s 641900')
+        self.assertEqual(operations[0]['cmd'], 'raidcom add ldev -ldev_id 600 -pool 0 -capacity 2048 -request_id auto')
+        self.assertEqual(operations[0]['request_id'], '1')
+        # the name of an LDEV is only set once its add ldev is confirmed
+        self.assertLess(storage.executed.index('raidcom get command_status'), storage.executed.index(operations[1]['cmd']))
+        self.assertEqual(raidcom.invalidated, 2)
+
+    def test_confirmed_adds_get_their_undo(self):
+        storage = stub_storage(failed=[601])
+        raidcom, transaction = self.transaction(storage)
+        transaction.execute()
+        self.assertEqual(storage.undocmds, ['raidcom delete ldev -ldev_id 600'])
+        self.assertEqual(storage.undodefs, [{'undodef': 'deleteldev', 'args': {'ldev_id': 600}}])
+
+    def test_a_failed_asynchronous_command_skips_the_rest_of_its_key(self):
+        storage = stub_storage(failed=[601])
+        raidcom, transaction = self.transaction(storage)
+        operations = transaction.execute()
+        self.assertEqual([operation['status'] for operation in operations], ['ok', 'ok', 'failed', 'skipped'])
+        self.assertEqual(operations[2]['msg'], 'SSB1 2E11 SSB2 6001')
+        self.assertNotIn(operations[3].get('cmd'), storage.executed)
+        # the requests are only read one by one once the bulk status reports errors
+        self.assertIn('raidcom get command_status -request_id 2', storage.executed)
+        self.assertNotIn('raidcom get command_status -request_id 1', storage.executed)
+
+    def test_a_rejected_command_skips_the_rest_of_its_key(self):
+        storage = stub_storage(rejected=[600])
+        raidcom, transaction = self.transaction(storage)
+        operations = transaction.execute()
+        self.assertEqual([operation['status'] for operation in operations], ['failed', 'skipped', 'ok', 'ok'])
+        self.assertEqual(operations[0]['msg'], 'raidcom: [EX_CMDRJE] rejected')
+        self.assertEqual(storage.undocmds, ['raidcom delete ldev -ldev_id 601'])
+
+    def test_a_lock_that_can_not_be_taken_fails_every_operation(self):
+        storage = stub_storage(locked=True)
+        raidcom, transaction = self.transaction(storage)
+        operations = transaction.execute()
+        self.assertEqual([operation['status'] for operation in operations], ['failed'] * 4)
+        self.assertTrue(operations[0]['msg'].startswith('lock resource error'))
+        self.assertEqual(storage.executed, [])
+
+    def test_check_mode_plans_the_command_lines(self):
+        storage = stub_storage()
+        raidcom, transaction = self.transaction(storage, check_mode=True)
+        operations = transaction.execute()
+        self.assertEqual([operation['status'] for operation in operations], ['planned'] * 4)
+        self.assertEqual(storage.executed, [])
+        self.assertEqual(raidcom.plan.command_lines(), [
+            'raidcom lock resource -I1 -s 641900',
+            'raidcom reset command_status -I1 -s 641900',
+            'raidcom add ldev -ldev_id 600 -pool 0 -capacity 2048 -request_id auto',
+            'raidcom get command_status -I1 -s 641900',
+            'raidcom modify ldev -ldev_id 600 -ldev_name "v_600"',
+            'raidcom add ldev -ldev_id 601 -pool 0 -capacity 2048 -request_id auto',
+            'raidcom get command_status -I1 -s 641900',
+            'raidcom modify ldev -ldev_id 601 -ldev_name "v_601"',
+            'raidcom unlock resource -I1 -s 641900'])
+
+
+if __name__ == '__main__':
+    unittest.main()